@@ -1,47 +1,63 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify,
+                   send_file, stream_with_context, g, make_response)
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import date, datetime
+from decimal import Decimal
 from functools import wraps
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import hashlib
+import hmac
+import ipaddress
+import logging
 import os
-from database import get_db, init_db as init_database
-
-# Detectar tipo de base de datos
-DATABASE_URL = os.environ.get('DATABASE_URL')
-USE_POSTGRES = DATABASE_URL is not None
-
-if USE_POSTGRES:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    print("✓ Usando PostgreSQL (Producción)")
-else:
-    # SQLite removido - usando PostgreSQL
-    print("✓ Usando SQLite (Desarrollo)")
-
-# Importar adaptador de base de datos
-try:
-    from db_adapter import adapt_query, get_placeholder, get_cursor
-except ImportError:
-    # Fallback si db_adapter no existe
-    def adapt_query(q):
-        if USE_POSTGRES:
-            q = q.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'SERIAL PRIMARY KEY')
-            q = q.replace('REAL', 'DECIMAL(10,2)')
-            q = q.replace('TIMESTAMP DEFAULT CURRENT_TIMESTAMP', 'TIMESTAMP DEFAULT NOW()')
-            q = q.replace('?', '%s')
-        return q
-    def get_placeholder():
-        return '%s' if USE_POSTGRES else '?'
-    def get_cursor(conn):
-        return conn.cursor(cursor_factory=RealDictCursor) if USE_POSTGRES else conn.cursor()
+import time
+import click
+from database import get_db, init_app, MOTOR
+from utils import metricas
+from utils.instrumentacion import server_timing
+from utils.cache import CacheConfiguracion, CacheTTL
+from utils.periodos import rango_mes, GRANULARIDADES, truncar, truncar_sql, desplazar, contar_periodos
+from utils.excel import (escribir_reporte_ventas, escribir_reporte_gastos, nombre_reporte_ventas,
+                         nombre_reporte_gastos, archivo_temporal, MIMETYPE_XLSX)
+from utils.exportar import EXPORTABLES, MIMETYPES, consulta_exportacion, generar_csv, generar_ndjson, comprimir_gzip
+from utils.paginacion import decodificar_cursor, cortar_pagina, tamano_pagina, CursorInvalido
+from utils.trabajos import (TIPOS as TIPOS_TRABAJO, crear_trabajo, encolar as encolar_trabajo, obtener_trabajo,
+                            limpiar_vencidos as limpiar_trabajos_vencidos,
+                            marcar_huerfanos as marcar_trabajos_huerfanos)
+from utils.importar import IMPORTABLES, ArchivoInvalido, importar
+from utils.resumen import sumar_venta, restar_pendiente, obtener_resumen, reconstruir_resumen
+from utils.saldos import verificar_saldos, reconstruir_saldos
+from utils.migraciones import migrar, aplicadas, listar as listar_migraciones
+from utils import assets, cache_reportes, versiones
+from utils.compresion import comprimir_respuesta
+from utils.api import RECURSOS, ParametrosInvalidos, consulta_pagina, serializar_pagina
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
 
 app = Flask(__name__)
 
 # Configuración de producción
 app.secret_key = os.environ.get('SECRET_KEY', 'tu_clave_secreta_super_segura_cambiala_en_produccion')
 
+# Una conexión del pool por request, devuelta en el teardown
+init_app(app)
+
+# CSS/JS con huella (ver construir_assets.py)
+app.jinja_env.globals['asset_url'] = assets.asset_url
+
+# Configuración en memoria (se invalida al guardar en /configuracion)
+config_cache = CacheConfiguracion(get_db)
+
+# Series del gráfico del dashboard por usuario y versión de datos (vida corta)
+estadisticas_cache = CacheTTL(float(os.environ.get('ESTADISTICAS_CACHE_TTL', 60)))
+MAX_PERIODOS_ESTADISTICAS = 400
+
+# Diezmo: 10% de lo vendido, redondeado a centavos
+TASA_DIEZMO = Decimal('0.10')
+
+# Parte del ETag: cambia en cada deploy (con preload_app es la misma en todos los workers)
+VERSION_APP = os.environ.get('RAILWAY_GIT_COMMIT_SHA') or str(time.time_ns())
+
 
 # ==================== FUNCIONES AUXILIARES ====================
 
@@ -56,16 +72,99 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def condicional(f):
+    """
+    ETag fuerte con la versión de datos del usuario: si el navegador ya tiene
+    la página (If-None-Match), 304 sin correr las consultas de la vista.
+    Con mensajes flash pendientes se renderiza siempre (se consumen al mostrarse).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if '_flashes' in session:
+            return f(*args, **kwargs)
+        user_id = session['user_id']
+        config_cache.valores()
+        g.version_datos = versiones.obtener(get_db(), user_id)
+        partes = (VERSION_APP, request.full_path, user_id, g.version_datos, config_cache.version, date.today())
+        etag = hashlib.blake2b(repr(partes).encode(), digest_size=16).hexdigest()
+        # Comparación débil: comprimida, la misma página lleva W/"..."
+        if request.if_none_match.contains_weak(etag):
+            respuesta = Response(status=304)
+        else:
+            respuesta = make_response(f(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        respuesta.vary.add('Cookie')
+        return respuesta
+    return decorated_function
+
 def get_config(clave, default=''):
     """Obtener configuración del sistema"""
     try:
-        db = get_db()
-        config = db.execute('SELECT valor FROM configuracion WHERE clave = %s', (clave,)).fetchone()
-        db.close()
-        return config['valor'] if config else default
+        return config_cache.get(clave, default)
     except:
         return default
 
+def es_loopback(direccion):
+    """True si la dirección del cliente es 127.0.0.0/8 o ::1"""
+    try:
+        return ipaddress.ip_address(direccion or '').is_loopback
+    except ValueError:
+        return False
+
+def patron_like(texto):
+    """Escapa comodines de LIKE en texto ingresado por el usuario"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def condicion_busqueda_productos(q):
+    """
+    Condición SQL para buscar productos por nombre/descripción.
+    Prefijo de nombre (índice btree text_pattern_ops) y, desde 3 caracteres,
+    subcadena en nombre + descripción (índice trigram).
+    """
+    q = patron_like(q.strip().lower())
+    if len(q) < 3:
+        return "lower(nombre) LIKE %s", [q + '%']
+    return ("(lower(nombre) LIKE %s OR lower(nombre || ' ' || COALESCE(descripcion, '')) LIKE %s)",
+            [q + '%', '%' + q + '%'])
+
+def consulta_serie_ventas(motor, unidad):
+    """SQL de /api/estadisticas: total vendido por período (usuario_id, inicio, fin)"""
+    return f'''
+        SELECT {truncar_sql(motor, unidad, 'fecha_venta')} AS periodo, SUM(total_vendido) AS total
+        FROM ventas
+        WHERE usuario_id = %s AND fecha_venta >= %s AND fecha_venta < %s
+        GROUP BY 1
+    '''
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio_request = time.perf_counter()
+
+@app.after_request
+def agregar_server_timing(response):
+    """Tiempo en la BD, consultas y total del request (visible en las DevTools)"""
+    if 'inicio_request' in g:
+        inicio = g.inicio_request
+        response.headers['Server-Timing'] = server_timing(g.get('db'), time.perf_counter() - inicio)
+        ruta = request.url_rule.rule if request.url_rule else 'sin_ruta'
+        metodo, estado = request.method, str(response.status_code)
+
+        def registrar_metricas():
+            # Al cerrar la respuesta: incluye el envío de los cuerpos en streaming
+            metricas.incrementar('sistema_ventas_requests_total', ruta=ruta, metodo=metodo, estado=estado)
+            metricas.observar('sistema_ventas_request_segundos', time.perf_counter() - inicio, ruta=ruta)
+            metricas.volcar()
+        response.call_on_close(registrar_metricas)
+    return response
+
+@app.after_request
+def comprimir(response):
+    """gzip o brotli para HTML, JSON y CSV (ver utils/compresion.py)"""
+    return comprimir_respuesta(response, request)
+
 @app.context_processor
 def inject_config():
     """Inyectar configuración en todos los templates"""
@@ -79,11 +178,42 @@ def inject_config():
 
 @app.route('/health')
 def health():
-    """Healthcheck para Railway"""
-    return jsonify({
-        'status': 'healthy',
-        'database': 'connected' if os.environ.get('DATABASE_URL') else 'not_configured'
-    }), 200
+    """Healthcheck para Railway: un SELECT 1 con una conexión del pool"""
+    try:
+        get_db().execute('SELECT 1').fetchone()
+    except Exception as e:
+        logging.getLogger('sistema_ventas.db').warning('Healthcheck sin base de datos: %s', e)
+        return jsonify({'status': 'unhealthy', 'database': type(e).__name__}), 503
+    return jsonify({'status': 'healthy', 'database': 'connected', 'motor': MOTOR}), 200
+
+@app.route('/static/dist/<path:filename>')
+def asset(filename):
+    """Archivos estáticos con huella: caché inmutable y versión precomprimida"""
+    return assets.enviar(filename)
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker en la raíz (alcance: todo el sitio); el navegador lo revalida siempre"""
+    respuesta = make_response(render_template('sw.js', version=assets.version() or VERSION_APP,
+                                              app_shell=assets.app_shell()))
+    respuesta.mimetype = 'application/javascript'
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+@app.route('/metrics')
+def metrics():
+    """
+    Métricas de todos los workers en formato Prometheus. Con METRICS_TOKEN,
+    solo con Authorization: Bearer <token>; sin token, solo desde la misma
+    máquina (loopback y sin pasar por el proxy).
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+    elif 'X-Forwarded-For' in request.headers or not es_loopback(request.remote_addr):
+        return Response('Configura METRICS_TOKEN para leer /metrics\n', status=403, mimetype='text/plain')
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -128,6 +258,7 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@condicional
 def dashboard():
     """Dashboard principal"""
     db = get_db()
@@ -138,38 +269,12 @@ def dashboard():
     mes_actual = hoy.month
     anio_actual = hoy.year
     
-    # Total vendido este mes
-    total_vendido = db.execute('''
-        SELECT COALESCE(SUM(total_vendido), 0) as total
-        FROM ventas
-        WHERE TO_CHAR(fecha_venta, 'MM') = ? AND TO_CHAR(fecha_venta, 'YYYY') = ? AND usuario_id = ?
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchone()['total']
-    
-    # Ganancia del mes
-    ganancia_mes = db.execute('''
-        SELECT COALESCE(SUM(ganancia), 0) as total
-        FROM ventas
-        WHERE TO_CHAR(fecha_venta, 'MM') = ? AND TO_CHAR(fecha_venta, 'YYYY') = ? AND usuario_id = ?
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchone()['total']
-    
-    # Total pendiente por cobrar
-    total_pendiente = db.execute('''
-        SELECT COALESCE(SUM(v.total_vendido - COALESCE(pagos.total_pagado, 0)), 0) as pendiente
-        FROM ventas v
-        LEFT JOIN (
-            SELECT venta_id, SUM(monto) as total_pagado
-            FROM pagos
-            GROUP BY venta_id
-        ) pagos ON v.id = pagos.venta_id
-        WHERE v.tipo_venta = 'credito' AND v.estado_pago != 'completado' AND v.usuario_id = ?
-    ''', (user_id,)).fetchone()['pendiente']
-    
-    # Diezmo del mes
-    diezmo_mes = db.execute('''
-        SELECT COALESCE(SUM(diezmo), 0) as total
-        FROM ventas
-        WHERE TO_CHAR(fecha_venta, 'MM') = ? AND TO_CHAR(fecha_venta, 'YYYY') = ? AND usuario_id = ?
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchone()['total']
+    # Vendido, ganancia y diezmo del mes + pendiente por cobrar (tabla resumen)
+    resumen = obtener_resumen(db, user_id, anio_actual, mes_actual)
+    total_vendido = resumen['total_vendido']
+    ganancia_mes = resumen['ganancia']
+    total_pendiente = resumen['total_pendiente']
+    diezmo_mes = resumen['diezmo']
     
     # Valor del inventario
     valor_inventario = db.execute('''
@@ -233,6 +338,7 @@ def dashboard():
 
 @app.route('/gastos')
 @login_required
+@condicional
 def gastos():
     """Lista de gastos"""
     db = get_db()
@@ -243,27 +349,29 @@ def gastos():
     mes_actual = int(request.args.get('mes', hoy.month))
     anio_actual = int(request.args.get('anio', hoy.year))
     
+    inicio, fin = rango_mes(mes_actual, anio_actual)
+    
     # Obtener gastos del mes
     gastos_list = db.execute('''
         SELECT * FROM gastos
-        WHERE TO_CHAR(fecha, 'MM') = ? AND TO_CHAR(fecha, 'YYYY') = ? AND usuario_id = ?
+        WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
         ORDER BY fecha DESC
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchall()
+    ''', (user_id, inicio, fin)).fetchall()
     
     # Calcular totales por categoría
     totales_categorias = db.execute('''
         SELECT categoria, SUM(monto) as total
         FROM gastos
-        WHERE TO_CHAR(fecha, 'MM') = ? AND TO_CHAR(fecha, 'YYYY') = ? AND usuario_id = ?
+        WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
         GROUP BY categoria
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchall()
+    ''', (user_id, inicio, fin)).fetchall()
     
     # Total mensual
     total_mensual = db.execute('''
         SELECT COALESCE(SUM(monto), 0) as total
         FROM gastos
-        WHERE TO_CHAR(fecha, 'MM') = ? AND TO_CHAR(fecha, 'YYYY') = ? AND usuario_id = ?
-    ''', (f'{mes_actual:02d}', str(anio_actual), user_id)).fetchone()['total']
+        WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
+    ''', (user_id, inicio, fin)).fetchone()['total']
     
     # Nombres de meses
     meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
@@ -296,6 +404,7 @@ def nuevo_gasto():
             INSERT INTO gastos (fecha, categoria, descripcion, monto, usuario_id)
             VALUES (%s, %s, %s, %s, %s)
         ''', (fecha, categoria, descripcion, monto, user_id))
+        versiones.incrementar(db, user_id, [fecha])
         
         db.commit()
         db.close()
@@ -313,10 +422,11 @@ def eliminar_gasto(id):
     user_id = session['user_id']
     
     # Verificar que el gasto pertenece al usuario
-    gasto = db.execute('SELECT id FROM gastos WHERE id = %s AND usuario_id = %s', (id, user_id)).fetchone()
+    gasto = db.execute('SELECT id, fecha FROM gastos WHERE id = %s AND usuario_id = %s', (id, user_id)).fetchone()
     
     if gasto:
         db.execute('DELETE FROM gastos WHERE id = %s', (id,))
+        versiones.incrementar(db, user_id, [gasto['fecha']])
         db.commit()
         flash('Gasto eliminado exitosamente', 'success')
     else:
@@ -335,123 +445,60 @@ def exportar_gastos():
     mes = int(request.form.get('mes'))
     anio = int(request.form.get('anio'))
     quincena = request.form.get('quincena')
+    moneda = get_config('moneda_simbolo', 'RD$')
     
-    # Nombres de meses
-    meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    
-    # Definir rango de días según quincena
-    if quincena == 'primera':
-        dia_inicio = 1
-        dia_fin = 15
-        nombre_quincena = '1ra Quincena'
-    else:
-        dia_inicio = 16
-        dia_fin = 31
-        nombre_quincena = '2da Quincena'
-    
-    # Obtener gastos de la quincena
-    gastos_list = db.execute('''
-        SELECT fecha, categoria, descripcion, monto
-        FROM gastos
-        WHERE TO_CHAR(fecha, 'MM') = ? AND TO_CHAR(fecha, 'YYYY') = ?
-        AND CAST(TO_CHAR(fecha, 'DD') AS INTEGER) BETWEEN ? AND ?
-        AND usuario_id = ?
-        ORDER BY fecha ASC
-    ''', (f'{mes:02d}', str(anio), dia_inicio, dia_fin, user_id)).fetchall()
-    
-    # Calcular total
-    total = sum([g['monto'] for g in gastos_list])
-    
+    # Quincena cerrada y sin cambios: el libro ya generado
+    archivo, clave = cache_reportes.buscar(db, 'reporte_gastos', user_id, mes, anio, quincena, moneda)
+    if archivo is None:
+        # Escribir en un temporal (write-only) y enviarlo por partes
+        archivo = archivo_temporal()
+        escribir_reporte_gastos(db, user_id, mes, anio, quincena, moneda, archivo)
+        if clave:
+            cache_reportes.guardar(clave, archivo)
+        archivo.seek(0)
     db.close()
     
-    # Crear archivo Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Gastos {nombre_quincena}"
-    
-    # Configurar columnas
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 20
-    ws.column_dimensions['C'].width = 40
-    ws.column_dimensions['D'].width = 15
-    
-    # Título
-    ws.merge_cells('A1:D1')
-    titulo = ws['A1']
-    titulo.value = f'REPORTE DE GASTOS - {nombre_quincena} de {meses[mes-1]} {anio}'
-    titulo.font = Font(size=14, bold=True, color='FFFFFF')
-    titulo.fill = PatternFill(start_color='0a6ed1', end_color='0a6ed1', fill_type='solid')
-    titulo.alignment = Alignment(horizontal='center', vertical='center')
-    ws.row_dimensions[1].height = 30
-    
-    # Headers
-    headers = ['Fecha', 'Categoría', 'Descripción', 'Monto']
-    header_fill = PatternFill(start_color='D9D9D9', end_color='D9D9D9', fill_type='solid')
-    header_font = Font(bold=True, size=11)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
-    
-    # Datos
-    moneda = get_config('moneda_simbolo', 'RD$')
-    row = 4
-    for gasto in gastos_list:
-        ws.cell(row=row, column=1, value=gasto['fecha']).border = border
-        ws.cell(row=row, column=2, value=gasto['categoria']).border = border
-        ws.cell(row=row, column=3, value=gasto['descripcion'] or '-').border = border
-        ws.cell(row=row, column=4, value=f"{moneda}{gasto['monto']:.2f}").border = border
-        ws.cell(row=row, column=4).alignment = Alignment(horizontal='right')
-        row += 1
-    
-    # Total
-    row += 1
-    ws.cell(row=row, column=3, value='TOTAL:').font = Font(bold=True, size=12)
-    ws.cell(row=row, column=3).alignment = Alignment(horizontal='right')
-    total_cell = ws.cell(row=row, column=4, value=f"{moneda}{total:.2f}")
-    total_cell.font = Font(bold=True, size=12, color='FFFFFF')
-    total_cell.fill = PatternFill(start_color='107e3e', end_color='107e3e', fill_type='solid')
-    total_cell.alignment = Alignment(horizontal='right')
-    total_cell.border = border
-    
-    # Guardar en memoria
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f'Gastos_{nombre_quincena.replace(" ", "_")}_{meses[mes-1]}_{anio}.xlsx'
     return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        archivo,
+        mimetype=MIMETYPE_XLSX,
         as_attachment=True,
-        download_name=filename
+        download_name=nombre_reporte_gastos(mes, anio, quincena)
     )
 
 # ==================== INVENTARIO ====================
 
 @app.route('/inventario')
 @login_required
+@condicional
 def inventario():
-    """Lista de productos en inventario"""
+    """Lista de productos en inventario (paginada por cursor, con búsqueda)"""
     db = get_db()
     user_id = session['user_id']
     
-    productos = db.execute('''
+    q = request.args.get('q', '').strip()
+    por_pagina = tamano_pagina(request.args.get('por_pagina'))
+    try:
+        cursor = decodificar_cursor(request.args.get('cursor'), 2)
+    except CursorInvalido:
+        return redirect(url_for('inventario', q=q or None))
+    
+    condiciones = ['usuario_id = %s']
+    params = [user_id]
+    if q:
+        condicion, params_q = condicion_busqueda_productos(q)
+        condiciones.append(condicion)
+        params.extend(params_q)
+    if cursor:
+        condiciones.append('(fecha_registro, id) < (%s, %s)')
+        params.extend(cursor)
+    
+    filas = db.execute(f'''
         SELECT * FROM productos
-        WHERE usuario_id = %s
-        ORDER BY fecha_registro DESC
-    ''', (user_id,)).fetchall()
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY fecha_registro DESC, id DESC
+        LIMIT %s
+    ''', params + [por_pagina + 1]).fetchall()
+    productos, siguiente = cortar_pagina(filas, por_pagina, lambda p: (p['fecha_registro'], p['id']))
     
     # Valor total del inventario
     valor_total = db.execute('''
@@ -461,7 +508,8 @@ def inventario():
     ''', (user_id,)).fetchone()['total']
     
     db.close()
-    return render_template('inventario.html', productos=productos, valor_total=valor_total)
+    return render_template('inventario.html', productos=productos, valor_total=valor_total,
+                         q=q, siguiente=siguiente, primera_pagina=cursor is None)
 
 @app.route('/inventario/nuevo', methods=['GET', 'POST'])
 @login_required
@@ -490,6 +538,7 @@ def nuevo_producto():
             INSERT INTO productos (nombre, descripcion, cantidad, costo_unitario, precio_venta, stock_minimo, estado, usuario_id)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         ''', (nombre, descripcion, cantidad, costo_unitario, precio_venta, stock_minimo, estado, user_id))
+        versiones.incrementar(db, user_id)
         
         db.commit()
         db.close()
@@ -522,11 +571,17 @@ def editar_producto(id):
         else:
             estado = 'disponible'
         
+        anterior = db.execute('SELECT nombre FROM productos WHERE id = %s AND usuario_id = %s',
+                              (id, user_id)).fetchone()
         db.execute('''
             UPDATE productos
             SET nombre = %s, descripcion = %s, cantidad = %s, costo_unitario = %s, precio_venta = %s, stock_minimo = %s, estado = %s
             WHERE id = %s AND usuario_id = %s
         ''', (nombre, descripcion, cantidad, costo_unitario, precio_venta, stock_minimo, estado, id, user_id))
+        versiones.incrementar(db, user_id)
+        if anterior and anterior['nombre'] != nombre:
+            # El nombre del producto sale en los reportes de todos los meses
+            versiones.incrementar_periodos(db, user_id)
         
         db.commit()
         db.close()
@@ -557,6 +612,7 @@ def eliminar_producto(id):
         flash('No se puede eliminar el producto porque tiene ventas asociadas', 'error')
     else:
         db.execute('DELETE FROM productos WHERE id = %s AND usuario_id = %s', (id, user_id))
+        versiones.incrementar(db, user_id)
         db.commit()
         flash('Producto eliminado exitosamente', 'success')
     
@@ -567,31 +623,93 @@ def eliminar_producto(id):
 
 @app.route('/ventas')
 @login_required
+@condicional
 def ventas():
-    """Lista de ventas"""
+    """Lista de ventas paginada por cursor con filtros"""
     db = get_db()
     user_id = session['user_id']
     
-    ventas_list = db.execute('''
+    por_pagina = tamano_pagina(request.args.get('por_pagina'))
+    filtros = {k: request.args.get(k, '').strip() for k in
+               ('desde', 'hasta', 'cliente', 'producto_id', 'tipo_venta', 'estado_pago')}
+    
+    # Filtros de servidor (cada uno respaldado por un índice que empieza en usuario_id)
+    condiciones = ['v.usuario_id = %s']
+    params = [user_id]
+    try:
+        if filtros['desde']:
+            condiciones.append('v.fecha_venta >= %s')
+            params.append(datetime.strptime(filtros['desde'], '%Y-%m-%d').date())
+        if filtros['hasta']:
+            condiciones.append('v.fecha_venta <= %s')
+            params.append(datetime.strptime(filtros['hasta'], '%Y-%m-%d').date())
+        if filtros['producto_id']:
+            condiciones.append('v.producto_id = %s')
+            params.append(int(filtros['producto_id']))
+    except ValueError:
+        flash('Filtros inválidos', 'error')
+        return redirect(url_for('ventas'))
+    if filtros['cliente']:
+        condiciones.append("lower(v.cliente_nombre) LIKE %s")
+        params.append(patron_like(filtros['cliente'].lower()) + '%')
+    if filtros['tipo_venta'] in ('contado', 'credito'):
+        condiciones.append('v.tipo_venta = %s')
+        params.append(filtros['tipo_venta'])
+    if filtros['estado_pago'] in ('completado', 'pendiente', 'parcial'):
+        condiciones.append('v.estado_pago = %s')
+        params.append(filtros['estado_pago'])
+    hay_filtros = len(condiciones) > 1
+    where = ' AND '.join(condiciones)
+    
+    # Página actual: (fecha_venta, fecha_registro, id) < cursor
+    try:
+        cursor = decodificar_cursor(request.args.get('cursor'), 3)
+    except CursorInvalido:
+        return redirect(url_for('ventas', **{k: v for k, v in filtros.items() if v}))
+    condicion_cursor = ''
+    params_pagina = list(params)
+    if cursor:
+        condicion_cursor = 'AND (v.fecha_venta, v.fecha_registro, v.id) < (%s, %s, %s)'
+        params_pagina.extend(cursor)
+    
+    filas = db.execute(f'''
         SELECT v.*, p.nombre as producto_nombre
         FROM ventas v
         JOIN productos p ON v.producto_id = p.id
-        WHERE v.usuario_id = %s
-        ORDER BY v.fecha_venta DESC, v.fecha_registro DESC
-    ''', (user_id,)).fetchall()
-    
-    # Totales
-    totales = db.execute('''
-        SELECT 
-            COALESCE(SUM(total_vendido), 0) as total_vendido,
-            COALESCE(SUM(ganancia), 0) as total_ganancia,
-            COALESCE(SUM(diezmo), 0) as total_diezmo
-        FROM ventas
-        WHERE usuario_id = %s
-    ''', (user_id,)).fetchone()
+        WHERE {where} {condicion_cursor}
+        ORDER BY v.fecha_venta DESC, v.fecha_registro DESC, v.id DESC
+        LIMIT %s
+    ''', params_pagina + [por_pagina + 1]).fetchall()
+    ventas_list, siguiente = cortar_pagina(
+        filas, por_pagina, lambda v: (v['fecha_venta'], v['fecha_registro'], v['id']))
+    
+    # Totales: sin filtros salen del resumen mensual; con filtros, un agregado aparte
+    if hay_filtros:
+        totales = db.execute(f'''
+            SELECT 
+                COALESCE(SUM(total_vendido), 0) as total_vendido,
+                COALESCE(SUM(ganancia), 0) as total_ganancia,
+                COALESCE(SUM(diezmo), 0) as total_diezmo,
+                COUNT(*) as num_ventas
+            FROM ventas v
+            WHERE {where}
+        ''', params).fetchone()
+    else:
+        totales = db.execute('''
+            SELECT 
+                COALESCE(SUM(total_vendido), 0) as total_vendido,
+                COALESCE(SUM(ganancia), 0) as total_ganancia,
+                COALESCE(SUM(diezmo), 0) as total_diezmo,
+                COALESCE(SUM(num_ventas), 0) as num_ventas
+            FROM resumen_mensual
+            WHERE usuario_id = %s
+        ''', (user_id,)).fetchone()
     
     db.close()
-    return render_template('ventas.html', ventas=ventas_list, totales=totales)
+    return render_template('ventas.html', ventas=ventas_list, totales=totales,
+                         filtros=filtros, hay_filtros=hay_filtros,
+                         siguiente=siguiente, primera_pagina=cursor is None,
+                         por_pagina=por_pagina)
 
 @app.route('/ventas/nueva', methods=['GET', 'POST'])
 @login_required
@@ -608,17 +726,29 @@ def nueva_venta():
         tipo_venta = request.form.get('tipo_venta')
         fecha_venta = request.form.get('fecha_venta')
         
-        # Obtener producto
-        producto = db.execute('SELECT * FROM productos WHERE id = %s AND usuario_id = %s', (producto_id, user_id)).fetchone()
+        # Descontar stock solo si alcanza: la condición y la resta ocurren en la
+        # misma sentencia, así dos ventas simultáneas no pueden sobrevender
+        producto = db.execute('''
+            UPDATE productos
+            SET cantidad = cantidad - %s,
+                estado = CASE
+                    WHEN cantidad - %s = 0 THEN 'agotado'
+                    WHEN cantidad - %s <= stock_minimo THEN 'bajo'
+                    ELSE 'disponible'
+                END
+            WHERE id = %s AND usuario_id = %s AND cantidad >= %s
+            RETURNING precio_venta, costo_unitario
+        ''', (cantidad, cantidad, cantidad, producto_id, user_id, cantidad)).fetchone()
         
         if not producto:
-            flash('Producto no encontrado', 'error')
-            db.close()
-            return redirect(url_for('nueva_venta'))
-        
-        # Verificar stock
-        if producto['cantidad'] < cantidad:
-            flash(f'Stock insuficiente. Disponible: {producto["cantidad"]} unidades', 'error')
+            # Solo en el camino de error se vuelve a leer, para dar el mensaje correcto
+            db.rollback()
+            existente = db.execute('SELECT cantidad FROM productos WHERE id = %s AND usuario_id = %s',
+                                   (producto_id, user_id)).fetchone()
+            if not existente:
+                flash('Producto no encontrado', 'error')
+            else:
+                flash(f'Stock insuficiente. Disponible: {existente["cantidad"]} unidades', 'error')
             db.close()
             return redirect(url_for('nueva_venta'))
         
@@ -627,100 +757,212 @@ def nueva_venta():
         total_vendido = precio_unitario * cantidad
         costo_total = producto['costo_unitario'] * cantidad
         ganancia = total_vendido - costo_total
-        diezmo = total_vendido * 0.10
+        diezmo = (total_vendido * TASA_DIEZMO).quantize(Decimal('0.01'))
         
         # Determinar estado de pago
         estado_pago = 'completado' if tipo_venta == 'contado' else 'pendiente'
         
-        # Insertar venta
-        cursor = db.execute('''
+        # Insertar venta (SQLite no admite INSERT dentro de un WITH, así que el
+        # pago automático de contado va en una segunda sentencia)
+        venta_id = db.execute('''
             INSERT INTO ventas (producto_id, cliente_nombre, cliente_telefono, cantidad, precio_unitario, 
-                               total_vendido, costo_total, ganancia, diezmo, tipo_venta, estado_pago, fecha_venta, usuario_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                               total_vendido, costo_total, ganancia, diezmo, tipo_venta, estado_pago, fecha_venta, usuario_id,
+                               total_pagado, saldo_pendiente)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
         ''', (producto_id, cliente_nombre, cliente_telefono, cantidad, precio_unitario,
-              total_vendido, costo_total, ganancia, diezmo, tipo_venta, estado_pago, fecha_venta, user_id))
-        
-        venta_id = cursor.lastrowid
+              total_vendido, costo_total, ganancia, diezmo, tipo_venta, estado_pago, fecha_venta, user_id,
+              total_vendido if tipo_venta == 'contado' else 0, 0 if tipo_venta == 'contado' else total_vendido)
+        ).fetchone()['id']
         
-        # Si es venta al contado, registrar pago automático
         if tipo_venta == 'contado':
             db.execute('''
                 INSERT INTO pagos (venta_id, monto, fecha_pago, metodo_pago, notas, usuario_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (venta_id, total_vendido, fecha_venta, 'Contado', 'Pago completo al contado', user_id))
-        
-        # Actualizar inventario
-        nueva_cantidad = producto['cantidad'] - cantidad
-        if nueva_cantidad == 0:
-            nuevo_estado = 'agotado'
-        elif nueva_cantidad <= producto['stock_minimo']:
-            nuevo_estado = 'bajo'
-        else:
-            nuevo_estado = 'disponible'
+                VALUES (%s, %s, %s, 'Contado', 'Pago completo al contado', %s)
+            ''', (venta_id, total_vendido, fecha_venta, user_id))
         
-        db.execute('''
-            UPDATE productos
-            SET cantidad = %s, estado = %s
-            WHERE id = %s
-        ''', (nueva_cantidad, nuevo_estado, producto_id))
+        # Acumular en el resumen mensual
+        sumar_venta(db, user_id, fecha_venta, total_vendido, costo_total, ganancia, diezmo,
+                    credito=tipo_venta != 'contado')
         
         # Actualizar o crear diezmo mensual
         mes_venta = int(fecha_venta.split('-')[1])
         anio_venta = int(fecha_venta.split('-')[0])
         
-        diezmo_existente = db.execute('''
-            SELECT * FROM diezmos_mensuales
-            WHERE mes = %s AND anio = %s AND usuario_id = %s
-        ''', (mes_venta, anio_venta, user_id)).fetchone()
-        
-        if diezmo_existente:
-            db.execute('''
-                UPDATE diezmos_mensuales
-                SET total_diezmo = total_diezmo + %s
-                WHERE mes = %s AND anio = %s AND usuario_id = %s
-            ''', (diezmo, mes_venta, anio_venta, user_id))
-        else:
-            db.execute('''
-                INSERT INTO diezmos_mensuales (mes, anio, total_diezmo, usuario_id)
-                VALUES (%s, %s, %s, %s)
-            ''', (mes_venta, anio_venta, diezmo, user_id))
+        db.execute('''
+            INSERT INTO diezmos_mensuales (mes, anio, total_diezmo, usuario_id)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (mes, anio, usuario_id)
+            DO UPDATE SET total_diezmo = diezmos_mensuales.total_diezmo + EXCLUDED.total_diezmo
+        ''', (mes_venta, anio_venta, diezmo, user_id))
+        versiones.incrementar(db, user_id, [fecha_venta])
         
         db.commit()
         db.close()
+        estadisticas_cache.invalidar_prefijo(user_id)
         
         flash('Venta registrada exitosamente', 'success')
         return redirect(url_for('ventas'))
     
-    # GET - mostrar formulario
-    productos = db.execute('''
-        SELECT * FROM productos
-        WHERE cantidad > 0 AND usuario_id = %s
-        ORDER BY nombre
-    ''', (user_id,)).fetchall()
+    # GET - mostrar formulario (el producto se elige con el buscador)
+    producto = None
+    if request.args.get('producto_id', '').isdigit():
+        producto = db.execute('''
+            SELECT id, nombre, precio_venta, cantidad FROM productos
+            WHERE id = %s AND usuario_id = %s AND cantidad > 0
+        ''', (int(request.args['producto_id']), user_id)).fetchone()
     
     db.close()
-    return render_template('nueva_venta.html', productos=productos)
+    return render_template('nueva_venta.html', producto=producto)
+
+@app.route('/ventas/carrito', methods=['GET', 'POST'])
+@login_required
+def venta_carrito():
+    """Venta de varios productos (carrito) en una sola transacción"""
+    if request.method == 'GET':
+        return render_template('carrito_venta.html')
+    
+    db = get_db()
+    user_id = session['user_id']
+    
+    # Acepta JSON {cliente_nombre, ..., lineas: [{producto_id, cantidad}]} o el formulario
+    def error(mensaje):
+        db.rollback()
+        if request.is_json:
+            return jsonify({'error': mensaje}), 400
+        flash(mensaje, 'error')
+        return redirect(url_for('venta_carrito'))
+    
+    if request.is_json:
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, dict) or not isinstance(datos.get('lineas', []), list) \
+                or not all(isinstance(l, dict) for l in datos.get('lineas', [])):
+            return error('Se esperaba un objeto con lineas: [{producto_id, cantidad}]')
+        lineas_raw = [(l.get('producto_id'), l.get('cantidad')) for l in datos.get('lineas', [])]
+    else:
+        datos = request.form
+        lineas_raw = list(zip(request.form.getlist('producto_id'), request.form.getlist('cantidad')))
+    cliente_nombre = datos.get('cliente_nombre')
+    cliente_telefono = datos.get('cliente_telefono') or ''
+    tipo_venta = datos.get('tipo_venta') or 'contado'
+    fecha_venta = datos.get('fecha_venta') or datetime.now().strftime('%Y-%m-%d')
+    
+    if tipo_venta not in ('contado', 'credito'):
+        return error('Tipo de venta inválido (contado o credito)')
+    try:
+        lineas = [(int(p), int(c)) for p, c in lineas_raw]
+        datetime.strptime(fecha_venta, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return error('Datos de la venta inválidos')
+    if not isinstance(cliente_nombre, str) or not isinstance(cliente_telefono, str):
+        return error('Datos del cliente inválidos')
+    if not cliente_nombre or not lineas or any(c <= 0 for _, c in lineas):
+        return error('Indica el cliente y al menos un producto con cantidad mayor a cero')
+    
+    # Cantidad total pedida por producto (un producto puede repetirse en el carrito)
+    pedido = {}
+    for producto_id, cantidad in lineas:
+        pedido[producto_id] = pedido.get(producto_id, 0) + cantidad
+    
+    # Bloquear los productos en orden de id: dos carritos con los mismos
+    # productos esperan en el mismo orden en vez de bloquearse mutuamente
+    productos = {p['id']: p for p in db.execute('''
+        SELECT id, nombre, cantidad, precio_venta, costo_unitario
+        FROM productos
+        WHERE usuario_id = %s AND id = ANY(%s)
+        ORDER BY id
+        FOR UPDATE
+    ''', (user_id, sorted(pedido))).fetchall()}
+    
+    for producto_id, cantidad in pedido.items():
+        producto = productos.get(producto_id)
+        if not producto:
+            return error('Producto no encontrado')
+        if producto['cantidad'] < cantidad:
+            return error(f'Stock insuficiente de {producto["nombre"]}. Disponible: {producto["cantidad"]} unidades')
+    
+    estado_pago = 'completado' if tipo_venta == 'contado' else 'pendiente'
+    filas_ventas = []
+    for producto_id, cantidad in lineas:
+        producto = productos[producto_id]
+        total_vendido = producto['precio_venta'] * cantidad
+        costo_total = producto['costo_unitario'] * cantidad
+        filas_ventas.append((producto_id, cliente_nombre, cliente_telefono, cantidad, producto['precio_venta'],
+                             total_vendido, costo_total, total_vendido - costo_total,
+                             (total_vendido * TASA_DIEZMO).quantize(Decimal('0.01')),
+                             tipo_venta, estado_pago, fecha_venta, user_id,
+                             total_vendido if tipo_venta == 'contado' else 0,
+                             0 if tipo_venta == 'contado' else total_vendido))
+    
+    # Todas las ventas en un INSERT por lotes
+    ids = db.execute_values('''
+        INSERT INTO ventas (producto_id, cliente_nombre, cliente_telefono, cantidad, precio_unitario,
+                           total_vendido, costo_total, ganancia, diezmo, tipo_venta, estado_pago, fecha_venta, usuario_id,
+                           total_pagado, saldo_pendiente)
+        VALUES %s
+        RETURNING id
+    ''', filas_ventas, fetch=True)
+    
+    # Pagos automáticos de contado
+    if tipo_venta == 'contado':
+        db.execute_values('''
+            INSERT INTO pagos (venta_id, monto, fecha_pago, metodo_pago, notas, usuario_id)
+            VALUES %s
+        ''', [(fila['id'], venta[5], fecha_venta, 'Contado', 'Pago completo al contado', user_id)
+              for fila, venta in zip(ids, filas_ventas)])
+    
+    # Descontar stock de todos los productos en un UPDATE ... FROM (VALUES ...)
+    db.execute_values('''
+        UPDATE productos AS p
+        SET cantidad = p.cantidad - d.cantidad,
+            estado = CASE
+                WHEN p.cantidad - d.cantidad = 0 THEN 'agotado'
+                WHEN p.cantidad - d.cantidad <= p.stock_minimo THEN 'bajo'
+                ELSE 'disponible'
+            END
+        FROM (VALUES %s) AS d(id, cantidad)
+        WHERE p.id = d.id
+    ''', list(pedido.items()), template='(%s::integer, %s::integer)')
+    
+    total_vendido = sum(v[5] for v in filas_ventas)
+    costo_total = sum(v[6] for v in filas_ventas)
+    diezmo = sum(v[8] for v in filas_ventas)
+    
+    # Diezmo del mes y resumen mensual: un upsert cada uno para todo el carrito
+    mes_venta = int(fecha_venta.split('-')[1])
+    anio_venta = int(fecha_venta.split('-')[0])
+    db.execute('''
+        INSERT INTO diezmos_mensuales (mes, anio, total_diezmo, usuario_id)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (mes, anio, usuario_id)
+        DO UPDATE SET total_diezmo = diezmos_mensuales.total_diezmo + EXCLUDED.total_diezmo
+    ''', (mes_venta, anio_venta, diezmo, user_id))
+    sumar_venta(db, user_id, fecha_venta, total_vendido, costo_total, total_vendido - costo_total, diezmo,
+                credito=tipo_venta != 'contado', num_ventas=len(filas_ventas))
+    versiones.incrementar(db, user_id, [fecha_venta])
+    
+    db.commit()
+    estadisticas_cache.invalidar_prefijo(user_id)
+    
+    if request.is_json:
+        return jsonify({'ventas': [fila['id'] for fila in ids], 'total': float(total_vendido)}), 201
+    flash(f'Venta registrada exitosamente ({len(filas_ventas)} productos)', 'success')
+    return redirect(url_for('ventas'))
 
 # ==================== CUENTAS POR COBRAR ====================
 
 @app.route('/cuentas-por-cobrar')
 @login_required
+@condicional
 def cuentas_por_cobrar():
     """Cuentas por cobrar"""
     db = get_db()
     user_id = session['user_id']
     
     ventas_credito = db.execute('''
-        SELECT v.*, p.nombre as producto_nombre,
-               COALESCE(pagos.total_pagado, 0) as total_pagado,
-               (v.total_vendido - COALESCE(pagos.total_pagado, 0)) as saldo_pendiente
+        SELECT v.*, p.nombre as producto_nombre
         FROM ventas v
         JOIN productos p ON v.producto_id = p.id
-        LEFT JOIN (
-            SELECT venta_id, SUM(monto) as total_pagado
-            FROM pagos
-            GROUP BY venta_id
-        ) pagos ON v.id = pagos.venta_id
         WHERE v.tipo_venta = 'credito' AND v.estado_pago != 'completado' AND v.usuario_id = ?
         ORDER BY v.fecha_venta DESC
     ''', (user_id,)).fetchall()
@@ -733,6 +975,7 @@ def cuentas_por_cobrar():
 
 @app.route('/pagos/<int:venta_id>')
 @login_required
+@condicional
 def ver_pagos(venta_id):
     """Ver pagos de una venta"""
     db = get_db()
@@ -757,13 +1000,9 @@ def ver_pagos(venta_id):
         ORDER BY fecha_pago DESC
     ''', (venta_id,)).fetchall()
     
-    # Total pagado
-    total_pagado = sum([p['monto'] for p in pagos])
-    saldo_pendiente = venta['total_vendido'] - total_pagado
-    
     db.close()
     return render_template('ver_pagos.html', venta=venta, pagos=pagos, 
-                         total_pagado=total_pagado, saldo_pendiente=saldo_pendiente)
+                         total_pagado=venta['total_pagado'], saldo_pendiente=venta['saldo_pendiente'])
 
 @app.route('/pagos/registrar/<int:venta_id>', methods=['POST'])
 @login_required
@@ -772,32 +1011,40 @@ def registrar_pago(venta_id):
     db = get_db()
     user_id = session['user_id']
     
-    # Verificar venta
-    venta = db.execute('SELECT * FROM ventas WHERE id = %s AND usuario_id = %s', (venta_id, user_id)).fetchone()
-    
-    if not venta:
-        flash('Venta no encontrada', 'error')
-        db.close()
-        return redirect(url_for('cuentas_por_cobrar'))
-    
     # Obtener datos del formulario
-    monto = float(request.form.get('monto'))
+    try:
+        monto = Decimal(request.form.get('monto')).quantize(Decimal('0.01'))
+    except (TypeError, ArithmeticError):
+        monto = Decimal(0)
     fecha_pago = request.form.get('fecha_pago')
     metodo_pago = request.form.get('metodo_pago')
     notas = request.form.get('notas', '')
     
-    # Calcular total pagado hasta ahora
-    total_pagado = db.execute('''
-        SELECT COALESCE(SUM(monto), 0) as total
-        FROM pagos
-        WHERE venta_id = %s
-    ''', (venta_id,)).fetchone()['total']
+    if not monto.is_finite() or monto <= 0:
+        flash('El monto debe ser mayor a cero', 'error')
+        db.close()
+        return redirect(url_for('ver_pagos', venta_id=venta_id))
     
-    saldo_pendiente = venta['total_vendido'] - total_pagado
+    # Aplicar el pago al saldo solo si no lo excede (verificación y resta en
+    # la misma sentencia: dos pagos simultáneos no pueden pasarse del total)
+    venta = db.execute('''
+        UPDATE ventas
+        SET total_pagado = total_pagado + %s,
+            saldo_pendiente = saldo_pendiente - %s,
+            estado_pago = CASE WHEN saldo_pendiente - %s <= 0 THEN 'completado' ELSE 'parcial' END
+        WHERE id = %s AND usuario_id = %s AND saldo_pendiente >= %s
+        RETURNING tipo_venta, fecha_venta
+    ''', (monto, monto, monto, venta_id, user_id, monto)).fetchone()
     
-    # Validar monto
-    if monto > saldo_pendiente:
-        flash(f'El monto excede el saldo pendiente ({saldo_pendiente:.2f})', 'error')
+    if not venta:
+        db.rollback()
+        existente = db.execute('SELECT saldo_pendiente FROM ventas WHERE id = %s AND usuario_id = %s',
+                               (venta_id, user_id)).fetchone()
+        if not existente:
+            flash('Venta no encontrada', 'error')
+            db.close()
+            return redirect(url_for('cuentas_por_cobrar'))
+        flash(f'El monto excede el saldo pendiente ({existente["saldo_pendiente"]:.2f})', 'error')
         db.close()
         return redirect(url_for('ver_pagos', venta_id=venta_id))
     
@@ -807,18 +1054,9 @@ def registrar_pago(venta_id):
         VALUES (%s, %s, %s, %s, %s, %s)
     ''', (venta_id, monto, fecha_pago, metodo_pago, notas, user_id))
     
-    # Actualizar estado de la venta
-    nuevo_total_pagado = total_pagado + monto
-    if nuevo_total_pagado >= venta['total_vendido']:
-        nuevo_estado = 'completado'
-    else:
-        nuevo_estado = 'parcial'
-    
-    db.execute('''
-        UPDATE ventas
-        SET estado_pago = %s
-        WHERE id = %s
-    ''', (nuevo_estado, venta_id))
+    if venta['tipo_venta'] == 'credito':
+        restar_pendiente(db, user_id, venta['fecha_venta'], monto)
+    versiones.incrementar(db, user_id)
     
     db.commit()
     db.close()
@@ -830,6 +1068,7 @@ def registrar_pago(venta_id):
 
 @app.route('/diezmos')
 @login_required
+@condicional
 def diezmos():
     """Diezmos mensuales"""
     db = get_db()
@@ -875,6 +1114,7 @@ def marcar_diezmo(id):
             SET estado = %s, fecha_entrega = %s
             WHERE id = %s
         ''', (nuevo_estado, fecha_entrega, id))
+        versiones.incrementar(db, user_id)
         
         db.commit()
         flash(f'Diezmo marcado como {nuevo_estado}', 'success')
@@ -899,100 +1139,177 @@ def exportar_reporte():
     
     mes = int(request.form.get('mes'))
     anio = int(request.form.get('anio'))
+    moneda = get_config('moneda_simbolo', 'RD$')
     
-    # Obtener ventas del mes
-    ventas = db.execute('''
-        SELECT v.*, p.nombre as producto_nombre
-        FROM ventas v
-        JOIN productos p ON v.producto_id = p.id
-        WHERE TO_CHAR(v.fecha_venta, 'MM') = ? AND TO_CHAR(v.fecha_venta, 'YYYY') = ? AND v.usuario_id = ?
-        ORDER BY v.fecha_venta
-    ''', (f'{mes:02d}', str(anio), user_id)).fetchall()
-    
+    # Mes cerrado y sin cambios: el libro ya generado
+    archivo, clave = cache_reportes.buscar(db, 'reporte_ventas', user_id, mes, anio, None, moneda)
+    if archivo is None:
+        # Escribir en un temporal (write-only) y enviarlo por partes
+        archivo = archivo_temporal()
+        escribir_reporte_ventas(db, user_id, mes, anio, moneda, archivo)
+        if clave:
+            cache_reportes.guardar(clave, archivo)
+        archivo.seek(0)
     db.close()
     
-    # Nombres de meses
-    meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    
-    # Crear Excel directamente
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Ventas {meses[mes-1]} {anio}"
-    
-    # Título
-    ws.merge_cells('A1:H1')
-    titulo = ws['A1']
-    titulo.value = f'REPORTE DE VENTAS - {meses[mes-1]} {anio}'
-    titulo.font = Font(size=14, bold=True, color='FFFFFF')
-    titulo.fill = PatternFill(start_color='0a6ed1', end_color='0a6ed1', fill_type='solid')
-    titulo.alignment = Alignment(horizontal='center', vertical='center')
-    ws.row_dimensions[1].height = 30
-    
-    # Headers
-    headers = ['Fecha', 'Cliente', 'Producto', 'Cantidad', 'Precio Unit.', 'Total', 'Ganancia', 'Diezmo']
-    header_fill = PatternFill(start_color='D9D9D9', end_color='D9D9D9', fill_type='solid')
-    header_font = Font(bold=True, size=11)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    return send_file(
+        archivo,
+        mimetype=MIMETYPE_XLSX,
+        as_attachment=True,
+        download_name=nombre_reporte_ventas(mes, anio)
     )
+
+@app.route('/reportes/trabajos', methods=['POST'])
+@login_required
+def crear_trabajo_exportacion():
+    """Encola un reporte Excel para generarlo en segundo plano"""
+    db = get_db()
+    user_id = session['user_id']
     
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
+    tipo = request.form.get('tipo', 'reporte_ventas')
+    if tipo not in TIPOS_TRABAJO:
+        return jsonify({'error': 'Tipo de reporte inválido'}), 400
+    try:
+        parametros = {
+            'mes': int(request.form.get('mes')),
+            'anio': int(request.form.get('anio')),
+            'moneda': get_config('moneda_simbolo', 'RD$')
+        }
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Mes y año son obligatorios'}), 400
+    if tipo == 'reporte_gastos':
+        parametros['quincena'] = request.form.get('quincena', 'primera')
+    
+    limpiar_trabajos_vencidos(db)
+    trabajo_id = crear_trabajo(db, user_id, tipo, parametros)
+    db.commit()
+    encolar_trabajo(trabajo_id)
     
-    # Datos
-    moneda = get_config('moneda_simbolo', 'RD$')
-    row = 4
-    total_vendido = 0
-    total_ganancia = 0
-    total_diezmo = 0
-    
-    for venta in ventas:
-        ws.cell(row=row, column=1, value=venta['fecha_venta']).border = border
-        ws.cell(row=row, column=2, value=venta['cliente_nombre']).border = border
-        ws.cell(row=row, column=3, value=venta['producto_nombre']).border = border
-        ws.cell(row=row, column=4, value=venta['cantidad']).border = border
-        ws.cell(row=row, column=5, value=f"{moneda}{venta['precio_unitario']:.2f}").border = border
-        ws.cell(row=row, column=6, value=f"{moneda}{venta['total_vendido']:.2f}").border = border
-        ws.cell(row=row, column=7, value=f"{moneda}{venta['ganancia']:.2f}").border = border
-        ws.cell(row=row, column=8, value=f"{moneda}{venta['diezmo']:.2f}").border = border
-        
-        total_vendido += venta['total_vendido']
-        total_ganancia += venta['ganancia']
-        total_diezmo += venta['diezmo']
-        row += 1
-    
-    # Totales
-    row += 1
-    ws.cell(row=row, column=5, value='TOTALES:').font = Font(bold=True, size=12)
-    ws.cell(row=row, column=5).alignment = Alignment(horizontal='right')
-    ws.cell(row=row, column=6, value=f"{moneda}{total_vendido:.2f}").font = Font(bold=True, size=12)
-    ws.cell(row=row, column=6).fill = PatternFill(start_color='107e3e', end_color='107e3e', fill_type='solid')
-    ws.cell(row=row, column=7, value=f"{moneda}{total_ganancia:.2f}").font = Font(bold=True, size=12)
-    ws.cell(row=row, column=8, value=f"{moneda}{total_diezmo:.2f}").font = Font(bold=True, size=12)
-    
-    # Guardar en memoria
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f'Reporte_{meses[mes-1]}_{anio}.xlsx'
+    return jsonify({
+        'id': trabajo_id,
+        'estado': 'pendiente',
+        'url_estado': url_for('estado_trabajo_exportacion', trabajo_id=trabajo_id)
+    }), 202
+
+@app.route('/reportes/trabajos/<int:trabajo_id>')
+@login_required
+def estado_trabajo_exportacion(trabajo_id):
+    """Estado y progreso de un trabajo de exportación"""
+    db = get_db()
+    trabajo = obtener_trabajo(db, trabajo_id, session['user_id'])
+    db.close()
+    
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    respuesta = {
+        'id': trabajo['id'],
+        'tipo': trabajo['tipo'],
+        'estado': trabajo['estado'],
+        'progreso': trabajo['progreso'],
+        'error': trabajo['error']
+    }
+    if trabajo['estado'] == 'completado':
+        respuesta['url_descarga'] = url_for('descargar_trabajo_exportacion', trabajo_id=trabajo_id)
+    return jsonify(respuesta)
+
+@app.route('/reportes/trabajos/<int:trabajo_id>/descargar')
+@login_required
+def descargar_trabajo_exportacion(trabajo_id):
+    """Descarga el archivo de un trabajo terminado"""
+    db = get_db()
+    trabajo = obtener_trabajo(db, trabajo_id, session['user_id'])
+    db.close()
+    
+    if not trabajo or trabajo['estado'] != 'completado' or not os.path.exists(trabajo['archivo']):
+        flash('El reporte no está disponible o ya venció', 'error')
+        return redirect(url_for('reportes'))
     
     return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        trabajo['archivo'],
+        mimetype=MIMETYPE_XLSX,
         as_attachment=True,
-        download_name=filename
+        download_name=trabajo['nombre_descarga']
     )
 
+@app.route('/exportar/<tabla>.<formato>')
+@login_required
+def exportar_datos(tabla, formato):
+    """Exportación masiva por streaming: /exportar/ventas.csv?desde=&hasta=&gzip=1"""
+    if tabla not in EXPORTABLES or formato not in MIMETYPES:
+        return jsonify({'error': 'Exportación no disponible'}), 404
+    
+    user_id = session['user_id']
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else None
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({'error': 'Fechas inválidas (YYYY-MM-DD)'}), 400
+    comprimir = request.args.get('gzip') == '1'
+    
+    sql, params, columnas = consulta_exportacion(tabla, user_id, desde, hasta)
+    db = get_db()
+    
+    def generar():
+        cur = db.cursor_servidor(f'exportar_{tabla}', tuplas=True)
+        try:
+            cur.execute(sql, params)
+            serializar = generar_csv if formato == 'csv' else generar_ndjson
+            yield from serializar(cur, columnas)
+        finally:
+            cur.close()
+    
+    cuerpo = generar()
+    nombre = f"{tabla}_{desde or 'inicio'}_{hasta or 'hoy'}.{formato}"
+    mimetype = MIMETYPES[formato]
+    if comprimir:
+        cuerpo = comprimir_gzip(cuerpo)
+        nombre += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(stream_with_context(cuerpo), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={nombre}'})
+
+@app.route('/importar/<tabla>', methods=['GET', 'POST'])
+@login_required
+def importar_datos(tabla):
+    """Importación masiva de productos o gastos desde CSV / XLSX"""
+    if tabla not in IMPORTABLES:
+        flash('Importación no disponible', 'error')
+        return redirect(url_for('dashboard'))
+    
+    columnas = [(col, requerida) for col, _, requerida, _ in IMPORTABLES[tabla]]
+    archivo = request.files.get('archivo')
+    if request.method == 'GET' or not archivo or not archivo.filename:
+        if request.method == 'POST':
+            flash('Selecciona un archivo', 'error')
+        return render_template('importar.html', tabla=tabla, columnas=columnas, resultado=None)
+    
+    db = get_db()
+    user_id = session['user_id']
+    todo_o_nada = request.form.get('todo_o_nada') == '1'
+    try:
+        resultado = importar(db, tabla, user_id, archivo.stream, archivo.filename, todo_o_nada)
+    except ArchivoInvalido as e:
+        db.rollback()
+        flash(str(e), 'error')
+        return render_template('importar.html', tabla=tabla, columnas=columnas, resultado=None)
+    
+    if resultado['aplicado']:
+        versiones.incrementar(db, user_id)
+        versiones.incrementar_periodos(db, user_id)
+        db.commit()
+        flash(f"Importación completada: {resultado['insertados']} nuevos, "
+              f"{resultado['actualizados']} actualizados", 'success')
+    else:
+        db.rollback()
+        if resultado['total_errores']:
+            flash('No se importó nada: corrige las filas con errores y vuelve a intentar', 'error')
+        else:
+            flash('El archivo no tiene filas para importar', 'error')
+    
+    return render_template('importar.html', tabla=tabla, columnas=columnas, resultado=resultado)
+
 # ==================== CONFIGURACIÓN ====================
 
 @app.route('/configuracion', methods=['GET', 'POST'])
@@ -1017,6 +1334,7 @@ def configuracion():
         ''', (moneda_codigo, user_id))
         
         db.commit()
+        config_cache.invalidar()
         flash('Configuración actualizada exitosamente', 'success')
         return redirect(url_for('configuracion'))
     
@@ -1032,35 +1350,99 @@ def configuracion():
 
 @app.route('/api/estadisticas')
 @login_required
+@condicional
 def api_estadisticas():
-    """API para estadísticas del dashboard"""
-    db = get_db()
+    """API para estadísticas del dashboard (serie de ventas en una sola consulta)
+
+    Parámetros opcionales: granularidad=dia|semana|mes (por defecto mes),
+    periodos=N (por defecto 6) o desde/hasta=YYYY-MM-DD.
+    """
     user_id = session['user_id']
     
-    estadisticas = []
-    hoy = datetime.now()
+    unidad = GRANULARIDADES.get(request.args.get('granularidad', 'mes'))
+    if unidad is None:
+        return jsonify({'error': 'Granularidad inválida (dia, semana o mes)'}), 400
     
-    for i in range(5, -1, -1):
-        fecha = hoy - timedelta(days=30*i)
-        mes = fecha.month
-        anio = fecha.year
-        
-        total = db.execute('''
-            SELECT COALESCE(SUM(total_vendido), 0) as total
-            FROM ventas
-            WHERE TO_CHAR(fecha_venta, 'MM') = ? AND TO_CHAR(fecha_venta, 'YYYY') = ? AND usuario_id = ?
-        ''', (f'{mes:02d}', str(anio), user_id)).fetchone()['total']
-        
+    try:
+        if request.args.get('desde') or request.args.get('hasta'):
+            hasta = datetime.strptime(request.args.get('hasta') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+            desde = datetime.strptime(request.args.get('desde') or hasta.strftime('%Y-%m-01'), '%Y-%m-%d').date()
+            inicio = truncar(desde, unidad)
+            fin = desplazar(truncar(hasta, unidad), unidad, 1)
+        else:
+            periodos = int(request.args.get('periodos', 6))
+            fin = desplazar(truncar(datetime.now().date(), unidad), unidad, 1)
+            inicio = desplazar(fin, unidad, -periodos)
+    except ValueError:
+        return jsonify({'error': 'Parámetros de fecha inválidos'}), 400
+    
+    total_periodos = contar_periodos(inicio, fin, unidad)
+    if total_periodos < 1 or total_periodos > MAX_PERIODOS_ESTADISTICAS:
+        return jsonify({'error': f'El rango debe tener entre 1 y {MAX_PERIODOS_ESTADISTICAS} períodos'}), 400
+    
+    # Con la versión de datos en la clave, lo guardado por este worker antes de
+    # una venta atendida en otro worker no se sirve con el ETag nuevo
+    db = get_db()
+    version = g.version_datos if 'version_datos' in g else versiones.obtener(db, user_id)
+    clave = (user_id, version, unidad, inicio, fin)
+    estadisticas = estadisticas_cache.get(clave)
+    if estadisticas is not None:
+        return jsonify(estadisticas)
+    
+    # Agrupar una vez por período; los períodos sin ventas se rellenan en Python
+    filas = db.execute(consulta_serie_ventas(db.motor, unidad), (user_id, inicio, fin)).fetchall()
+    totales = {str(f['periodo']): f['total'] for f in filas}
+    
+    formato = '%b' if unidad == 'month' else '%d/%m'
+    estadisticas = []
+    periodo = inicio
+    while periodo < fin:
         estadisticas.append({
-            'mes': fecha.strftime('%b'),
-            'total': float(total)
+            'periodo': periodo.isoformat(),
+            'mes': periodo.strftime(formato),
+            'total': round(float(totales.get(periodo.isoformat(), 0)), 2)
         })
+        periodo = desplazar(periodo, unidad, 1)
     
-    db.close()
+    estadisticas_cache.set(clave, estadisticas)
     return jsonify(estadisticas)
 
+@app.route('/api/productos/buscar')
+@login_required
+@condicional
+def api_buscar_productos():
+    """Búsqueda de productos para el autocompletado (prefijo y subcadena)"""
+    db = get_db()
+    user_id = session['user_id']
+    
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify([])
+    limite = tamano_pagina(request.args.get('limite'), defecto=20)
+    
+    condicion, params = condicion_busqueda_productos(q)
+    disponibles = 'AND cantidad > 0' if request.args.get('disponibles') == '1' else ''
+    productos = db.execute(f'''
+        SELECT id, nombre, descripcion, precio_venta, costo_unitario, cantidad
+        FROM productos
+        WHERE usuario_id = %s AND {condicion} {disponibles}
+        ORDER BY (lower(nombre) LIKE %s) DESC, nombre
+        LIMIT %s
+    ''', [user_id] + params + [params[0], limite]).fetchall()
+    
+    db.close()
+    return jsonify([{
+        'id': p['id'],
+        'nombre': p['nombre'],
+        'descripcion': p['descripcion'],
+        'precio_venta': float(p['precio_venta']),
+        'costo_unitario': float(p['costo_unitario']),
+        'cantidad': p['cantidad']
+    } for p in productos])
+
 @app.route('/api/producto/<int:id>')
 @login_required
+@condicional
 def api_producto(id):
     """API para obtener datos de un producto"""
     db = get_db()
@@ -1083,18 +1465,112 @@ def api_producto(id):
         })
     return jsonify({'error': 'Producto no encontrado'}), 404
 
-# ==================== MAIN ====================
+@app.route('/api/v1/<recurso>')
+@login_required
+@condicional
+def api_recurso(recurso):
+    """Lectura paginada de ventas, pagos, productos, gastos o diezmos_mensuales
+
+    Parámetros opcionales: campos=id,total_vendido (por defecto todos),
+    por_pagina (hasta 200), cursor (el `siguiente` de la página anterior)
+    y desde/hasta=YYYY-MM-DD donde hay fecha.
+    """
+    if recurso not in RECURSOS:
+        return jsonify({'error': f"Recurso desconocido (disponibles: {', '.join(RECURSOS)})"}), 404
+    
+    campos = [c.strip() for c in request.args.get('campos', '').split(',') if c.strip()]
+    por_pagina = tamano_pagina(request.args.get('por_pagina'))
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else None
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else None
+        sql, params, nombres = consulta_pagina(recurso, session['user_id'], campos, request.args.get('cursor'),
+                                               por_pagina, desde, hasta)
+    except CursorInvalido:
+        return jsonify({'error': 'Cursor inválido'}), 400
+    except ValueError as e:
+        # ParametrosInvalidos o fechas mal formadas
+        mensaje = str(e) if isinstance(e, ParametrosInvalidos) else 'Fechas inválidas (YYYY-MM-DD)'
+        return jsonify({'error': mensaje}), 400
+    
+    filas = get_db().execute(sql, params, tuplas=True).fetchall()
+    return Response(serializar_pagina(recurso, nombres, filas, por_pagina), mimetype='application/json')
+
+# ==================== ARRANQUE ====================
+
+def precompilar_plantillas():
+    """Compila todas las plantillas (en el master de gunicorn, antes del fork)"""
+    for nombre in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nombre)
+
+
+def calentar_worker():
+    """Abre el pool, carga la configuración y cierra los trabajos huérfanos antes de aceptar tráfico"""
+    with app.app_context():
+        db = get_db()
+        db.execute('SELECT 1').fetchone()
+        config_cache.valores()
+        # Trabajos que quedaron a medias en un worker anterior (ya no los termina nadie)
+        marcar_trabajos_huerfanos(db)
+        db.commit()
+
+# ==================== COMANDOS ====================
+
+@app.cli.command('reconstruir-resumen')
+@click.option('--usuario', type=int, default=None, help='Solo este usuario_id')
+def reconstruir_resumen_command(usuario):
+    """Recalcula resumen_mensual desde ventas y pagos"""
+    db = get_db()
+    filas = reconstruir_resumen(db, usuario)
+    versiones.incrementar(db, usuario)
+    db.commit()
+    print(f"✓ Resumen mensual reconstruido ({filas} meses)")
+
+@app.cli.command('verificar-saldos')
+@click.option('--usuario', type=int, default=None, help='Solo este usuario_id')
+@click.option('--reparar', is_flag=True, help='Corregir las ventas que no coinciden')
+def verificar_saldos_command(usuario, reparar):
+    """Compara ventas.total_pagado / saldo_pendiente con la tabla pagos"""
+    db = get_db()
+    diferencias = verificar_saldos(db, usuario)
+    for d in diferencias:
+        print(f"  venta {d['id']} (usuario {d['usuario_id']}): pagado {d['total_pagado']} -> {d['pagado_real']}, "
+              f"saldo {d['saldo_pendiente']} -> {d['saldo_real']}, estado {d['estado_pago']} -> {d['estado_real']}")
+    if not diferencias:
+        print("✓ Saldos consistentes")
+    elif reparar:
+        filas = reconstruir_saldos(db, usuario)
+        # El crédito pendiente del resumen sale de los saldos
+        reconstruir_resumen(db, usuario)
+        versiones.incrementar(db, usuario)
+        db.commit()
+        print(f"✓ {filas} ventas corregidas y resumen mensual reconstruido")
+    else:
+        print(f"⚠️  {len(diferencias)} ventas con saldo inconsistente (usa --reparar)")
+    db.close()
 
-# Inicializar base de datos al importar
-try:
-    init_database()
-    print("✓ Sistema inicializado correctamente")
-except Exception as e:
-    print(f"⚠️  Error al inicializar base de datos: {e}")
-    print("   El sistema continuará, pero necesitas configurar DATABASE_URL")
+@app.cli.command('migrar')
+@click.option('--hasta', type=int, default=None, help='Aplicar solo hasta esta versión')
+@click.option('--estado', is_flag=True, help='Mostrar migraciones aplicadas y pendientes sin aplicar nada')
+def migrar_command(hasta, estado):
+    """Aplica las migraciones pendientes del esquema (correr al desplegar)"""
+    db = get_db()
+    if estado:
+        hechas = aplicadas(db)
+        for migracion in listar_migraciones(motor=db.motor):
+            print(f"  {'✓' if migracion.version in hechas else '·'} {migracion.nombre}")
+        return
+    aplicadas_ahora = migrar(db, hasta)
+    if aplicadas_ahora:
+        print(f"✓ {aplicadas_ahora} migraciones aplicadas")
+    else:
+        print("✓ Esquema al día")
+
+# ==================== MAIN ====================
 
 if __name__ == '__main__':
-    # Solo para desarrollo local
+    # Solo para desarrollo local: en producción las migraciones corren al desplegar
+    with app.app_context():
+        migrar(get_db())
     debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=debug_mode, host='0.0.0.0', port=port)
@@ -0,0 +1,252 @@
+"""
+Benchmarks por ruta - Sistema ERP Ventas
+Recorre las rutas principales con el cliente de pruebas de Flask como el
+usuario `bench` (ver sembrar.py) y reporta, por ruta, la latencia
+(p50/p95/p99/máximo), las consultas SQL por request, el pico de memoria y
+los bytes enviados (comprimidos, como los recibe el navegador).
+
+Uso:
+    python benchmarks/sembrar.py --volumen 100k --limpiar
+    python benchmarks/ejecutar.py [--rutas ventas,inventario] [--repeticiones 30]
+    python benchmarks/ejecutar.py --guardar-base            # escribe benchmarks/base.json
+    python benchmarks/ejecutar.py --comparar [--tolerancia 0.25]
+    python benchmarks/ejecutar.py --sin-compresion          # bytes sin gzip/brotli
+
+Con --comparar sale con código 1 si alguna ruta empeora más que la
+tolerancia en p50 o en memoria, o si hace más consultas que en la base.
+
+PostgreSQL contra SQLite: guardar la base con un motor y comparar con el otro
+    DATABASE_URL=postgresql://... python benchmarks/ejecutar.py --guardar-base --base benchmarks/base-pg.json
+    DATABASE_URL=sqlite:///bench.db python benchmarks/ejecutar.py --comparar --base benchmarks/base-pg.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g
+
+from app import app, estadisticas_cache
+from database import MOTOR, get_db
+from sembrar import USUARIO
+
+BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base.json')
+
+HOY = date.today()
+# La quincena en curso: como el mes en curso del reporte de ventas, es un
+# período abierto que la caché de reportes no guarda, así se mide la generación
+QUINCENA = 'primera' if HOY.day <= 15 else 'segunda'
+
+
+def _invalidar_estadisticas(usuario_id):
+    estadisticas_cache.invalidar_prefijo(usuario_id)
+
+
+# (nombre, método, url, datos del form, repeticiones, función antes de cada request)
+RUTAS = [
+    ('dashboard', 'GET', '/dashboard', None, 30, None),
+    ('ventas', 'GET', '/ventas', None, 30, None),
+    ('ventas-credito', 'GET', '/ventas?tipo_venta=credito', None, 30, None),
+    ('cuentas-por-cobrar', 'GET', '/cuentas-por-cobrar', None, 30, None),
+    ('inventario', 'GET', '/inventario', None, 30, None),
+    ('buscar-productos', 'GET', '/api/productos/buscar?q=cam', None, 50, None),
+    ('gastos', 'GET', '/gastos', None, 30, None),
+    ('estadisticas', 'GET', '/api/estadisticas?granularidad=mes&periodos=12', None, 30,
+     _invalidar_estadisticas),
+    ('reporte-ventas-xlsx', 'POST', '/reportes/exportar',
+     {'mes': HOY.month, 'anio': HOY.year}, 5, None),
+    ('reporte-gastos-xlsx', 'POST', '/gastos/exportar',
+     {'mes': HOY.month, 'anio': HOY.year, 'quincena': QUINCENA}, 5, None),
+    ('exportar-ventas-csv', 'GET', '/exportar/ventas.csv', None, 3, None),
+    ('api-ventas', 'GET', '/api/v1/ventas?campos=id,fecha_venta,total_vendido&por_pagina=200', None, 30, None),
+]
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, -(-p * len(valores) // 100) - 1))
+    return valores[int(indice)]
+
+
+class Medidor:
+    """Cliente logueado como `bench` que cuenta las consultas de cada request"""
+
+    def __init__(self, usuario, codificacion='br, gzip'):
+        self.usuario = usuario
+        self.consultas = []
+        self.cabeceras = {'Accept-Encoding': codificacion} if codificacion else {}
+        # Los teardown corren en orden inverso: este se registra después de
+        # init_app, así que lee g.db antes de que close_db la devuelva al pool
+        app.teardown_appcontext(self._contar)
+        self.cliente = app.test_client()
+        with self.cliente.session_transaction() as sesion:
+            sesion['user_id'] = usuario['id']
+            sesion['username'] = usuario['username']
+            sesion['nombre'] = usuario['nombre']
+
+    def _contar(self, exc=None):
+        db = g.get('db')
+        if db is not None:
+            self.consultas.append(db.consultas)
+
+    def request(self, metodo, url, datos):
+        self.consultas.clear()
+        respuesta = self.cliente.open(url, method=metodo, data=datos, headers=self.cabeceras)
+        try:
+            # Consumir el cuerpo: en las exportaciones el trabajo ocurre al leerlo
+            cuerpo = respuesta.get_data()
+        finally:
+            respuesta.close()
+        if respuesta.status_code >= 400 or respuesta.status_code == 302:
+            raise RuntimeError(f'{metodo} {url} respondió {respuesta.status_code}')
+        return len(cuerpo), sum(self.consultas)
+
+
+def medir(medidor, ruta, repeticiones=None):
+    nombre, metodo, url, datos, veces, antes = ruta
+    veces = repeticiones or veces
+
+    # Calentamiento: plantillas, caches de configuración, planes de consulta
+    if antes:
+        antes(medidor.usuario['id'])
+    medidor.request(metodo, url, datos)
+
+    tiempos = []
+    for _ in range(veces):
+        if antes:
+            antes(medidor.usuario['id'])
+        inicio = time.perf_counter()
+        tamano, consultas = medidor.request(metodo, url, datos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # La memoria se mide aparte: tracemalloc infla bastante los tiempos
+    picos = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(veces, 5)):
+            if antes:
+                antes(medidor.usuario['id'])
+            tracemalloc.reset_peak()
+            medidor.request(metodo, url, datos)
+            picos.append(tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    tiempos.sort()
+    return {
+        'ruta': f'{metodo} {url}',
+        'repeticiones': veces,
+        'p50_ms': round(percentil(tiempos, 50), 2),
+        'p95_ms': round(percentil(tiempos, 95), 2),
+        'p99_ms': round(percentil(tiempos, 99), 2),
+        'max_ms': round(tiempos[-1], 2),
+        'consultas': consultas,
+        'memoria_kb': round(max(picos) / 1024, 1),
+        'bytes': tamano,
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """Lista de regresiones (texto) respecto de la base"""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        if actual['p50_ms'] > anterior['p50_ms'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p50 {anterior['p50_ms']} → {actual['p50_ms']} ms")
+        if actual['memoria_kb'] > anterior['memoria_kb'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: memoria {anterior['memoria_kb']} → {actual['memoria_kb']} KB")
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} → {actual['consultas']}")
+    return regresiones
+
+
+def imprimir_comparacion(resultados, base, motor_base):
+    print(f"{'ruta':<22} {'p50 ' + motor_base:>16} {'p50 ' + MOTOR:>16} {'cambio':>8}")
+    print('-' * 66)
+    for nombre, r in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        cambio = (r['p50_ms'] / anterior['p50_ms'] - 1) if anterior['p50_ms'] else 0
+        print(f"{nombre:<22} {anterior['p50_ms']:>16.2f} {r['p50_ms']:>16.2f} {cambio:>+8.0%}")
+
+
+def imprimir(resultados):
+    print(f"{'ruta':<22} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'SQL':>5} {'mem KB':>9} {'red KB':>9}")
+    print('-' * 88)
+    for nombre, r in resultados.items():
+        print(f"{nombre:<22} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['max_ms']:>9.2f} {r['consultas']:>5} {r['memoria_kb']:>9.1f} {r['bytes'] / 1024:>9.1f}")
+
+
+def obtener_usuario_bench():
+    with app.app_context():
+        usuario = get_db().execute(
+            'SELECT id, username, nombre FROM usuarios WHERE username = %s', (USUARIO,)
+        ).fetchone()
+    if not usuario:
+        sys.exit(f"❌ No existe el usuario '{USUARIO}': corre primero benchmarks/sembrar.py")
+    return dict(usuario)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks por ruta')
+    parser.add_argument('--rutas', help='Nombres separados por coma (por defecto todas)')
+    parser.add_argument('--repeticiones', type=int, help='Repeticiones por ruta (pisa las de RUTAS)')
+    parser.add_argument('--base', default=BASE, help='Archivo de la base (por defecto benchmarks/base.json)')
+    parser.add_argument('--guardar-base', action='store_true', help='Guardar los resultados como base')
+    parser.add_argument('--comparar', action='store_true', help='Comparar con la base guardada')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Empeoramiento admitido (0.25 = 25%%)')
+    parser.add_argument('--sin-compresion', action='store_true', help='No enviar Accept-Encoding')
+    args = parser.parse_args()
+
+    rutas = RUTAS
+    if args.rutas:
+        elegidas = set(args.rutas.split(','))
+        desconocidas = elegidas - {r[0] for r in RUTAS}
+        if desconocidas:
+            sys.exit(f"❌ Rutas desconocidas: {', '.join(sorted(desconocidas))}")
+        rutas = [r for r in RUTAS if r[0] in elegidas]
+
+    medidor = Medidor(obtener_usuario_bench(), codificacion=None if args.sin_compresion else 'br, gzip')
+    resultados = {}
+    for ruta in rutas:
+        resultados[ruta[0]] = medir(medidor, ruta, args.repeticiones)
+        print(f"✓ {ruta[0]}", file=sys.stderr)
+
+    print(f"\nMotor: {MOTOR}\n")
+    imprimir(resultados)
+
+    if args.guardar_base:
+        with open(args.base, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'motor': MOTOR, 'rutas': resultados},
+                      f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Base guardada en {args.base}")
+
+    if args.comparar:
+        if not os.path.exists(args.base):
+            sys.exit(f"❌ No hay base en {args.base}: corre primero con --guardar-base")
+        with open(args.base, encoding='utf-8') as f:
+            guardada = json.load(f)
+        base = guardada['rutas']
+        print()
+        imprimir_comparacion(resultados, base, guardada.get('motor', 'postgresql'))
+        regresiones = comparar(resultados, base, args.tolerancia)
+        print()
+        if regresiones:
+            print("❌ Regresiones:")
+            for regresion in regresiones:
+                print(f"   - {regresion}")
+            sys.exit(1)
+        print(f"✅ Sin regresiones (tolerancia {args.tolerancia:.0%})")
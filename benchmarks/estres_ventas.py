@@ -0,0 +1,184 @@
+"""
+Prueba de estrés de ventas concurrentes - Sistema ERP Ventas
+Varios hilos venden a la vez el mismo producto con stock limitado, por
+/ventas/nueva y por /ventas/carrito, hasta pedir bastante más de lo que hay.
+Al final comprueba que no hubo sobreventa y que los datos derivados siguen
+cuadrando:
+
+- el stock nunca queda negativo y lo vendido es exactamente el stock inicial
+- hay tantas ventas (de una unidad) como stock había
+- resumen_mensual coincide con reconstruirlo desde ventas
+- diezmos_mensuales coincide con la suma de los diezmos de las ventas
+- total_pagado / saldo_pendiente coinciden con la tabla pagos
+
+Uso (usuario `estres`, se borran sus datos al empezar; no usar contra la base de producción):
+    python benchmarks/estres_ventas.py [--hilos 16] [--stock 200] [--intentos 2.0]
+
+Sale con código 1 si alguna comprobación falla.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from app import app
+from database import get_db
+from sembrar import limpiar
+from utils.resumen import reconstruir_resumen
+from utils.saldos import verificar_saldos
+
+USUARIO = 'estres'
+
+HOY = date.today()
+
+
+def preparar(stock):
+    """Usuario `estres` sin datos y un producto con `stock` unidades"""
+    db = get_db()
+    try:
+        fila = db.execute('SELECT id FROM usuarios WHERE username = %s', (USUARIO,)).fetchone()
+        if fila:
+            usuario_id = fila['id']
+            limpiar(db, usuario_id)
+        else:
+            usuario_id = db.execute(
+                'INSERT INTO usuarios (username, password, nombre, rol) VALUES (%s, %s, %s, %s) RETURNING id',
+                (USUARIO, generate_password_hash(USUARIO), 'Prueba de estrés', 'admin')
+            ).fetchone()['id']
+        producto_id = db.execute('''
+            INSERT INTO productos (nombre, descripcion, cantidad, costo_unitario, precio_venta, stock_minimo,
+                                   estado, usuario_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        ''', ('Producto estrés', 'Stock limitado', stock, 10, 15.5, 5, 'disponible', usuario_id)).fetchone()['id']
+        db.commit()
+        return usuario_id, producto_id
+    finally:
+        db.close()
+
+
+def vender(usuario_id, producto_id, intentos, resultados, barrera):
+    """Un cajero: alterna venta simple y carrito, contado y crédito"""
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = usuario_id
+    nombre = threading.current_thread().name
+    barrera.wait()
+    for i in range(intentos):
+        tipo_venta = 'contado' if i % 2 == 0 else 'credito'
+        if i % 3 == 0:
+            respuesta = cliente.post('/ventas/carrito', json={
+                'cliente_nombre': nombre, 'tipo_venta': tipo_venta, 'fecha_venta': HOY.isoformat(),
+                'lineas': [{'producto_id': producto_id, 'cantidad': 1}],
+            })
+            vendido = respuesta.status_code == 201
+            rechazado = respuesta.status_code == 400
+        else:
+            respuesta = cliente.post('/ventas/nueva', data={
+                'producto_id': producto_id, 'cliente_nombre': nombre, 'cantidad': 1,
+                'tipo_venta': tipo_venta, 'fecha_venta': HOY.isoformat(),
+            })
+            # Éxito y stock insuficiente redirigen a páginas distintas
+            destino = respuesta.headers.get('Location', '')
+            vendido = respuesta.status_code == 302 and destino.endswith('/ventas')
+            rechazado = respuesta.status_code == 302 and destino.endswith('/ventas/nueva')
+        respuesta.close()
+        clave = 'vendidas' if vendido else 'rechazadas' if rechazado else 'errores'
+        with resultados['lock']:
+            resultados[clave] += 1
+
+
+def comprobar(usuario_id, producto_id, stock):
+    """Lista de (descripción, ok, detalle)"""
+    db = get_db()
+    try:
+        cantidad = db.execute('SELECT cantidad FROM productos WHERE id = %s', (producto_id,)).fetchone()['cantidad']
+        ventas = db.execute('''
+            SELECT COUNT(*) as num, COALESCE(SUM(cantidad), 0) as unidades, COALESCE(SUM(diezmo), 0) as diezmo
+            FROM ventas WHERE usuario_id = %s
+        ''', (usuario_id,)).fetchone()
+        diezmos = db.execute(
+            'SELECT COALESCE(SUM(total_diezmo), 0) as total FROM diezmos_mensuales WHERE usuario_id = %s',
+            (usuario_id,)
+        ).fetchone()['total']
+
+        # El resumen guardado contra el reconstruido desde ventas (dentro de una transacción que se descarta)
+        consulta_resumen = '''
+            SELECT anio, mes, total_vendido, costo_total, ganancia, diezmo, num_ventas, credito_pendiente
+            FROM resumen_mensual WHERE usuario_id = %s ORDER BY anio, mes
+        '''
+        guardado = [tuple(f.values()) for f in db.execute(consulta_resumen, (usuario_id,)).fetchall()]
+        reconstruir_resumen(db, usuario_id)
+        reconstruido = [tuple(f.values()) for f in db.execute(consulta_resumen, (usuario_id,)).fetchall()]
+        db.rollback()
+
+        saldos = verificar_saldos(db, usuario_id)
+    finally:
+        db.close()
+
+    return [
+        ('stock no negativo', cantidad >= 0, f'cantidad final {cantidad}'),
+        ('unidades vendidas = stock inicial', ventas['unidades'] == stock and cantidad == 0,
+         f"{ventas['unidades']} vendidas de {stock}"),
+        ('ventas = stock inicial', ventas['num'] == stock, f"{ventas['num']} ventas"),
+        ('resumen_mensual cuadra', guardado == reconstruido, f'{guardado} vs {reconstruido}'),
+        ('diezmos_mensuales cuadra', diezmos == ventas['diezmo'], f"{diezmos} vs {ventas['diezmo']}"),
+        ('saldos cuadran con pagos', not saldos, f'{len(saldos)} ventas con saldo distinto'),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ventas concurrentes contra stock limitado')
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--intentos', type=float, default=2.0,
+                        help='Ventas pedidas en total, como múltiplo del stock (por defecto 2.0)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ESTRÉS DE VENTAS CONCURRENTES - SISTEMA ERP VENTAS")
+    print("=" * 60)
+    print()
+
+    usuario_id, producto_id = preparar(args.stock)
+    por_hilo = -(-int(args.stock * args.intentos) // args.hilos)
+    resultados = {'vendidas': 0, 'rechazadas': 0, 'errores': 0, 'lock': threading.Lock()}
+    barrera = threading.Barrier(args.hilos)
+    hilos = [threading.Thread(target=vender, name=f'cajero-{n}',
+                              args=(usuario_id, producto_id, por_hilo, resultados, barrera))
+             for n in range(args.hilos)]
+
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    print(f"{args.hilos} hilos x {por_hilo} intentos sobre {args.stock} unidades en {segundos:.1f}s: "
+          f"{resultados['vendidas']} vendidas, {resultados['rechazadas']} sin stock, "
+          f"{resultados['errores']} errores")
+    print()
+
+    comprobaciones = comprobar(usuario_id, producto_id, args.stock)
+    comprobaciones.append(('sin errores de servidor', resultados['errores'] == 0,
+                           f"{resultados['errores']} respuestas inesperadas"))
+    comprobaciones.append(('respuestas = ventas registradas', resultados['vendidas'] == args.stock,
+                           f"{resultados['vendidas']} respuestas de venta"))
+    fallos = 0
+    for descripcion, ok, detalle in comprobaciones:
+        fallos += 0 if ok else 1
+        print(f"{descripcion:35} {'✓ OK' if ok else '✗ FALLA'}" + ('' if ok else f"  ({detalle})"))
+
+    print()
+    print("=" * 60)
+    print("SIN SOBREVENTA" if not fallos else f"{fallos} COMPROBACIÓN(ES) FALLARON")
+    print("=" * 60)
+    sys.exit(1 if fallos else 0)
@@ -0,0 +1,228 @@
+"""
+Generador de datos sintéticos para benchmarks - Sistema ERP Ventas
+Crea (o reutiliza) el usuario `bench` y le carga productos, ventas, pagos y
+gastos con COPY, con volúmenes parametrizables. Los saldos, el resumen
+mensual y los diezmos quedan consistentes, como si se hubieran registrado
+desde la aplicación.
+
+Uso:
+    python benchmarks/sembrar.py --volumen 100k [--limpiar] [--semilla 42]
+    python benchmarks/sembrar.py --ventas 50000 --productos 2000 --gastos 5000
+
+(requiere DATABASE_URL, PostgreSQL o sqlite:///; no usar contra la base de producción)
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from database import get_db
+from utils import versiones
+from utils.importar import FlujoCopy
+from utils.resumen import reconstruir_resumen
+
+USUARIO = 'bench'
+CONTRASENA = 'bench'
+
+# Volúmenes por usuario (los pagos salen de las ventas: ~1 por venta)
+VOLUMENES = {
+    '1k': {'productos': 200, 'ventas': 1_000, 'gastos': 300},
+    '100k': {'productos': 5_000, 'ventas': 100_000, 'gastos': 20_000},
+    '1m': {'productos': 20_000, 'ventas': 1_000_000, 'gastos': 100_000},
+}
+
+CATEGORIAS = ['Gasto Local', 'Luz', 'Empleados', 'Transporte', 'Mercancía', 'Otros']
+PALABRAS = ['arroz', 'camisa', 'zapato', 'aceite', 'jabón', 'pantalón', 'gorra', 'café',
+            'azúcar', 'cable', 'batería', 'cuaderno', 'lápiz', 'leche', 'pan', 'bolso']
+CLIENTES = ['Juan Pérez', 'María Gómez', 'Pedro Rodríguez', 'Ana Martínez', 'Luis Fernández',
+            'Carmen Díaz', 'José Santos', 'Rosa Jiménez', 'Miguel Reyes', 'Laura Castillo']
+METODOS = ['Efectivo', 'Transferencia', 'Tarjeta']
+
+
+def obtener_usuario(db):
+    fila = db.execute('SELECT id FROM usuarios WHERE username = %s', (USUARIO,)).fetchone()
+    if fila:
+        return fila['id']
+    return db.execute(
+        'INSERT INTO usuarios (username, password, nombre, rol) VALUES (%s, %s, %s, %s) RETURNING id',
+        (USUARIO, generate_password_hash(CONTRASENA), 'Usuario de benchmarks', 'admin')
+    ).fetchone()['id']
+
+
+def limpiar(db, usuario_id):
+    for tabla in ('pagos', 'ventas', 'gastos', 'diezmos_mensuales', 'resumen_mensual',
+                  'trabajos_exportacion', 'productos'):
+        db.execute(f'DELETE FROM {tabla} WHERE usuario_id = %s', (usuario_id,))
+
+
+def _siguiente_id(db, tabla):
+    return db.execute(f'SELECT COALESCE(MAX(id), 0) + 1 as id FROM {tabla}').fetchone()['id']
+
+
+def _ajustar_secuencia(db, tabla):
+    # En SQLite el próximo id ya es MAX(id) + 1
+    if db.motor == 'sqlite':
+        return
+    db.execute(f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), (SELECT MAX(id) FROM {tabla}))")
+
+
+def _copiar(db, tabla, columnas, filas):
+    flujo = FlujoCopy(filas)
+    db.copy_desde(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", flujo)
+    return flujo.total
+
+
+def generar_productos(rnd, usuario_id, cantidad, primer_id):
+    for i in range(cantidad):
+        costo = Decimal(rnd.randint(50, 50_000)) / 100
+        precio = (costo * Decimal(rnd.uniform(1.1, 2.0))).quantize(Decimal('0.01'))
+        stock = rnd.choice([0, rnd.randint(1, 5), rnd.randint(6, 500)])
+        estado = 'agotado' if stock == 0 else 'bajo' if stock <= 5 else 'disponible'
+        nombre = f"{rnd.choice(PALABRAS).capitalize()} {rnd.choice(PALABRAS)} {i:06d}"
+        registro = datetime.now() - timedelta(days=rnd.randint(0, 900), seconds=rnd.randint(0, 86_400))
+        yield (primer_id + i, nombre, f'Descripción de {nombre}', stock, costo, precio, 5, estado, registro, usuario_id)
+
+
+def generar_ventas(rnd, usuario_id, productos, cantidad, dias, primer_id):
+    hoy = date.today()
+    for i in range(cantidad):
+        venta_id = primer_id + i
+        producto_id, precio, costo = rnd.choice(productos)
+        unidades = rnd.randint(1, 5)
+        total = precio * unidades
+        costo_total = costo * unidades
+        diezmo = (total * Decimal('0.10')).quantize(Decimal('0.01'))
+        fecha = hoy - timedelta(days=rnd.randint(0, dias))
+        registro = datetime.combine(fecha, datetime.min.time()) + timedelta(seconds=rnd.randint(0, 86_399))
+
+        if rnd.random() < 0.3:
+            # Crédito: sin pagos, con un abono parcial o saldado
+            tipo = 'credito'
+            pagado = rnd.choice([Decimal(0), (total * Decimal(rnd.uniform(0.2, 0.8))).quantize(Decimal('0.01')), total])
+            estado = 'completado' if pagado >= total else 'parcial' if pagado > 0 else 'pendiente'
+        else:
+            tipo = 'contado'
+            pagado = total
+            estado = 'completado'
+
+        yield (venta_id, producto_id, rnd.choice(CLIENTES), '809-555-0000', unidades, precio, total,
+               costo_total, total - costo_total, diezmo, tipo, estado, fecha, usuario_id, registro,
+               pagado, total - pagado)
+
+
+def generar_gastos(rnd, usuario_id, cantidad, dias):
+    hoy = date.today()
+    for _ in range(cantidad):
+        yield (hoy - timedelta(days=rnd.randint(0, dias)), rnd.choice(CATEGORIAS), None,
+               Decimal(rnd.randint(100, 2_000_000)) / 100, usuario_id)
+
+
+def sembrar(db, volumen, dias=730, semilla=42, log=print):
+    rnd = random.Random(semilla)
+    usuario_id = obtener_usuario(db)
+
+    inicio = time.monotonic()
+    primer_id = _siguiente_id(db, 'productos')
+    total = _copiar(db, 'productos',
+                    ['id', 'nombre', 'descripcion', 'cantidad', 'costo_unitario', 'precio_venta',
+                     'stock_minimo', 'estado', 'fecha_registro', 'usuario_id'],
+                    generar_productos(rnd, usuario_id, volumen['productos'], primer_id))
+    _ajustar_secuencia(db, 'productos')
+    log(f"✓ {total} productos ({time.monotonic() - inicio:.1f}s)")
+
+    productos = [(p['id'], p['precio_venta'], p['costo_unitario']) for p in db.execute(
+        'SELECT id, precio_venta, costo_unitario FROM productos WHERE usuario_id = %s ORDER BY id',
+        (usuario_id,)).fetchall()]
+
+    inicio = time.monotonic()
+    primer_id = _siguiente_id(db, 'ventas')
+    total = _copiar(db, 'ventas',
+                    ['id', 'producto_id', 'cliente_nombre', 'cliente_telefono', 'cantidad', 'precio_unitario',
+                     'total_vendido', 'costo_total', 'ganancia', 'diezmo', 'tipo_venta', 'estado_pago',
+                     'fecha_venta', 'usuario_id', 'fecha_registro', 'total_pagado', 'saldo_pendiente'],
+                    generar_ventas(rnd, usuario_id, productos, volumen['ventas'], dias, primer_id))
+    _ajustar_secuencia(db, 'ventas')
+    log(f"✓ {total} ventas ({time.monotonic() - inicio:.1f}s)")
+
+    inicio = time.monotonic()
+    # Un pago por cada venta con algo pagado, generado en el servidor
+    if db.motor == 'sqlite':
+        fecha_abono = "date(fecha_venta, '+' || (id % 30) || ' days')"
+    else:
+        fecha_abono = 'fecha_venta + (id %% 30)'
+    total = db.execute(f'''
+        INSERT INTO pagos (venta_id, monto, fecha_pago, metodo_pago, notas, usuario_id)
+        SELECT id, total_pagado,
+               CASE WHEN tipo_venta = 'contado' THEN fecha_venta ELSE {fecha_abono} END,
+               CASE WHEN tipo_venta = 'contado' THEN 'Contado'
+                    WHEN id %% 3 = 0 THEN %s WHEN id %% 3 = 1 THEN %s ELSE %s END,
+               CASE WHEN tipo_venta = 'contado' THEN 'Pago completo al contado' END,
+               usuario_id
+        FROM ventas
+        WHERE usuario_id = %s AND id >= %s AND total_pagado > 0
+    ''', (*METODOS, usuario_id, primer_id)).rowcount
+    log(f"✓ {total} pagos ({time.monotonic() - inicio:.1f}s)")
+
+    inicio = time.monotonic()
+    total = _copiar(db, 'gastos', ['fecha', 'categoria', 'descripcion', 'monto', 'usuario_id'],
+                    generar_gastos(rnd, usuario_id, volumen['gastos'], dias))
+    log(f"✓ {total} gastos ({time.monotonic() - inicio:.1f}s)")
+
+    # Tablas derivadas, como las dejaría la aplicación
+    reconstruir_resumen(db, usuario_id)
+    db.execute('DELETE FROM diezmos_mensuales WHERE usuario_id = %s', (usuario_id,))
+    db.execute('''
+        INSERT INTO diezmos_mensuales (mes, anio, total_diezmo, usuario_id)
+        SELECT EXTRACT(MONTH FROM fecha_venta)::INTEGER, EXTRACT(YEAR FROM fecha_venta)::INTEGER,
+               SUM(diezmo), usuario_id
+        FROM ventas
+        WHERE usuario_id = %s
+        GROUP BY 1, 2, usuario_id
+    ''', (usuario_id,))
+    versiones.incrementar(db, usuario_id)
+    versiones.incrementar_periodos(db, usuario_id)
+    return usuario_id
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Carga datos sintéticos para benchmarks')
+    parser.add_argument('--volumen', choices=VOLUMENES, default='1k')
+    parser.add_argument('--productos', type=int)
+    parser.add_argument('--ventas', type=int)
+    parser.add_argument('--gastos', type=int)
+    parser.add_argument('--dias', type=int, default=730, help='Historial en días hacia atrás')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--limpiar', action='store_true', help='Borrar antes los datos del usuario bench')
+    args = parser.parse_args()
+
+    volumen = dict(VOLUMENES[args.volumen])
+    for clave in volumen:
+        if getattr(args, clave) is not None:
+            volumen[clave] = getattr(args, clave)
+
+    print("=" * 60)
+    print("DATOS SINTÉTICOS PARA BENCHMARKS - SISTEMA ERP VENTAS")
+    print("=" * 60)
+    print()
+
+    db = get_db()
+    try:
+        if args.limpiar:
+            limpiar(db, obtener_usuario(db))
+            print("✓ Datos anteriores del usuario bench borrados")
+        usuario_id = sembrar(db, volumen, args.dias, args.semilla)
+        db.commit()
+        for tabla in ('productos', 'ventas', 'pagos', 'gastos', 'resumen_mensual'):
+            db.execute(f'ANALYZE {tabla}')
+        db.commit()
+        print(f"\n✅ Usuario '{USUARIO}' (id {usuario_id}, contraseña '{CONTRASENA}') listo")
+    finally:
+        db.close()
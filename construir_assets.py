@@ -0,0 +1,89 @@
+"""
+Construcción de archivos estáticos - Sistema ERP Ventas
+Copia cada archivo de static/ a static/dist/ con el hash del contenido en el
+nombre y genera sus versiones .gz y .br (si está instalado Brotli), más el
+manifiesto static/dist/assets.json que usa utils/assets.py.
+
+Se corre al arrancar el contenedor (start.sh, antes de gunicorn) y, en
+desarrollo, cada vez que cambia un archivo de static/:
+    python construir_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.assets import DIST, MANIFIESTO, STATIC
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Solo vale la pena comprimir texto
+COMPRIMIBLES = ('.css', '.js', '.json', '.svg', '.html', '.txt')
+
+
+def archivos_fuente():
+    for raiz, dirs, nombres in os.walk(STATIC):
+        if os.path.abspath(raiz) == os.path.abspath(STATIC):
+            dirs[:] = [d for d in dirs if d != 'dist']
+        for nombre in sorted(nombres):
+            ruta = os.path.join(raiz, nombre)
+            yield os.path.relpath(ruta, STATIC).replace(os.sep, '/'), ruta
+
+
+def con_huella(relativo, contenido):
+    base, extension = os.path.splitext(relativo)
+    return f'{base}.{hashlib.sha256(contenido).hexdigest()[:10]}{extension}'
+
+
+def escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(contenido)
+
+
+def construir():
+    shutil.rmtree(DIST, ignore_errors=True)
+    archivos = {}
+    for relativo, ruta in archivos_fuente():
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        destino = con_huella(relativo, contenido)
+        archivos[relativo] = destino
+        salida = os.path.join(DIST, destino)
+        escribir(salida, contenido)
+
+        linea = f"✓ {relativo} → {destino} ({len(contenido)} B"
+        if relativo.endswith(COMPRIMIBLES):
+            # mtime=0: el .gz es idéntico entre builds del mismo contenido
+            comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+            escribir(salida + '.gz', comprimido)
+            linea += f", gzip {len(comprimido)} B"
+            if brotli is not None:
+                comprimido = brotli.compress(contenido, quality=11)
+                escribir(salida + '.br', comprimido)
+                linea += f", br {len(comprimido)} B"
+        print(linea + ')')
+
+    version = hashlib.sha256(json.dumps(archivos, sort_keys=True).encode()).hexdigest()[:10]
+    with open(MANIFIESTO, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'archivos': archivos}, f, indent=2, sort_keys=True)
+    return version, len(archivos)
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("CONSTRUCCIÓN DE ARCHIVOS ESTÁTICOS - SISTEMA ERP VENTAS")
+    print("=" * 60)
+    print()
+    version, total = construir()
+    if brotli is None:
+        print("\n⚠️  Brotli no instalado: solo se generaron los .gz")
+    print(f"\n✅ {total} archivos en static/dist (versión {version})")
@@ -1,11 +1,24 @@
 """
 Configuración de base de datos PostgreSQL para Railway
 Versión con mejor manejo de errores
+
+Con DATABASE_URL=sqlite:///archivo.db se usa el motor SQLite embebido de
+db_adapter.py (tiendas de un solo local), con la misma interfaz.
 """
+import logging
 import os
+import threading
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from werkzeug.security import generate_password_hash
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from flask import g, has_app_context
+
+from db_adapter import ConexionSQLite, ruta_sqlite
+from utils import metricas
+from utils.instrumentacion import CursorMedido, medir
+
+logger = logging.getLogger('sistema_ventas.db')
 
 # Obtener URL de base de datos
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -14,191 +27,251 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
-def get_db():
-    """Crea y retorna conexión a PostgreSQL"""
-    try:
-        if not DATABASE_URL:
-            raise Exception("❌ ERROR: DATABASE_URL no configurada. Configura la variable de entorno en Railway.")
-        
-        print(f"📊 Conectando a PostgreSQL...")
-        conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-        print("✓ Conexión exitosa a PostgreSQL")
+MOTOR = 'sqlite' if DATABASE_URL and DATABASE_URL.startswith('sqlite:') else 'postgresql'
+
+# Parámetros del pool (por proceso / worker de gunicorn). Por defecto una
+# conexión por hilo de gunicorn más dos por hilo de exportación (el reporte y
+# las actualizaciones de progreso); ver gunicorn.conf.py
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', int(os.environ.get('GUNICORN_THREADS', 4))
+                                             + 2 * int(os.environ.get('EXPORT_WORKERS', 2))))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+POOL_PING_IDLE = float(os.environ.get('DB_POOL_PING_IDLE', 30))
+
+
+class PoolAgotado(Exception):
+    """No hay conexiones libres dentro del tiempo de espera"""
+
+
+class PoolConexiones:
+    """Pool thread-safe de conexiones PostgreSQL con verificación al prestar y vida máxima"""
+
+    def __init__(self, dsn, minimo=POOL_MIN, maximo=POOL_MAX,
+                 vida_maxima=POOL_MAX_LIFETIME, ping_inactiva=POOL_PING_IDLE):
+        self.dsn = dsn
+        self.minimo = minimo
+        self.maximo = maximo
+        self.vida_maxima = vida_maxima
+        self.ping_inactiva = ping_inactiva
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._libres = []       # [(conexion, creada, devuelta)]
+        self._creadas = {}      # id(conexion) -> timestamp de creación
+        self._en_uso = 0
+        self._creando = 0
+        self._esperando = 0
+        for _ in range(minimo):
+            conn = self._crear()
+            ahora = time.monotonic()
+            self._creadas[id(conn)] = ahora
+            self._libres.append((conn, ahora, ahora))
+
+    def _crear(self):
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+
+    def _descartar(self, conn):
+        self._creadas.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expirada(self, creada):
+        return self.vida_maxima and time.monotonic() - creada > self.vida_maxima
+
+    def _saludable(self, conn, devuelta):
+        """Chequeo barato: estado local siempre, ping solo si estuvo inactiva"""
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta < self.ping_inactiva:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def obtener(self, timeout=POOL_TIMEOUT):
+        """Presta una conexión sana; espera hasta `timeout` si el pool está lleno"""
+        limite = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._libres:
+                    conn, creada, devuelta = self._libres.pop()
+                    if self._expirada(creada) or not self._saludable(conn, devuelta):
+                        self._descartar(conn)
+                        continue
+                    self._en_uso += 1
+                    return conn
+                if len(self._creadas) + self._creando < self.maximo:
+                    # Reservar el cupo y conectar fuera del lock
+                    self._creando += 1
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    metricas.incrementar('sistema_ventas_pool_agotado_total')
+                    raise PoolAgotado(f'Sin conexiones libres tras {timeout}s (máximo {self.maximo})')
+                self._esperando += 1
+                try:
+                    self._cond.wait(restante)
+                finally:
+                    self._esperando -= 1
+        try:
+            conn = self._crear()
+        finally:
+            with self._cond:
+                self._creando -= 1
+                self._cond.notify()
+        with self._cond:
+            self._creadas[id(conn)] = time.monotonic()
+            self._en_uso += 1
         return conn
-    except Exception as e:
-        print(f"❌ ERROR al conectar a PostgreSQL: {e}")
-        raise
-
-def init_db():
-    """Inicializa todas las tablas en PostgreSQL"""
-    try:
-        print("\n" + "="*50)
-        print("  INICIALIZANDO BASE DE DATOS POSTGRESQL")
-        print("="*50 + "\n")
-        
-        conn = get_db()
-        cur = conn.cursor()
-        
-        # Tabla de usuarios
-        print("📝 Creando tabla: usuarios")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                nombre VARCHAR(200) NOT NULL,
-                rol VARCHAR(50) DEFAULT 'admin',
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✓ Tabla usuarios creada")
-        
-        # Tabla de productos
-        print("📝 Creando tabla: productos")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id SERIAL PRIMARY KEY,
-                nombre VARCHAR(200) NOT NULL,
-                descripcion TEXT,
-                cantidad INTEGER DEFAULT 0,
-                costo_unitario DECIMAL(10,2) NOT NULL,
-                precio_venta DECIMAL(10,2) NOT NULL,
-                stock_minimo INTEGER DEFAULT 5,
-                estado VARCHAR(50) DEFAULT 'disponible',
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id)
-            )
-        ''')
-        print("✓ Tabla productos creada")
-        
-        # Tabla de ventas
-        print("📝 Creando tabla: ventas")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS ventas (
-                id SERIAL PRIMARY KEY,
-                producto_id INTEGER NOT NULL REFERENCES productos(id),
-                cliente_nombre VARCHAR(200) NOT NULL,
-                cliente_telefono VARCHAR(50),
-                cantidad INTEGER NOT NULL,
-                precio_unitario DECIMAL(10,2) NOT NULL,
-                total_vendido DECIMAL(10,2) NOT NULL,
-                costo_total DECIMAL(10,2) NOT NULL,
-                ganancia DECIMAL(10,2) NOT NULL,
-                diezmo DECIMAL(10,2) NOT NULL,
-                tipo_venta VARCHAR(50) DEFAULT 'contado',
-                estado_pago VARCHAR(50) DEFAULT 'completado',
-                fecha_venta DATE NOT NULL,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✓ Tabla ventas creada")
-        
-        # Tabla de pagos
-        print("📝 Creando tabla: pagos")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS pagos (
-                id SERIAL PRIMARY KEY,
-                venta_id INTEGER NOT NULL REFERENCES ventas(id),
-                monto DECIMAL(10,2) NOT NULL,
-                fecha_pago DATE NOT NULL,
-                metodo_pago VARCHAR(100),
-                notas TEXT,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✓ Tabla pagos creada")
-        
-        # Tabla de diezmos
-        print("📝 Creando tabla: diezmos_mensuales")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS diezmos_mensuales (
-                id SERIAL PRIMARY KEY,
-                mes INTEGER NOT NULL,
-                anio INTEGER NOT NULL,
-                total_diezmo DECIMAL(10,2) NOT NULL,
-                estado VARCHAR(50) DEFAULT 'Pendiente',
-                fecha_entrega TIMESTAMP,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
-                UNIQUE(mes, anio, usuario_id)
-            )
-        ''')
-        print("✓ Tabla diezmos_mensuales creada")
-        
-        # Tabla de configuración
-        print("📝 Creando tabla: configuracion")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS configuracion (
-                id SERIAL PRIMARY KEY,
-                clave VARCHAR(100) UNIQUE NOT NULL,
-                valor TEXT NOT NULL,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
-                fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✓ Tabla configuracion creada")
-        
-        # Tabla de gastos
-        print("📝 Creando tabla: gastos")
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS gastos (
-                id SERIAL PRIMARY KEY,
-                fecha DATE NOT NULL,
-                categoria VARCHAR(100) NOT NULL,
-                descripcion TEXT,
-                monto DECIMAL(10,2) NOT NULL,
-                usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("✓ Tabla gastos creada")
-        
-        # Índices para rendimiento
-        print("📝 Creando índices...")
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha_venta)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_ventas_usuario ON ventas(usuario_id)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_gastos_fecha ON gastos(fecha)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_productos_usuario ON productos(usuario_id)')
-        print("✓ Índices creados")
-        
-        # Crear usuario admin por defecto
-        print("📝 Verificando usuario admin...")
-        cur.execute('SELECT id FROM usuarios WHERE username = %s', ('admin',))
-        if cur.fetchone() is None:
-            print("📝 Creando usuario admin...")
-            hashed_password = generate_password_hash('admin123')
-            cur.execute(
-                'INSERT INTO usuarios (username, password, nombre, rol) VALUES (%s, %s, %s, %s) RETURNING id',
-                ('admin', hashed_password, 'Administrador', 'admin')
-            )
-            user_id = cur.fetchone()['id']
-            print(f"✓ Usuario admin creado (ID: {user_id})")
-            
-            # Configuración por defecto
-            print("📝 Creando configuración por defecto...")
-            cur.execute('INSERT INTO configuracion (clave, valor, usuario_id) VALUES (%s, %s, %s)',
-                       ('moneda_simbolo', 'RD$', user_id))
-            cur.execute('INSERT INTO configuracion (clave, valor, usuario_id) VALUES (%s, %s, %s)',
-                       ('moneda_codigo', 'DOP', user_id))
-            print("✓ Configuración creada")
+
+    def devolver(self, conn):
+        """Devuelve la conexión al pool, descartándola si está rota o vieja"""
+        with self._cond:
+            self._en_uso -= 1
+            creada = self._creadas.get(id(conn))
+            try:
+                if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                pass
+            if conn.closed or creada is None or self._expirada(creada) or len(self._libres) >= self.maximo:
+                self._descartar(conn)
+            else:
+                self._libres.append((conn, creada, time.monotonic()))
+            self._cond.notify()
+
+    def estadisticas(self):
+        with self._cond:
+            return {'en_uso': self._en_uso, 'libres': len(self._libres), 'esperando': self._esperando}
+
+    def cerrar(self):
+        with self._cond:
+            for conn, _, _ in self._libres:
+                self._descartar(conn)
+            self._libres = []
+
+
+class ConexionDB:
+    """Envoltura de la conexión prestada con la interfaz que usan las rutas"""
+
+    motor = 'postgresql'
+
+    def __init__(self, conn, pool, por_request=True):
+        self.conn = conn
+        self.pool = pool
+        self.por_request = por_request
+        # Sentencias enviadas por esta conexión y tiempo total en la BD (Server-Timing)
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+
+    def execute(self, sql, params=None, tuplas=False):
+        """Con tuplas=True las filas son tuplas (sin armar un dict por fila)"""
+        cur = self.conn.cursor(cursor_factory=extensions.cursor) if tuplas else self.conn.cursor()
+        with medir(self, sql, params):
+            cur.execute(sql.replace('?', '%s'), params)
+        return cur
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    def cursor_servidor(self, nombre, itersize=2000, tuplas=False):
+        """Cursor con nombre (server-side): las filas se traen de a `itersize`"""
+        if tuplas:
+            cur = self.conn.cursor(name=nombre, cursor_factory=extensions.cursor)
         else:
-            print("✓ Usuario admin ya existe")
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        print("\n" + "="*50)
-        print("  ✅ BASE DE DATOS INICIALIZADA CORRECTAMENTE")
-        print("="*50 + "\n")
-        
-        return True
-        
-    except Exception as e:
-        print(f"\n❌ ERROR AL INICIALIZAR BASE DE DATOS:")
-        print(f"   {str(e)}")
-        print("\nVerifica:")
-        print("  1. DATABASE_URL está configurada en Railway")
-        print("  2. PostgreSQL está corriendo")
-        print("  3. La URL es correcta\n")
-        raise
+            cur = self.conn.cursor(name=nombre)
+        cur.itersize = itersize
+        return CursorMedido(self, cur)
+
+    def execute_values(self, sql, filas, template=None, fetch=False, page_size=500):
+        """INSERT/UPDATE por lotes con psycopg2.extras.execute_values (VALUES %s)"""
+        filas = list(filas)
+        cur = self.conn.cursor()
+        # execute_values envía una sentencia por cada page_size filas
+        with medir(self, sql, filas, sentencias=max(1, -(-len(filas) // page_size))):
+            resultado = execute_values(cur, sql, filas, template=template, page_size=page_size, fetch=fetch)
+        return resultado if fetch else cur
+
+    def copy_desde(self, sql, archivo, tamano=65536):
+        """COPY ... FROM STDIN leyendo de un objeto con read() (por bloques)"""
+        cur = self.conn.cursor()
+        with medir(self, sql):
+            cur.copy_expert(sql, archivo, size=tamano)
+        return cur
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        """En un request la conexión se devuelve en el teardown; fuera de él, ahora"""
+        if not self.por_request:
+            self.liberar()
+
+    def liberar(self):
+        if self.conn is not None:
+            self.pool.devolver(self.conn)
+            self.conn = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool del proceso actual (se recrea tras un fork de gunicorn)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                if not DATABASE_URL:
+                    raise Exception("❌ ERROR: DATABASE_URL no configurada. Configura la variable de entorno en Railway.")
+                logger.info('Creando pool PostgreSQL (%s-%s conexiones, pid %s)', POOL_MIN, POOL_MAX, os.getpid())
+                _pool = PoolConexiones(DATABASE_URL)
+    return _pool
+
+
+@metricas.registrar_medidor
+def _medir_pool():
+    """Gauges del pool del proceso (sin crearlo si todavía no existe)"""
+    if _pool is None or _pool.pid != os.getpid():
+        return []
+    pid = str(os.getpid())
+    return [('sistema_ventas_pool_conexiones', {'estado': estado, 'pid': pid}, valor)
+            for estado, valor in _pool.estadisticas().items()]
+
+
+def _conectar(por_request=True):
+    if MOTOR == 'sqlite':
+        return ConexionSQLite(ruta_sqlite(DATABASE_URL), por_request)
+    pool = get_pool()
+    return ConexionDB(pool.obtener(), pool, por_request)
+
+
+def get_db():
+    """Retorna la conexión del request actual (una por request, tomada del pool)"""
+    if not has_app_context():
+        return _conectar(por_request=False)
+    if 'db' not in g:
+        g.db = _conectar()
+    return g.db
+
+
+def close_db(exc=None):
+    """Devuelve al pool la conexión del request (rollback si quedó abierta)"""
+    db = g.pop('db', None)
+    if db is not None:
+        db.liberar()
+
+
+def init_app(app):
+    """Registra el teardown que devuelve la conexión al pool"""
+    app.teardown_appcontext(close_db)
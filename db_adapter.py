@@ -1,209 +1,299 @@
 """
-Adaptador de Base de Datos
-Soporta SQLite (desarrollo) y PostgreSQL (producción)
+Motor SQLite embebido para tiendas de un solo local
+Se activa con DATABASE_URL=sqlite:///ruta/ventas.db (sqlite:////ruta absoluta).
+
+Expone la misma interfaz que database.ConexionDB, así las rutas y utils
+escriben el SQL una sola vez (dialecto PostgreSQL con %s) y aquí se traduce:
+placeholders, casts ::tipo, EXTRACT, intervalos, FOR UPDATE, = ANY(lista),
+SERIAL y CREATE INDEX CONCURRENTLY. Cada hilo mantiene su propia conexión
+abierta (WAL + pragmas ajustados); el request solo la toma prestada.
 """
+import csv
+import json
 import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+
+from utils.instrumentacion import CursorMedido, medir
+
+# RETURNING (3.35) es la versión mínima que usa el SQL de la aplicación
+VERSION_MINIMA = (3, 35, 0)
+
+# Pragmas por conexión (ajustables por entorno)
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))            # ms
+SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024))               # por conexión
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))     # bytes
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Máximo de parámetros por sentencia (SQLITE_MAX_VARIABLE_NUMBER desde 3.32)
+MAX_PARAMETROS = 32766
+
+# Filas por executemany al emular COPY
+FILAS_POR_LOTE = 1000
+
+
+def ruta_sqlite(url):
+    """sqlite:///ventas.db -> ventas.db ; sqlite:////data/ventas.db -> /data/ventas.db"""
+    return url[len('sqlite:///'):]
+
+
+# ==================== TIPOS ====================
+
+# DECIMAL se guarda como REAL; al leer vuelve a Decimal con 2 decimales como en PostgreSQL
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(' '))
+sqlite3.register_converter('DECIMAL', lambda valor: Decimal(valor.decode()).quantize(Decimal('0.01')))
+sqlite3.register_converter('DATE', lambda valor: date.fromisoformat(valor.decode()[:10]))
+sqlite3.register_converter('TIMESTAMP', lambda valor: datetime.fromisoformat(valor.decode()))
+
+
+def _fila_dict(cursor, fila):
+    """Filas como dict, igual que RealDictCursor"""
+    return {columna[0]: valor for columna, valor in zip(cursor.description, fila)}
+
+
+# ==================== DIALECTO ====================
+
+_AHORA = "datetime('now', 'localtime')"
+
+# (patrón, reemplazo) aplicados en orden sobre el SQL de PostgreSQL
+_REGLAS = [
+    # Tipos y DDL
+    (re.compile(r'\bSERIAL PRIMARY KEY\b', re.I), 'INTEGER PRIMARY KEY'),
+    (re.compile(r'\b(CREATE(?:\s+UNIQUE)?\s+INDEX|DROP\s+INDEX)\s+CONCURRENTLY\b', re.I), r'\1'),
+    (re.compile(r'\s+text_pattern_ops\b', re.I), ''),
+    (re.compile(r'\s+ON COMMIT DROP\b', re.I), ''),
+    (re.compile(r'\bDEFAULT CURRENT_TIMESTAMP\b', re.I), f'DEFAULT ({_AHORA})'),
+    # Fechas: hora local como datetime.now(), que es lo que guarda la aplicación
+    (re.compile(r"\bCURRENT_TIMESTAMP\s*-\s*(%s|\d+)\s*\*\s*INTERVAL\s*'1 (\w+?)s?'", re.I),
+     r"datetime('now', 'localtime', '-' || \1 || ' \2s')"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\s*-\s*INTERVAL\s*'(\d+ \w+)'", re.I), r"datetime('now', 'localtime', '-\1')"),
+    (re.compile(r'\bCURRENT_TIMESTAMP\b', re.I), _AHORA),
+    (re.compile(r'\bCURRENT_DATE\b', re.I), "date('now', 'localtime')"),
+    # Expresiones
+    (re.compile(r'::\w+(\(\d+(,\s*\d+)?\))?'), ''),
+    (re.compile(r'\bIS NOT DISTINCT FROM\b', re.I), 'IS'),
+    (re.compile(r'\bIS DISTINCT FROM\b', re.I), 'IS NOT'),
+    (re.compile(r'=\s*ANY\s*\(\s*%s\s*\)', re.I), 'IN (SELECT value FROM json_each(%s))'),
+    (re.compile(r"\bLIKE\s+%s(?!\s+ESCAPE)", re.I), r"LIKE %s ESCAPE '\\'"),
+    # (VALUES ...) AS d(a, b): SQLite nombra las columnas column1, column2...
+    (re.compile(r'\(\s*VALUES\s+(.*?)\)\s+AS\s+(\w+)\s*\(([^)]*)\)', re.I | re.S), None),
+    # SQLite no tiene bloqueo de filas: la transacción ya empieza con BEGIN IMMEDIATE
+    (re.compile(r'\s+FOR UPDATE\b', re.I), ''),
+]
+
+_EXTRACT = re.compile(r'\bEXTRACT\s*\(\s*(YEAR|MONTH|DAY)\s+FROM\s+([\w.]+)\s*\)', re.I)
+_FORMATO_EXTRACT = {'YEAR': '%Y', 'MONTH': '%m', 'DAY': '%d'}
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+_ESCRITURA = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.I)
+_ESCRITURA_CTE = re.compile(r'^\s*WITH\b.*\b(INSERT|UPDATE|DELETE)\b', re.I | re.S)
+_BLOQUEO = re.compile(r'\bFOR UPDATE\b', re.I)
+
+
+def _columnas_values(encontrado):
+    valores, alias, columnas = encontrado.groups()
+    seleccion = ', '.join(f'column{i} AS {c.strip()}' for i, c in enumerate(columnas.split(','), 1))
+    return f'(SELECT {seleccion} FROM (VALUES {valores})) AS {alias}'
+
+
+@lru_cache(maxsize=512)
+def traducir(sql, con_parametros=True):
+    """SQL de PostgreSQL (psycopg2) -> SQL de SQLite. Cacheado: el SQL de la app es constante"""
+    for patron, reemplazo in _REGLAS:
+        sql = patron.sub(_columnas_values if reemplazo is None else reemplazo, sql)
+
+    def placeholder(encontrado):
+        if encontrado.group(1):
+            return f':{encontrado.group(1)}'
+        if encontrado.group(0) == '%%':
+            # psycopg2 solo colapsa %% cuando hay parámetros
+            return '%' if con_parametros else '%%'
+        return '?'
+    sql = _PLACEHOLDER.sub(placeholder, sql)
+
+    # Después de los placeholders, para no confundir el %Y de strftime con uno
+    return _EXTRACT.sub(
+        lambda e: f"CAST(strftime('{_FORMATO_EXTRACT[e.group(1).upper()]}', {e.group(2)}) AS INTEGER)", sql)
+
+
+def _es_escritura(sql):
+    return bool(_ESCRITURA.match(sql) or _ESCRITURA_CTE.match(sql) or _BLOQUEO.search(sql))
+
+
+def _parametros(params):
+    """Las listas (para = ANY) viajan como JSON y se expanden con json_each"""
+    if params is None or isinstance(params, dict):
+        return params if params is not None else ()
+    return [json.dumps(p) if isinstance(p, (list, tuple)) else p for p in params]
+
+
+# ==================== CONEXIONES ====================
+
+_local = threading.local()
+
+
+def _minuscula(texto):
+    return texto.lower() if isinstance(texto, str) else texto
+
+
+def _abrir(ruta):
+    if sqlite3.sqlite_version_info < VERSION_MINIMA:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} es muy viejo: se requiere 3.35 o superior")
+    conn = sqlite3.connect(ruta, detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None,
+                           check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT / 1000)
+    conn.row_factory = _fila_dict
+    for pragma in ('journal_mode = WAL',
+                   f'synchronous = {SQLITE_SYNCHRONOUS}',
+                   f'busy_timeout = {SQLITE_BUSY_TIMEOUT}',
+                   f'cache_size = -{SQLITE_CACHE_KB}',
+                   f'mmap_size = {SQLITE_MMAP_SIZE}',
+                   'temp_store = MEMORY',
+                   'foreign_keys = ON'):
+        conn.execute(f'PRAGMA {pragma}')
+    # lower() de SQLite solo conoce ASCII; la búsqueda necesita 'Á' -> 'á' como en PostgreSQL
+    conn.create_function('lower', 1, _minuscula, deterministic=True)
+    return conn
+
+
+def conexion_del_hilo(ruta):
+    """Conexión de larga vida del hilo actual (se reabre tras un fork de gunicorn)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.ruta != ruta:
+        conn = _abrir(ruta)
+        _local.conn, _local.pid, _local.ruta = conn, os.getpid(), ruta
+    return conn
+
+
+class CursorServidor:
+    """Equivalente al cursor con nombre: SQLite ya recorre el resultado a demanda"""
+
+    def __init__(self, conexion, itersize, tuplas):
+        self._conexion = conexion
+        self._cur = conexion.conn.cursor()
+        if tuplas:
+            self._cur.row_factory = None
+        self.itersize = itersize
+
+    def execute(self, sql, params=None):
+        self._conexion.ejecutar(self._cur, sql, params)
+        return self
+
+    def fetchmany(self, tamano=None):
+        return self._cur.fetchmany(tamano or self.itersize)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+
+class ConexionSQLite:
+    """Misma interfaz que database.ConexionDB sobre la conexión SQLite del hilo"""
+
+    motor = 'sqlite'
+
+    def __init__(self, ruta, por_request=True):
+        self.conn = conexion_del_hilo(ruta)
+        self.por_request = por_request
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+
+    def _empezar(self, sql):
+        # Las escrituras toman el lock de escritura al empezar la transacción:
+        # subir de lectura a escritura a mitad de camino falla con SQLITE_BUSY
+        if not self.conn.in_transaction and _es_escritura(sql):
+            self.conn.execute('BEGIN IMMEDIATE')
+
+    def ejecutar(self, cur, sql, params=None):
+        """Traduce y ejecuta en `cur` sin medir (lo mide quien llama)"""
+        self._empezar(sql)
+        cur.execute(traducir(sql, params is not None), _parametros(params))
+        return cur
+
+    def execute(self, sql, params=None, tuplas=False):
+        cur = self.conn.cursor()
+        if tuplas:
+            cur.row_factory = None
+        with medir(self, sql, params):
+            return self.ejecutar(cur, sql, params)
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor()
+
+    def cursor_servidor(self, nombre, itersize=2000, tuplas=False):
+        return CursorMedido(self, CursorServidor(self, itersize, tuplas))
+
+    def execute_values(self, sql, filas, template=None, fetch=False, page_size=500):
+        """Emula psycopg2.extras.execute_values con VALUES (?, ?), (?, ?)... por lotes"""
+        filas = list(filas)
+        if not filas:
+            return [] if fetch else self.conn.cursor()
+        template = template or '(' + ', '.join(['%s'] * len(filas[0])) + ')'
+        por_lote = max(1, min(page_size, MAX_PARAMETROS // len(filas[0])))
+        resultado, cur = [], self.conn.cursor()
+        for inicio in range(0, len(filas), por_lote):
+            lote = filas[inicio:inicio + por_lote]
+            with medir(self, sql, lote):
+                self.ejecutar(cur, sql.replace('%s', ', '.join([template] * len(lote)), 1),
+                              [valor for fila in lote for valor in fila])
+                if fetch:
+                    resultado.extend(cur.fetchall())
+        return resultado if fetch else cur
+
+    def copy_desde(self, sql, archivo, tamano=65536):
+        """COPY tabla (columnas) FROM STDIN WITH (FORMAT csv) emulado con executemany"""
+        encontrado = re.match(r'\s*COPY\s+(\w+)\s*\(([^)]*)\)\s+FROM\s+STDIN', sql, re.I)
+        if not encontrado:
+            raise ValueError(f'COPY no soportado en SQLite: {sql}')
+        tabla, columnas = encontrado.group(1), [c.strip() for c in encontrado.group(2).split(',')]
+        insert = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['?'] * len(columnas))})"
+
+        def lineas():
+            pendiente = ''
+            while True:
+                bloque = archivo.read(tamano)
+                if not bloque:
+                    break
+                pendiente += bloque
+                *completas, pendiente = pendiente.split('\n')
+                for linea in completas:
+                    yield linea + '\n'
+            if pendiente:
+                yield pendiente
+
+        # En CSV de COPY el campo vacío sin comillas es NULL
+        filas = ([valor if valor != '' else None for valor in fila] for fila in csv.reader(lineas()))
+        self._empezar(insert)
+        cur = self.conn.cursor()
+        with medir(self, sql):
+            while True:
+                lote = list(islice(filas, FILAS_POR_LOTE))
+                if not lote:
+                    return cur
+                cur.executemany(insert, lote)
+
+    def commit(self):
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+    def close(self):
+        """En un request la conexión se libera en el teardown; fuera de él, ahora"""
+        if not self.por_request:
+            self.liberar()
 
-# Detectar cuál base de datos usar
-DATABASE_URL = os.environ.get('DATABASE_URL')
-USE_POSTGRES = DATABASE_URL is not None
-
-if USE_POSTGRES:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    DB_TYPE = 'postgresql'
-else:
-    import sqlite3
-    DB_TYPE = 'sqlite'
-
-def get_db_connection():
-    """Retorna conexión a la base de datos apropiada"""
-    if USE_POSTGRES:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
-    else:
-        conn = sqlite3.connect('sistema_ventas.db')
-        conn.row_factory = sqlite3.Row
-        return conn
-
-def get_cursor(conn):
-    """Retorna cursor apropiado según el tipo de BD"""
-    if USE_POSTGRES:
-        return conn.cursor(cursor_factory=RealDictCursor)
-    else:
-        return conn.cursor()
-
-def get_placeholder():
-    """Retorna el placeholder apropiado (? para SQLite, %s para PostgreSQL)"""
-    return '%s' if USE_POSTGRES else '?'
-
-def adapt_query(query):
-    """Adapta una query de SQLite a PostgreSQL si es necesario"""
-    if not USE_POSTGRES:
-        return query
-    
-    # Convertir tipos de datos
-    query = query.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'SERIAL PRIMARY KEY')
-    query = query.replace('REAL', 'DECIMAL(10,2)')
-    query = query.replace('TIMESTAMP DEFAULT CURRENT_TIMESTAMP', 'TIMESTAMP DEFAULT NOW()')
-    
-    # Convertir placeholders
-    query = query.replace('?', '%s')
-    
-    # Convertir funciones de fecha
-    query = query.replace("strftime('%m',", "EXTRACT(MONTH FROM")
-    query = query.replace("strftime('%Y',", "EXTRACT(YEAR FROM")
-    query = query.replace("strftime('%d',", "EXTRACT(DAY FROM")
-    
-    # Cerrar paréntesis de EXTRACT
-    if 'EXTRACT(' in query:
-        # Contar paréntesis y ajustar
-        pass  # Por simplicidad, asumimos que las queries ya están bien formadas
-    
-    return query
-
-def init_database(app):
-    """Inicializa la base de datos"""
-    with app.app_context():
-        conn = get_db_connection()
-        cur = get_cursor(conn)
-        
-        # Tabla de usuarios
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                nombre TEXT NOT NULL,
-                rol TEXT DEFAULT 'admin',
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de productos
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                descripcion TEXT,
-                cantidad INTEGER DEFAULT 0,
-                costo_unitario REAL NOT NULL,
-                precio_venta REAL NOT NULL,
-                stock_minimo INTEGER DEFAULT 5,
-                estado TEXT DEFAULT 'disponible',
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                usuario_id INTEGER NOT NULL,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de ventas
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS ventas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                producto_id INTEGER NOT NULL,
-                cliente_nombre TEXT NOT NULL,
-                cliente_telefono TEXT,
-                cantidad INTEGER NOT NULL,
-                precio_unitario REAL NOT NULL,
-                total_vendido REAL NOT NULL,
-                costo_total REAL NOT NULL,
-                ganancia REAL NOT NULL,
-                diezmo REAL NOT NULL,
-                tipo_venta TEXT DEFAULT 'contado',
-                estado_pago TEXT DEFAULT 'completado',
-                fecha_venta DATE NOT NULL,
-                usuario_id INTEGER NOT NULL,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (producto_id) REFERENCES productos (id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de pagos
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS pagos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                venta_id INTEGER NOT NULL,
-                monto REAL NOT NULL,
-                fecha_pago DATE NOT NULL,
-                metodo_pago TEXT,
-                notas TEXT,
-                usuario_id INTEGER NOT NULL,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (venta_id) REFERENCES ventas (id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de diezmos mensuales
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS diezmos_mensuales (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                mes INTEGER NOT NULL,
-                anio INTEGER NOT NULL,
-                total_diezmo REAL NOT NULL,
-                estado TEXT DEFAULT 'Pendiente',
-                fecha_entrega TIMESTAMP,
-                usuario_id INTEGER NOT NULL,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
-                UNIQUE(mes, anio, usuario_id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de configuración
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS configuracion (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                clave TEXT UNIQUE NOT NULL,
-                valor TEXT NOT NULL,
-                usuario_id INTEGER NOT NULL,
-                fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Tabla de gastos
-        query = adapt_query('''
-            CREATE TABLE IF NOT EXISTS gastos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                fecha DATE NOT NULL,
-                categoria TEXT NOT NULL,
-                descripcion TEXT,
-                monto REAL NOT NULL,
-                usuario_id INTEGER NOT NULL,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        cur.execute(query)
-        
-        # Crear usuario admin por defecto
-        ph = get_placeholder()
-        cur.execute(f'SELECT id FROM usuarios WHERE username = {ph}', ('admin',))
-        if cur.fetchone() is None:
-            from werkzeug.security import generate_password_hash
-            hashed_password = generate_password_hash('admin123')
-            cur.execute(
-                f'INSERT INTO usuarios (username, password, nombre, rol) VALUES ({ph}, {ph}, {ph}, {ph})',
-                ('admin', hashed_password, 'Administrador', 'admin')
-            )
-            cur.execute(f'SELECT id FROM usuarios WHERE username = {ph}', ('admin',))
-            user_id = cur.fetchone()[0] if USE_POSTGRES else cur.fetchone()['id']
-            
-            # Configuración por defecto
-            cur.execute(f'INSERT INTO configuracion (clave, valor, usuario_id) VALUES ({ph}, {ph}, {ph})',
-                       ('moneda_simbolo', 'RD$', user_id))
-            cur.execute(f'INSERT INTO configuracion (clave, valor, usuario_id) VALUES ({ph}, {ph}, {ph})',
-                       ('moneda_codigo', 'DOP', user_id))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"✓ Base de datos {DB_TYPE.upper()} inicializada correctamente")
+    def liberar(self):
+        """La conexión queda abierta para el hilo; solo se descarta la transacción pendiente"""
+        if self.conn is not None:
+            self.rollback()
+            self.conn = None
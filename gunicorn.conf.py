@@ -0,0 +1,63 @@
+"""
+Configuración de gunicorn (se carga sola desde el directorio del proyecto)
+
+La app se importa una vez en el master (preload_app) y los workers se crean
+con fork: arrancan sin volver a importar nada y comparten la memoria de los
+módulos. Cada worker abre su pool y carga la configuración antes de aceptar
+requests, así el primer request después de un deploy no paga ese costo.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Workers e hilos por worker (los hilos solapan la espera de la base de datos).
+# Cada worker tiene su propio pool de hasta DB_POOL_MAX conexiones, que por
+# defecto es hilos + 2 por hilo de exportación (database.py): con 2 workers,
+# 4 hilos y EXPORT_WORKERS=2 son 2 × (4 + 2 × 2) = 16 conexiones por
+# contenedor. Antes de subir WEB_CONCURRENCY o GUNICORN_THREADS revisar el
+# máximo de conexiones del plan de PostgreSQL.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
+
+# Reciclar workers cada tanto (con jitter para que no se reinicien a la vez)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+preload_app = True
+
+
+def when_ready(server):
+    """En el master, con la app ya importada y antes de crear los workers"""
+    from app import precompilar_plantillas
+    from utils import metricas
+    precompilar_plantillas()
+    metricas.limpiar()
+
+
+def post_worker_init(worker):
+    """En cada worker, antes de que empiece a aceptar conexiones"""
+    from app import calentar_worker
+    try:
+        calentar_worker()
+    except Exception as e:
+        # Sin base de datos el worker arranca igual; el primer request lo reintenta
+        worker.log.warning(f"Calentamiento del worker falló: {e}")
+
+
+def worker_exit(server, worker):
+    """En el worker que termina: último volcado de sus métricas"""
+    from utils import metricas
+    metricas.volcar(forzar=True)
+
+
+def child_exit(server, worker):
+    """En el master: los contadores del worker muerto pasan a terminados.json"""
+    from utils import metricas
+    try:
+        metricas.worker_terminado(worker.pid)
+    except Exception as e:
+        server.log.warning(f"No se pudieron consolidar las métricas del worker {worker.pid}: {e}")
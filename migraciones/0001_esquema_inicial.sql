@@ -0,0 +1,82 @@
+-- Tablas base del sistema (IF NOT EXISTS: bases creadas antes de las
+-- migraciones ya las tienen)
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    nombre VARCHAR(200) NOT NULL,
+    rol VARCHAR(50) DEFAULT 'admin',
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS productos (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(200) NOT NULL,
+    descripcion TEXT,
+    cantidad INTEGER DEFAULT 0,
+    costo_unitario DECIMAL(10,2) NOT NULL,
+    precio_venta DECIMAL(10,2) NOT NULL,
+    stock_minimo INTEGER DEFAULT 5,
+    estado VARCHAR(50) DEFAULT 'disponible',
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id)
+);
+
+CREATE TABLE IF NOT EXISTS ventas (
+    id SERIAL PRIMARY KEY,
+    producto_id INTEGER NOT NULL REFERENCES productos(id),
+    cliente_nombre VARCHAR(200) NOT NULL,
+    cliente_telefono VARCHAR(50),
+    cantidad INTEGER NOT NULL,
+    precio_unitario DECIMAL(10,2) NOT NULL,
+    total_vendido DECIMAL(10,2) NOT NULL,
+    costo_total DECIMAL(10,2) NOT NULL,
+    ganancia DECIMAL(10,2) NOT NULL,
+    diezmo DECIMAL(10,2) NOT NULL,
+    tipo_venta VARCHAR(50) DEFAULT 'contado',
+    estado_pago VARCHAR(50) DEFAULT 'completado',
+    fecha_venta DATE NOT NULL,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS pagos (
+    id SERIAL PRIMARY KEY,
+    venta_id INTEGER NOT NULL REFERENCES ventas(id),
+    monto DECIMAL(10,2) NOT NULL,
+    fecha_pago DATE NOT NULL,
+    metodo_pago VARCHAR(100),
+    notas TEXT,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS diezmos_mensuales (
+    id SERIAL PRIMARY KEY,
+    mes INTEGER NOT NULL,
+    anio INTEGER NOT NULL,
+    total_diezmo DECIMAL(10,2) NOT NULL,
+    estado VARCHAR(50) DEFAULT 'Pendiente',
+    fecha_entrega TIMESTAMP,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    UNIQUE(mes, anio, usuario_id)
+);
+
+CREATE TABLE IF NOT EXISTS configuracion (
+    id SERIAL PRIMARY KEY,
+    clave VARCHAR(100) UNIQUE NOT NULL,
+    valor TEXT NOT NULL,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    fecha_modificacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS gastos (
+    id SERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    categoria VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    monto DECIMAL(10,2) NOT NULL,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,15 @@
+"""Usuario admin por defecto y su configuración de moneda"""
+from werkzeug.security import generate_password_hash
+
+
+def aplicar(db):
+    if db.execute('SELECT id FROM usuarios WHERE username = %s', ('admin',)).fetchone():
+        return
+    user_id = db.execute(
+        'INSERT INTO usuarios (username, password, nombre, rol) VALUES (%s, %s, %s, %s) RETURNING id',
+        ('admin', generate_password_hash('admin123'), 'Administrador', 'admin')
+    ).fetchone()['id']
+    db.execute('INSERT INTO configuracion (clave, valor, usuario_id) VALUES (%s, %s, %s)',
+               ('moneda_simbolo', 'RD$', user_id))
+    db.execute('INSERT INTO configuracion (clave, valor, usuario_id) VALUES (%s, %s, %s)',
+               ('moneda_codigo', 'DOP', user_id))
@@ -0,0 +1,32 @@
+"""Columnas total_pagado / saldo_pendiente en ventas, calculadas desde pagos"""
+
+
+def _calcular_saldos(db):
+    """Saldos desde pagos con SQL propio (no utils.saldos): la migración no cambia si cambia la aplicación"""
+    db.execute('''
+        UPDATE ventas
+        SET total_pagado = COALESCE((SELECT SUM(p.monto) FROM pagos p WHERE p.venta_id = ventas.id), 0)
+    ''')
+    db.execute('''
+        UPDATE ventas
+        SET saldo_pendiente = total_vendido - total_pagado,
+            estado_pago = CASE
+                WHEN tipo_venta != 'credito' OR total_vendido - total_pagado <= 0 THEN 'completado'
+                WHEN total_pagado > 0 THEN 'parcial'
+                ELSE 'pendiente'
+            END
+    ''')
+
+
+def aplicar(db):
+    existe = db.execute('''
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'ventas' AND column_name = 'saldo_pendiente'
+        ) AS existe
+    ''').fetchone()['existe']
+    if existe:
+        return
+    db.execute('ALTER TABLE ventas ADD COLUMN IF NOT EXISTS total_pagado DECIMAL(10,2) NOT NULL DEFAULT 0')
+    db.execute('ALTER TABLE ventas ADD COLUMN IF NOT EXISTS saldo_pendiente DECIMAL(10,2) NOT NULL DEFAULT 0')
+    _calcular_saldos(db)
@@ -0,0 +1,39 @@
+"""Resumen mensual por usuario (mantenido por ventas y pagos), con backfill"""
+
+
+def aplicar(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS resumen_mensual (
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+            anio INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            total_vendido DECIMAL(14,2) NOT NULL DEFAULT 0,
+            costo_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+            ganancia DECIMAL(14,2) NOT NULL DEFAULT 0,
+            diezmo DECIMAL(14,2) NOT NULL DEFAULT 0,
+            num_ventas INTEGER NOT NULL DEFAULT 0,
+            credito_pendiente DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (usuario_id, anio, mes)
+        )
+    ''')
+    estado = db.execute(
+        'SELECT EXISTS (SELECT 1 FROM resumen_mensual) AS lleno, EXISTS (SELECT 1 FROM ventas) AS hay_ventas'
+    ).fetchone()
+    if estado['hay_ventas'] and not estado['lleno']:
+        # SQL fijo (no utils.resumen): la migración hace siempre lo mismo aunque cambie la aplicación
+        db.execute('''
+            INSERT INTO resumen_mensual (usuario_id, anio, mes, total_vendido, costo_total, ganancia,
+                                         diezmo, num_ventas, credito_pendiente)
+            SELECT usuario_id,
+                   EXTRACT(YEAR FROM fecha_venta)::INTEGER,
+                   EXTRACT(MONTH FROM fecha_venta)::INTEGER,
+                   SUM(total_vendido),
+                   SUM(costo_total),
+                   SUM(ganancia),
+                   SUM(diezmo),
+                   COUNT(*),
+                   COALESCE(SUM(CASE WHEN tipo_venta = 'credito' AND estado_pago != 'completado'
+                                     THEN saldo_pendiente END), 0)
+            FROM ventas
+            GROUP BY 1, 2, 3
+        ''')
@@ -0,0 +1,19 @@
+-- Trabajos de exportación en segundo plano
+
+CREATE TABLE IF NOT EXISTS trabajos_exportacion (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    tipo VARCHAR(50) NOT NULL,
+    parametros TEXT NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    progreso INTEGER NOT NULL DEFAULT 0,
+    archivo TEXT,
+    nombre_descarga VARCHAR(200),
+    error TEXT,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_inicio TIMESTAMP,
+    fecha_fin TIMESTAMP,
+    expira TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos_exportacion(estado, fecha_creacion);
@@ -0,0 +1,28 @@
+-- sin transaccion
+-- Índices de las tablas grandes, creados sin bloquear escrituras
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_fecha ON ventas(fecha_venta);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_usuario ON ventas(usuario_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gastos_fecha ON gastos(fecha);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_usuario ON productos(usuario_id);
+
+-- (usuario_id, fecha_venta, fecha_registro, id): rangos de fecha y orden del listado de ventas
+DROP INDEX CONCURRENTLY IF EXISTS idx_ventas_usuario_fecha;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_usuario_orden ON ventas(usuario_id, fecha_venta, fecha_registro, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_gastos_usuario_fecha ON gastos(usuario_id, fecha);
+
+-- Inventario paginado y búsqueda de productos por prefijo
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_usuario_orden ON productos(usuario_id, fecha_registro, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_usuario_nombre ON productos(usuario_id, lower(nombre) text_pattern_ops);
+
+-- Exportación de pagos por rango de fechas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pagos_usuario_fecha ON pagos(usuario_id, fecha_pago);
+
+-- Filtros del listado de ventas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_usuario_producto ON ventas(usuario_id, producto_id, fecha_venta);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_usuario_cliente ON ventas(usuario_id, lower(cliente_nombre) text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_usuario_estado ON ventas(usuario_id, tipo_venta, estado_pago, fecha_venta);
+
+-- Cuentas por cobrar: solo las ventas a crédito abiertas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_credito_abiertas ON ventas(usuario_id, fecha_venta DESC)
+    WHERE tipo_venta = 'credito' AND estado_pago != 'completado';
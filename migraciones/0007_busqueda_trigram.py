@@ -0,0 +1,23 @@
+"""Índice trigram para la búsqueda de productos por subcadena (requiere pg_trgm)"""
+import logging
+
+import psycopg2
+
+from utils.migraciones import crear_indice_concurrente
+
+TRANSACCION = False
+
+logger = logging.getLogger('sistema_ventas.migraciones')
+
+
+def aplicar(db):
+    try:
+        db.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except psycopg2.Error as e:
+        # Sin permisos para la extensión: la búsqueda por subcadena funciona, pero sin índice
+        logger.warning('Índice trigram no disponible: %s', e)
+        return
+    crear_indice_concurrente(db, '''
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_busqueda_trgm ON productos
+        USING gin ((lower(nombre || ' ' || COALESCE(descripcion, ''))) gin_trgm_ops)
+    ''')
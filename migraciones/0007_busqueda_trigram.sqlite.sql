@@ -0,0 +1,3 @@
+-- SQLite no tiene pg_trgm: la búsqueda por subcadena recorre los productos
+-- del usuario (idx_productos_usuario). Se registra la versión para que la
+-- numeración siga igual que en PostgreSQL.
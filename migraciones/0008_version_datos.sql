@@ -0,0 +1,7 @@
+-- Versión de los datos de cada usuario: la suben las rutas que escriben y
+-- las páginas de lectura la usan para su ETag
+
+CREATE TABLE IF NOT EXISTS version_datos (
+    usuario_id INTEGER PRIMARY KEY REFERENCES usuarios(id),
+    version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,10 @@
+-- Versión de los datos de cada mes por usuario (caché de reportes de meses
+-- cerrados); anio = 0, mes = 0 es la versión que afecta a todos los meses
+
+CREATE TABLE IF NOT EXISTS version_periodo (
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    anio INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (usuario_id, anio, mes)
+);
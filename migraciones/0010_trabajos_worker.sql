@@ -0,0 +1,4 @@
+-- Proceso (host:pid) que encoló cada trabajo de exportación: al arrancar un
+-- worker se marcan como error los trabajos de procesos que ya no existen
+
+ALTER TABLE trabajos_exportacion ADD COLUMN IF NOT EXISTS worker VARCHAR(100);
@@ -0,0 +1,3 @@
+-- Proceso (host:pid) que encoló cada trabajo de exportación (SQLite: sin ADD COLUMN IF NOT EXISTS)
+
+ALTER TABLE trabajos_exportacion ADD COLUMN worker VARCHAR(100);
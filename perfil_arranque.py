@@ -0,0 +1,56 @@
+"""
+Perfil de arranque - Sistema ERP Ventas
+Importa la app en un proceso nuevo con `python -X importtime` y muestra
+cuánto tarda cada módulo (acumulado con sus dependencias), para vigilar
+que el arranque de los workers siga siendo rápido.
+
+Uso: python perfil_arranque.py [cantidad de módulos a mostrar]
+"""
+
+import subprocess
+import sys
+
+TOP = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+# Módulos que no deben cargarse al arrancar (se importan al usarse)
+DIFERIDOS = ['openpyxl']
+
+resultado = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-c',
+     'import sys, time; t = time.perf_counter(); import app; '
+     'print(time.perf_counter() - t); print(",".join(sorted(sys.modules)))'],
+    capture_output=True, text=True
+)
+if resultado.returncode != 0:
+    print(resultado.stderr[-2000:])
+    sys.exit(1)
+
+modulos = []
+for linea in resultado.stderr.splitlines():
+    if not linea.startswith('import time:') or 'cumulative' in linea:
+        continue
+    # import time: <propio us> | <acumulado us> | <módulo con sangría>
+    propio, acumulado, nombre = [parte.strip() for parte in linea[len('import time:'):].split('|')]
+    modulos.append((int(acumulado), int(propio), nombre))
+
+lineas_salida = resultado.stdout.strip().splitlines()
+total = float(lineas_salida[-2])
+cargados = set(lineas_salida[-1].split(','))
+
+print("=" * 60)
+print("PERFIL DE ARRANQUE - SISTEMA ERP VENTAS")
+print("=" * 60)
+print(f"\nimport app: {total * 1000:.0f} ms ({len(cargados)} módulos cargados)\n")
+print(f"{'acumulado':>10} {'propio':>8}  módulo")
+for acumulado, propio, nombre in sorted(modulos, reverse=True)[:TOP]:
+    print(f"{acumulado / 1000:>8.1f}ms {propio / 1000:>6.1f}ms  {nombre}")
+
+print()
+fallos = 0
+for modulo in DIFERIDOS:
+    if modulo in cargados:
+        print(f"❌ {modulo} se importa al arrancar (debería cargarse al usarse)")
+        fallos += 1
+    else:
+        print(f"✓ {modulo} no se carga al arrancar")
+sys.exit(1 if fallos else 0)
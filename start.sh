@@ -1,7 +1,11 @@
 #!/bin/bash
+set -e
 
-echo "Inicializando base de datos..."
-python -c "from app import init_db; init_db()"
+echo "Aplicando migraciones de base de datos..."
+flask --app app migrar
 
-echo "Iniciando servidor con Gunicorn..."
-gunicorn app:app --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+echo "Construyendo archivos estáticos (huella + gzip/brotli)..."
+python construir_assets.py > /dev/null
+
+echo "Iniciando servidor con Gunicorn (configuración en gunicorn.conf.py)..."
+exec gunicorn app:app
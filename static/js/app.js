@@ -347,3 +347,121 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+
+// ========================================
+// BUSCADOR DE PRODUCTOS (AUTOCOMPLETADO)
+// ========================================
+
+// Conecta un input de texto a /api/productos/buscar; llama onSelect(producto)
+function initBuscadorProductos(input, onSelect, opciones) {
+    if (!input) return;
+    opciones = opciones || {};
+    const lista = document.createElement('ul');
+    lista.className = 'autocomplete-list';
+    input.parentNode.appendChild(lista);
+    let timer = null;
+    let ultimaConsulta = '';
+
+    function cerrar() {
+        lista.innerHTML = '';
+        lista.style.display = 'none';
+    }
+
+    function mostrar(productos) {
+        lista.innerHTML = '';
+        if (!productos.length) {
+            const vacio = document.createElement('li');
+            vacio.className = 'autocomplete-empty';
+            vacio.textContent = 'Sin resultados';
+            lista.appendChild(vacio);
+        }
+        productos.forEach(function(producto) {
+            const item = document.createElement('li');
+            item.textContent = `${producto.nombre} (Stock: ${producto.cantidad})`;
+            item.addEventListener('mousedown', function(e) {
+                e.preventDefault();
+                input.value = item.textContent;
+                cerrar();
+                onSelect(producto);
+            });
+            lista.appendChild(item);
+        });
+        lista.style.display = 'block';
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const q = input.value.trim();
+        if (q.length < (opciones.minimo || 1)) {
+            cerrar();
+            return;
+        }
+        timer = setTimeout(function() {
+            ultimaConsulta = q;
+            fetch(`/api/productos/buscar?disponibles=1&q=${encodeURIComponent(q)}`)
+                .then(response => response.json())
+                .then(productos => {
+                    // Ignorar respuestas de búsquedas ya superadas
+                    if (q === ultimaConsulta) mostrar(productos);
+                });
+        }, 250);
+    });
+    input.addEventListener('blur', cerrar);
+}
+
+// ========================================
+// EXPORTACIONES EN SEGUNDO PLANO
+// ========================================
+
+// Formularios con data-trabajo="<tipo>" se encolan en /reportes/trabajos y
+// se consulta el progreso hasta que el archivo está listo. Sin JavaScript
+// el formulario sigue enviándose a su action normal.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form[data-trabajo]').forEach(function(form) {
+        const estado = document.createElement('p');
+        estado.className = 'form-hint export-status';
+        form.appendChild(estado);
+
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            const boton = form.querySelector('button[type="submit"]');
+            const datos = new FormData(form);
+            datos.set('tipo', form.dataset.trabajo);
+            boton.disabled = true;
+            estado.textContent = 'Generando reporte...';
+
+            function terminar(mensaje) {
+                boton.disabled = false;
+                estado.textContent = mensaje;
+            }
+
+            function consultar(url) {
+                fetch(url)
+                    .then(response => response.json())
+                    .then(trabajo => {
+                        if (trabajo.estado === 'completado') {
+                            terminar('Reporte listo');
+                            window.location = trabajo.url_descarga;
+                        } else if (trabajo.estado === 'error' || trabajo.estado === 'expirado' || trabajo.error) {
+                            terminar('Error al generar el reporte: ' + (trabajo.error || trabajo.estado));
+                        } else {
+                            estado.textContent = `Generando reporte... ${trabajo.progreso || 0}%`;
+                            setTimeout(function() { consultar(url); }, 1000);
+                        }
+                    })
+                    .catch(() => terminar('No se pudo consultar el estado del reporte'));
+            }
+
+            fetch('/reportes/trabajos', { method: 'POST', body: datos })
+                .then(response => response.json())
+                .then(trabajo => {
+                    if (trabajo.url_estado) {
+                        consultar(trabajo.url_estado);
+                    } else {
+                        terminar(trabajo.error || 'No se pudo crear el reporte');
+                    }
+                })
+                .catch(() => terminar('No se pudo crear el reporte'));
+        });
+    });
+});
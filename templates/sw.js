@@ -0,0 +1,38 @@
+// Service worker del ERP Ventas (generado por /sw.js con la versión de los assets)
+// Precarga el app shell (CSS, JS y manifest con huella) y lo sirve desde la
+// caché; las páginas y la API siempre van a la red (datos por usuario).
+const CACHE = 'erp-ventas-{{ version }}';
+const APP_SHELL = {{ app_shell | tojson }};
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE).then(cache => cache.addAll(APP_SHELL)).then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    // Borrar las cachés de versiones anteriores
+    event.waitUntil(
+        caches.keys()
+            .then(nombres => Promise.all(nombres.filter(n => n !== CACHE).map(n => caches.delete(n))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== location.origin
+            || !url.pathname.startsWith('/static/dist/')) {
+        return;
+    }
+    // Archivos con huella: inmutables, la caché siempre tiene razón
+    event.respondWith(
+        caches.match(event.request).then(respuesta => respuesta || fetch(event.request).then(nueva => {
+            if (nueva.ok) {
+                const copia = nueva.clone();
+                caches.open(CACHE).then(cache => cache.put(event.request, copia));
+            }
+            return nueva;
+        }))
+    );
+});
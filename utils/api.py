@@ -0,0 +1,114 @@
+"""
+API JSON de solo lectura (/api/v1/<recurso>)
+
+Campos a pedido (?campos=id,total_vendido): solo esas columnas se piden a la
+base, y el JOIN con productos solo si se pide producto_nombre. Paginación
+por cursor sobre la misma clave de orden que las páginas HTML. La respuesta
+es compacta: las columnas una vez y cada fila como arreglo, armada desde
+tuplas del cursor sin pasar por un dict por fila.
+
+    {"columnas": ["id", "total_vendido"], "filas": [[12, "450.00"], ...], "siguiente": "WyIy..."}
+
+Los montos van como texto ("450.00") para no perder centavos.
+"""
+import json
+
+from utils.exportar import valor_json
+from utils.paginacion import cortar_pagina, decodificar_cursor
+
+# recurso -> (tabla con alias v, columna de fecha para desde/hasta o None,
+#             clave de orden (descendente), columnas públicas (nombre, expresión))
+RECURSOS = {
+    'ventas': ('ventas v', 'v.fecha_venta', ['v.fecha_venta', 'v.fecha_registro', 'v.id'], [
+        ('id', 'v.id'), ('fecha_venta', 'v.fecha_venta'), ('producto_id', 'v.producto_id'),
+        ('producto_nombre', 'p.nombre'), ('cliente_nombre', 'v.cliente_nombre'),
+        ('cliente_telefono', 'v.cliente_telefono'), ('cantidad', 'v.cantidad'),
+        ('precio_unitario', 'v.precio_unitario'), ('total_vendido', 'v.total_vendido'),
+        ('costo_total', 'v.costo_total'), ('ganancia', 'v.ganancia'), ('diezmo', 'v.diezmo'),
+        ('tipo_venta', 'v.tipo_venta'), ('estado_pago', 'v.estado_pago'),
+        ('total_pagado', 'v.total_pagado'), ('saldo_pendiente', 'v.saldo_pendiente'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ]),
+    'pagos': ('pagos v', 'v.fecha_pago', ['v.fecha_pago', 'v.id'], [
+        ('id', 'v.id'), ('venta_id', 'v.venta_id'), ('monto', 'v.monto'),
+        ('fecha_pago', 'v.fecha_pago'), ('metodo_pago', 'v.metodo_pago'), ('notas', 'v.notas'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ]),
+    'productos': ('productos v', None, ['v.fecha_registro', 'v.id'], [
+        ('id', 'v.id'), ('nombre', 'v.nombre'), ('descripcion', 'v.descripcion'),
+        ('cantidad', 'v.cantidad'), ('costo_unitario', 'v.costo_unitario'),
+        ('precio_venta', 'v.precio_venta'), ('stock_minimo', 'v.stock_minimo'),
+        ('estado', 'v.estado'), ('fecha_registro', 'v.fecha_registro'),
+    ]),
+    'gastos': ('gastos v', 'v.fecha', ['v.fecha', 'v.id'], [
+        ('id', 'v.id'), ('fecha', 'v.fecha'), ('categoria', 'v.categoria'),
+        ('descripcion', 'v.descripcion'), ('monto', 'v.monto'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ]),
+    'diezmos_mensuales': ('diezmos_mensuales v', None, ['v.anio', 'v.mes', 'v.id'], [
+        ('id', 'v.id'), ('mes', 'v.mes'), ('anio', 'v.anio'), ('total_diezmo', 'v.total_diezmo'),
+        ('estado', 'v.estado'), ('fecha_entrega', 'v.fecha_entrega'),
+    ]),
+}
+
+# Alias de tabla -> JOIN que lo trae (solo si alguna columna pedida lo usa)
+JOINS = {
+    'p.': 'JOIN productos p ON v.producto_id = p.id',
+}
+
+_codificar = json.JSONEncoder(ensure_ascii=False, default=valor_json, separators=(',', ':')).encode
+
+
+class ParametrosInvalidos(ValueError):
+    """Campos desconocidos o filtros que el recurso no admite"""
+
+
+def consulta_pagina(recurso, usuario_id, campos=None, cursor=None, por_pagina=50, desde=None, hasta=None):
+    """
+    SQL y parámetros de una página de `recurso` y los nombres de las columnas.
+    Cada fila trae las columnas pedidas y al final la clave de orden (para el cursor).
+    """
+    origen, columna_fecha, orden, columnas = RECURSOS[recurso]
+    disponibles = dict(columnas)
+    nombres = campos or [nombre for nombre, _ in columnas]
+    desconocidos = [c for c in nombres if c not in disponibles]
+    if desconocidos:
+        raise ParametrosInvalidos(f"Campos desconocidos: {', '.join(desconocidos)} "
+                                  f"(disponibles: {', '.join(disponibles)})")
+    expresiones = [disponibles[c] for c in nombres]
+    joins = [join for alias, join in JOINS.items() if any(e.startswith(alias) for e in expresiones)]
+
+    condiciones = ['v.usuario_id = %s']
+    params = [usuario_id]
+    if (desde or hasta) and columna_fecha is None:
+        raise ParametrosInvalidos(f'{recurso} no admite filtro por fecha')
+    if desde:
+        condiciones.append(f'{columna_fecha} >= %s')
+        params.append(desde)
+    if hasta:
+        condiciones.append(f'{columna_fecha} <= %s')
+        params.append(hasta)
+    cursor = decodificar_cursor(cursor, len(orden))
+    if cursor:
+        condiciones.append(f"({', '.join(orden)}) < ({', '.join(['%s'] * len(orden))})")
+        params.extend(cursor)
+
+    sql = f'''
+        SELECT {', '.join(expresiones + orden)}
+        FROM {origen} {' '.join(joins)}
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY {', '.join(f'{c} DESC' for c in orden)}
+        LIMIT %s
+    '''
+    return sql, params + [por_pagina + 1], nombres
+
+
+def serializar_pagina(recurso, nombres, filas, por_pagina):
+    """JSON de la página a partir de las tuplas de consulta_pagina()"""
+    largo_clave = len(RECURSOS[recurso][2])
+    filas, siguiente = cortar_pagina(filas, por_pagina, lambda fila: fila[-largo_clave:])
+    return _codificar({
+        'columnas': nombres,
+        'filas': [fila[:len(nombres)] for fila in filas],
+        'siguiente': siguiente,
+    })
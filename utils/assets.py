@@ -0,0 +1,71 @@
+"""
+Archivos estáticos con huella (fingerprint) y precomprimidos
+
+construir_assets.py copia cada archivo de static/ a static/dist/ con el hash
+del contenido en el nombre (css/style.3f2a9c1b7e.css), más sus versiones
+.gz y .br, y escribe static/dist/assets.json. Como el nombre cambia con el
+contenido, se sirven con caché inmutable de un año; el service worker
+(/sw.js) los precarga como app shell.
+
+Sin assets.json (desarrollo) asset_url() devuelve la URL normal de static.
+"""
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+DIST = os.path.join(STATIC, 'dist')
+MANIFIESTO = os.path.join(DIST, 'assets.json')
+
+UN_ANIO = 365 * 24 * 3600
+
+# Preferencia de codificación y extensión del archivo precomprimido
+PRECOMPRIMIDOS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _cargar_manifiesto():
+    try:
+        with open(MANIFIESTO, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': None, 'archivos': {}}
+
+
+_manifiesto = _cargar_manifiesto()
+
+
+def version():
+    """Hash del conjunto de archivos (None si no se construyeron)"""
+    return _manifiesto['version']
+
+
+def asset_url(filename):
+    """Como url_for('static', filename=...), con el nombre con huella si existe"""
+    con_huella = _manifiesto['archivos'].get(filename)
+    if con_huella is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=con_huella)
+
+
+def app_shell():
+    """URLs que el service worker precarga"""
+    return [url_for('asset', filename=f) for f in _manifiesto['archivos'].values()]
+
+
+def enviar(filename):
+    """Sirve un archivo de static/dist/ (br o gzip si el cliente los acepta)"""
+    tipo = mimetypes.guess_type(filename)[0]
+    codificacion = None
+    nombre = filename
+    for candidata, extension in PRECOMPRIMIDOS:
+        if request.accept_encodings[candidata] and os.path.isfile(os.path.join(DIST, filename + extension)):
+            codificacion, nombre = candidata, filename + extension
+            break
+    respuesta = send_from_directory(DIST, nombre, mimetype=tipo, max_age=UN_ANIO)
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.headers['Cache-Control'] = f'public, max-age={UN_ANIO}, immutable'
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta
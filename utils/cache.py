@@ -0,0 +1,113 @@
+"""
+Cachés en memoria del proceso (una instancia por worker de gunicorn)
+"""
+import os
+import threading
+import time
+
+CONFIG_CACHE_TTL = float(os.environ.get('CONFIG_CACHE_TTL', 300))
+
+
+class CacheTTL:
+    """Diccionario thread-safe con expiración por entrada y tamaño máximo"""
+
+    def __init__(self, ttl, max_entradas=1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return default
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        with self._lock:
+            if len(self._datos) >= self.max_entradas and clave not in self._datos:
+                self._purgar()
+            self._datos[clave] = (valor, time.monotonic() + (ttl if ttl is not None else self.ttl))
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def invalidar_prefijo(self, prefijo):
+        """Elimina las claves tupla cuyo primer elemento es `prefijo` (p. ej. un usuario)"""
+        with self._lock:
+            for clave in [c for c in self._datos if isinstance(c, tuple) and c and c[0] == prefijo]:
+                del self._datos[clave]
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (_, expira) in self._datos.items() if expira < ahora]:
+            del self._datos[clave]
+        # Si sigue lleno, descartar las entradas más próximas a expirar
+        while len(self._datos) >= self.max_entradas:
+            del self._datos[min(self._datos, key=lambda c: self._datos[c][1])]
+
+
+class CacheConfiguracion:
+    """
+    Copia en memoria de toda la tabla configuracion.
+
+    Se carga completa de una vez; al vencer el TTL solo se consulta la
+    versión (MAX(fecha_modificacion), COUNT(*)) y se recarga si otro worker
+    la cambió. El worker que escribe llama a invalidar() tras el commit.
+    """
+
+    def __init__(self, get_db, ttl=CONFIG_CACHE_TTL):
+        self.get_db = get_db
+        self.ttl = ttl
+        self._valores = None
+        self._version = None
+        self._vence = 0
+        self._lock = threading.Lock()
+
+    def _leer_version(self, db):
+        fila = db.execute('''
+            SELECT MAX(fecha_modificacion) as version, COUNT(*) as total
+            FROM configuracion
+        ''').fetchone()
+        return (fila['version'], fila['total'])
+
+    def _cargar(self, db):
+        filas = db.execute('SELECT clave, valor FROM configuracion').fetchall()
+        return {f['clave']: f['valor'] for f in filas}
+
+    def valores(self):
+        """Dict clave -> valor; sin consultas mientras no venza el TTL"""
+        if self._valores is not None and time.monotonic() < self._vence:
+            return self._valores
+        with self._lock:
+            if self._valores is not None and time.monotonic() < self._vence:
+                return self._valores
+            db = self.get_db()
+            version = self._leer_version(db)
+            if self._valores is None or version != self._version:
+                self._valores = self._cargar(db)
+                self._version = version
+            self._vence = time.monotonic() + self.ttl
+            return self._valores
+
+    def get(self, clave, default=''):
+        return self.valores().get(clave, default)
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidar(self):
+        with self._lock:
+            self._valores = None
+            self._version = None
+            self._vence = 0
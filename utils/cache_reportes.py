@@ -0,0 +1,133 @@
+"""
+Caché en disco de los reportes Excel de períodos cerrados
+
+Un reporte de un mes (o quincena) que ya terminó solo cambia si llega una
+venta o un gasto con fecha de ese mes, y eso sube su versión en
+version_periodo (utils/versiones.py). La clave incluye esa versión, así que
+un archivo guardado nunca queda desactualizado: cuando cambia la versión se
+pide otra clave y el viejo sale por LRU. Los archivos viven en
+REPORTES_CACHE_DIR (compartido por los workers del contenedor) hasta
+REPORTES_CACHE_MB; la fecha de modificación marca el último uso.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+
+from utils import versiones
+from utils.periodos import rango_periodo
+
+REPORTES_CACHE_DIR = os.environ.get('REPORTES_CACHE_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'sistema_ventas_reportes'))
+REPORTES_CACHE_MB = float(os.environ.get('REPORTES_CACHE_MB', 200))
+
+# Subir al cambiar el formato de los libros (invalida todo lo guardado)
+VERSION_FORMATO = 1
+
+_lock = threading.Lock()
+
+logger = logging.getLogger('sistema_ventas.reportes')
+
+
+def periodo_cerrado(mes, anio, quincena=None, hoy=None):
+    """True si el mes (o la quincena) ya terminó"""
+    return rango_periodo(mes, anio, quincena)[1] <= (hoy or date.today())
+
+
+def clave(tipo, usuario_id, mes, anio, quincena, moneda, version):
+    texto = repr((VERSION_FORMATO, tipo, usuario_id, anio, mes, quincena, moneda, version))
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def buscar(db, tipo, usuario_id, mes, anio, quincena, moneda):
+    """
+    (reporte guardado abierto en binario o None, clave con la que guardarlo o
+    None). Los períodos abiertos no se guardan: cambian con cada venta del día.
+    """
+    if not periodo_cerrado(mes, anio, quincena):
+        return None, None
+    version = versiones.obtener_periodo(db, usuario_id, anio, mes)
+    clave_reporte = clave(tipo, usuario_id, mes, anio, quincena, moneda, version)
+    return obtener(clave_reporte), clave_reporte
+
+
+def _ruta(clave_reporte):
+    return os.path.join(REPORTES_CACHE_DIR, f'{clave_reporte}.xlsx')
+
+
+def obtener(clave_reporte):
+    """
+    Reporte guardado ya abierto (y marcado como usado) o None. Se devuelve
+    abierto para que recortar() en otro worker no lo borre entre la búsqueda
+    y el envío: el archivo abierto sigue legible aunque se desvincule.
+    """
+    ruta = _ruta(clave_reporte)
+    try:
+        archivo = open(ruta, 'rb')
+        os.utime(archivo.fileno())
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning('No se pudo leer el reporte guardado %s: %s', ruta, e)
+        return None
+    return archivo
+
+
+def guardar(clave_reporte, origen):
+    """
+    Copia `origen` (ruta o archivo abierto) a la caché y recorta por tamaño.
+    Si el disco falla solo se registra: el reporte ya generado se envía igual.
+    """
+    temporal = None
+    try:
+        os.makedirs(REPORTES_CACHE_DIR, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(suffix='.tmp', dir=REPORTES_CACHE_DIR)
+        with os.fdopen(fd, 'wb') as destino:
+            if isinstance(origen, str):
+                with open(origen, 'rb') as f:
+                    shutil.copyfileobj(f, destino)
+            else:
+                origen.seek(0)
+                shutil.copyfileobj(origen, destino)
+        # Atómico: otro worker nunca ve un archivo a medio escribir
+        os.replace(temporal, _ruta(clave_reporte))
+        recortar()
+    except OSError as e:
+        logger.warning('No se pudo guardar el reporte en la caché: %s', e)
+        if temporal is not None:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+        return False
+    finally:
+        if not isinstance(origen, str):
+            origen.seek(0)
+    return True
+
+
+def recortar(limite_bytes=None):
+    """Borra los reportes usados hace más tiempo hasta quedar bajo el límite"""
+    limite = REPORTES_CACHE_MB * 1024 * 1024 if limite_bytes is None else limite_bytes
+    with _lock:
+        archivos = []
+        with os.scandir(REPORTES_CACHE_DIR) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.xlsx'):
+                    try:
+                        estado = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in sorted(archivos):
+            if total <= limite:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
@@ -0,0 +1,88 @@
+"""
+Compresión de las respuestas (gzip o brotli según Accept-Encoding)
+
+Se aplica en after_request a HTML, JSON, CSV y texto. Las respuestas en
+streaming se comprimen al vuelo bloque a bloque, sin juntar el cuerpo en
+memoria. No se tocan las que ya traen Content-Encoding (assets
+precomprimidos), los archivos binarios (xlsx, .gz) ni los cuerpos chicos,
+donde la cabecera gzip pesa más que lo que se ahorra.
+"""
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+NIVEL_GZIP = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+# Calidad 4-5: buena relación velocidad/tamaño para respuestas dinámicas
+CALIDAD_BROTLI = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRIMIBLES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+}
+
+
+def elegir_codificacion(aceptadas):
+    """'br', 'gzip' o None según el Accept-Encoding del request"""
+    if brotli is not None and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def _comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _comprimir_flujo(cuerpo, codificacion):
+    """Comprime un iterable de bloques (str o bytes) a medida que se consume"""
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+        comprimir, terminar = compresor.process, compresor.finish
+    else:
+        compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+        comprimir, terminar = compresor.compress, compresor.flush
+    try:
+        for bloque in cuerpo:
+            datos = comprimir(bloque.encode('utf-8') if isinstance(bloque, str) else bloque)
+            if datos:
+                yield datos
+        yield terminar()
+    finally:
+        # Si el cliente corta, cerrar el generador original (libera el cursor de servidor)
+        cerrar = getattr(cuerpo, 'close', None)
+        if cerrar is not None:
+            cerrar()
+
+
+def comprimir_respuesta(respuesta, request):
+    if (respuesta.status_code != 200 or request.method == 'HEAD' or respuesta.direct_passthrough
+            or 'Content-Encoding' in respuesta.headers or respuesta.mimetype not in COMPRIMIBLES):
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.accept_encodings)
+    if codificacion is None:
+        return respuesta
+
+    if respuesta.is_streamed:
+        respuesta.response = _comprimir_flujo(respuesta.response, codificacion)
+        respuesta.headers.pop('Content-Length', None)
+    else:
+        datos = respuesta.get_data()
+        if len(datos) < MIN_BYTES:
+            return respuesta
+        respuesta.set_data(_comprimir(datos, codificacion))
+    respuesta.headers['Content-Encoding'] = codificacion
+    # Otro cuerpo, mismo contenido: el ETag pasa a débil
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    return respuesta
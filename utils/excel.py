@@ -0,0 +1,220 @@
+"""
+Reportes Excel en modo write-only
+
+Las filas llegan de un cursor de servidor y se escriben a disco a medida que
+se leen, con objetos de estilo compartidos; la memoria no crece con el
+tamaño del reporte.
+
+openpyxl solo se importa al generar el primer libro: es la dependencia más
+pesada de la aplicación y la mayoría de los workers nunca exportan.
+"""
+import os
+import tempfile
+from functools import lru_cache
+from types import SimpleNamespace
+
+from utils.periodos import rango_mes, rango_quincena
+
+MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+         'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas que trae cada viaje del cursor de servidor
+FILAS_POR_LOTE = 2000
+
+# Consultas de los reportes (también las revisa verificar_indices.py)
+SQL_REPORTE_VENTAS = '''
+    SELECT v.fecha_venta, v.cliente_nombre, p.nombre as producto_nombre, v.cantidad,
+           v.precio_unitario, v.total_vendido, v.ganancia, v.diezmo
+    FROM ventas v
+    JOIN productos p ON v.producto_id = p.id
+    WHERE v.usuario_id = %s AND v.fecha_venta >= %s AND v.fecha_venta < %s
+    ORDER BY v.fecha_venta
+'''
+
+SQL_REPORTE_GASTOS = '''
+    SELECT fecha, categoria, descripcion, monto
+    FROM gastos
+    WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
+    ORDER BY fecha ASC
+'''
+
+
+@lru_cache(maxsize=None)
+def _openpyxl():
+    """Clases de openpyxl y estilos compartidos por todas las celdas (openpyxl los deduplica por identidad)"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.worksheet.cell_range import CellRange
+
+    return SimpleNamespace(
+        Workbook=Workbook,
+        WriteOnlyCell=WriteOnlyCell,
+        CellRange=CellRange,
+        FUENTE_TITULO=Font(size=14, bold=True, color='FFFFFF'),
+        RELLENO_TITULO=PatternFill(start_color='0a6ed1', end_color='0a6ed1', fill_type='solid'),
+        FUENTE_HEADER=Font(bold=True, size=11),
+        RELLENO_HEADER=PatternFill(start_color='D9D9D9', end_color='D9D9D9', fill_type='solid'),
+        FUENTE_TOTAL=Font(bold=True, size=12),
+        FUENTE_TOTAL_BLANCA=Font(bold=True, size=12, color='FFFFFF'),
+        RELLENO_TOTAL=PatternFill(start_color='107e3e', end_color='107e3e', fill_type='solid'),
+        CENTRADO=Alignment(horizontal='center', vertical='center'),
+        DERECHA=Alignment(horizontal='right'),
+        BORDE=Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        ),
+    )
+
+
+def _celda(ws, valor, font=None, fill=None, alignment=None, border=None):
+    cell = _openpyxl().WriteOnlyCell(ws, value=valor)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if alignment is not None:
+        cell.alignment = alignment
+    if border is not None:
+        cell.border = border
+    return cell
+
+
+def _encabezado(ws, titulo, headers, anchos):
+    """Anchos, título combinado en la fila 1 y encabezados en la fila 3"""
+    xl = _openpyxl()
+    for letra, ancho in anchos.items():
+        ws.column_dimensions[letra].width = ancho
+    ultima = chr(ord('A') + len(headers) - 1)
+    ws.merged_cells.add(xl.CellRange(f'A1:{ultima}1'))
+    ws.row_dimensions[1].height = 30
+    ws.append([_celda(ws, titulo, xl.FUENTE_TITULO, xl.RELLENO_TITULO, xl.CENTRADO)])
+    ws.append([])
+    ws.append([_celda(ws, h, xl.FUENTE_HEADER, xl.RELLENO_HEADER, xl.CENTRADO, xl.BORDE) for h in headers])
+
+
+def _filas(db, nombre, sql, params):
+    """Itera las filas de un cursor con nombre (server-side) en lotes"""
+    cur = db.cursor_servidor(nombre, FILAS_POR_LOTE)
+    try:
+        cur.execute(sql, params)
+        yield from cur
+    finally:
+        cur.close()
+
+
+def nombre_reporte_ventas(mes, anio):
+    return f'Reporte_{MESES[mes-1]}_{anio}.xlsx'
+
+
+def nombre_reporte_gastos(mes, anio, quincena):
+    nombre_quincena = '1ra Quincena' if quincena == 'primera' else '2da Quincena'
+    return f'Gastos_{nombre_quincena.replace(" ", "_")}_{MESES[mes-1]}_{anio}.xlsx'
+
+
+def escribir_reporte_ventas(db, usuario_id, mes, anio, moneda, destino, al_avanzar=None):
+    """Escribe el reporte mensual de ventas en `destino` (ruta o archivo)
+
+    `al_avanzar(filas)` se llama cada FILAS_POR_LOTE filas escritas.
+    """
+    xl = _openpyxl()
+    wb = xl.Workbook(write_only=True)
+    ws = wb.create_sheet(f"Ventas {MESES[mes-1]} {anio}")
+    headers = ['Fecha', 'Cliente', 'Producto', 'Cantidad', 'Precio Unit.', 'Total', 'Ganancia', 'Diezmo']
+    _encabezado(ws, f'REPORTE DE VENTAS - {MESES[mes-1]} {anio}', headers, {})
+
+    inicio, fin = rango_mes(mes, anio)
+    total_vendido = 0
+    total_ganancia = 0
+    total_diezmo = 0
+
+    for n, venta in enumerate(_filas(db, 'reporte_ventas', SQL_REPORTE_VENTAS, (usuario_id, inicio, fin)), 1):
+        ws.append([
+            _celda(ws, venta['fecha_venta'], border=xl.BORDE),
+            _celda(ws, venta['cliente_nombre'], border=xl.BORDE),
+            _celda(ws, venta['producto_nombre'], border=xl.BORDE),
+            _celda(ws, venta['cantidad'], border=xl.BORDE),
+            _celda(ws, f"{moneda}{venta['precio_unitario']:.2f}", border=xl.BORDE),
+            _celda(ws, f"{moneda}{venta['total_vendido']:.2f}", border=xl.BORDE),
+            _celda(ws, f"{moneda}{venta['ganancia']:.2f}", border=xl.BORDE),
+            _celda(ws, f"{moneda}{venta['diezmo']:.2f}", border=xl.BORDE),
+        ])
+        total_vendido += venta['total_vendido']
+        total_ganancia += venta['ganancia']
+        total_diezmo += venta['diezmo']
+        if al_avanzar and n % FILAS_POR_LOTE == 0:
+            al_avanzar(n)
+
+    # Totales
+    ws.append([])
+    ws.append([
+        None, None, None, None,
+        _celda(ws, 'TOTALES:', xl.FUENTE_TOTAL, alignment=xl.DERECHA),
+        _celda(ws, f"{moneda}{total_vendido:.2f}", xl.FUENTE_TOTAL, xl.RELLENO_TOTAL),
+        _celda(ws, f"{moneda}{total_ganancia:.2f}", xl.FUENTE_TOTAL),
+        _celda(ws, f"{moneda}{total_diezmo:.2f}", xl.FUENTE_TOTAL),
+    ])
+    wb.save(destino)
+
+
+def escribir_reporte_gastos(db, usuario_id, mes, anio, quincena, moneda, destino, al_avanzar=None):
+    """Escribe el reporte de gastos de una quincena en `destino` (ruta o archivo)
+
+    `al_avanzar(filas)` se llama cada FILAS_POR_LOTE filas escritas.
+    """
+    nombre_quincena = '1ra Quincena' if quincena == 'primera' else '2da Quincena'
+    xl = _openpyxl()
+    wb = xl.Workbook(write_only=True)
+    ws = wb.create_sheet(f"Gastos {nombre_quincena}")
+    _encabezado(ws, f'REPORTE DE GASTOS - {nombre_quincena} de {MESES[mes-1]} {anio}',
+                ['Fecha', 'Categoría', 'Descripción', 'Monto'],
+                {'A': 15, 'B': 20, 'C': 40, 'D': 15})
+
+    inicio, fin = rango_quincena(mes, anio, quincena)
+    total = 0
+
+    for n, gasto in enumerate(_filas(db, 'reporte_gastos', SQL_REPORTE_GASTOS, (usuario_id, inicio, fin)), 1):
+        ws.append([
+            _celda(ws, gasto['fecha'], border=xl.BORDE),
+            _celda(ws, gasto['categoria'], border=xl.BORDE),
+            _celda(ws, gasto['descripcion'] or '-', border=xl.BORDE),
+            _celda(ws, f"{moneda}{gasto['monto']:.2f}", alignment=xl.DERECHA, border=xl.BORDE),
+        ])
+        total += gasto['monto']
+        if al_avanzar and n % FILAS_POR_LOTE == 0:
+            al_avanzar(n)
+
+    # Total
+    ws.append([])
+    ws.append([
+        None, None,
+        _celda(ws, 'TOTAL:', xl.FUENTE_TOTAL, alignment=xl.DERECHA),
+        _celda(ws, f"{moneda}{total:.2f}", xl.FUENTE_TOTAL_BLANCA, xl.RELLENO_TOTAL, xl.DERECHA, xl.BORDE),
+    ])
+    wb.save(destino)
+
+
+def contar_filas_reporte(db, tipo, usuario_id, mes, anio, quincena=None):
+    """Filas que tendrá un reporte (para calcular el progreso)"""
+    if tipo == 'reporte_ventas':
+        inicio, fin = rango_mes(mes, anio)
+        sql = 'SELECT COUNT(*) as total FROM ventas WHERE usuario_id = %s AND fecha_venta >= %s AND fecha_venta < %s'
+    else:
+        inicio, fin = rango_quincena(mes, anio, quincena)
+        sql = 'SELECT COUNT(*) as total FROM gastos WHERE usuario_id = %s AND fecha >= %s AND fecha < %s'
+    return db.execute(sql, (usuario_id, inicio, fin)).fetchone()['total']
+
+
+def archivo_temporal():
+    """
+    Archivo temporal ya desvinculado del disco: se libera solo al cerrarlo,
+    así send_file puede enviarlo por partes sin dejar basura.
+    """
+    fd, ruta = tempfile.mkstemp(suffix='.xlsx')
+    archivo = os.fdopen(fd, 'w+b')
+    os.unlink(ruta)
+    return archivo
@@ -0,0 +1,112 @@
+"""
+Exportación masiva en CSV / NDJSON por streaming
+
+Las filas salen de un cursor de servidor como tuplas y se serializan por
+lotes dentro de un generador; opcionalmente se comprimen con gzip al vuelo.
+Ninguna etapa junta el resultado completo en memoria.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+# tabla -> (columna de fecha para el rango, columnas exportadas, FROM/JOIN)
+EXPORTABLES = {
+    'ventas': ('v.fecha_venta', [
+        ('id', 'v.id'), ('fecha_venta', 'v.fecha_venta'), ('producto_id', 'v.producto_id'),
+        ('producto_nombre', 'p.nombre'), ('cliente_nombre', 'v.cliente_nombre'),
+        ('cliente_telefono', 'v.cliente_telefono'), ('cantidad', 'v.cantidad'),
+        ('precio_unitario', 'v.precio_unitario'), ('total_vendido', 'v.total_vendido'),
+        ('costo_total', 'v.costo_total'), ('ganancia', 'v.ganancia'), ('diezmo', 'v.diezmo'),
+        ('tipo_venta', 'v.tipo_venta'), ('estado_pago', 'v.estado_pago'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ], 'ventas v JOIN productos p ON v.producto_id = p.id'),
+    'pagos': ('v.fecha_pago', [
+        ('id', 'v.id'), ('venta_id', 'v.venta_id'), ('monto', 'v.monto'),
+        ('fecha_pago', 'v.fecha_pago'), ('metodo_pago', 'v.metodo_pago'), ('notas', 'v.notas'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ], 'pagos v'),
+    'gastos': ('v.fecha', [
+        ('id', 'v.id'), ('fecha', 'v.fecha'), ('categoria', 'v.categoria'),
+        ('descripcion', 'v.descripcion'), ('monto', 'v.monto'),
+        ('fecha_registro', 'v.fecha_registro'),
+    ], 'gastos v'),
+}
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Filas por lote del cursor y por bloque enviado al cliente
+FILAS_POR_LOTE = 5000
+
+
+def consulta_exportacion(tabla, usuario_id, desde=None, hasta=None):
+    """SQL y parámetros para exportar `tabla` del usuario en [desde, hasta]"""
+    columna_fecha, columnas, origen = EXPORTABLES[tabla]
+    condiciones = ['v.usuario_id = %s']
+    params = [usuario_id]
+    if desde:
+        condiciones.append(f'{columna_fecha} >= %s')
+        params.append(desde)
+    if hasta:
+        condiciones.append(f'{columna_fecha} <= %s')
+        params.append(hasta)
+    sql = f'''
+        SELECT {', '.join(expr for _, expr in columnas)}
+        FROM {origen}
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY {columna_fecha}, v.id
+    '''
+    return sql, params, [nombre for nombre, _ in columnas]
+
+
+def valor_json(valor):
+    """default= de json: Decimal como texto (sin perder centavos) y fechas ISO"""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'No serializable: {type(valor).__name__}')
+
+
+def _lotes(cur):
+    while True:
+        filas = cur.fetchmany(FILAS_POR_LOTE)
+        if not filas:
+            return
+        yield filas
+
+
+def generar_csv(cur, columnas):
+    """Encabezado + un bloque de texto CSV por lote de filas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for filas in _lotes(cur):
+        escritor.writerows(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def generar_ndjson(cur, columnas):
+    """Un objeto JSON por línea, agrupados en un bloque por lote"""
+    codificar = json.JSONEncoder(ensure_ascii=False, default=valor_json, separators=(',', ':')).encode
+    for filas in _lotes(cur):
+        yield ''.join(codificar(dict(zip(columnas, fila))) + '\n' for fila in filas)
+
+
+def comprimir_gzip(bloques, nivel=6):
+    """Comprime al vuelo un iterable de str en formato gzip"""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloque in bloques:
+        datos = compresor.compress(bloque.encode('utf-8'))
+        if datos:
+            yield datos
+    yield compresor.flush()
@@ -0,0 +1,374 @@
+"""
+Importación masiva de productos y gastos desde CSV / XLSX
+
+Las filas se leen y validan de a una (openpyxl en modo read-only para XLSX),
+las válidas se envían a una tabla temporal con COPY FROM STDIN por bloques y
+una sola sentencia las pasa a la tabla real. Las inválidas se juntan en un
+reporte con el número de fila y el motivo.
+"""
+import codecs
+import csv
+import io
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+
+# Detalle de errores que se conserva para el reporte (el conteo es completo)
+MAX_ERRORES_REPORTE = 500
+
+# Filas que se serializan por cada lectura de COPY
+FILAS_POR_LOTE = 1000
+
+# Límite de DECIMAL(10,2)
+MAXIMO_MONTO = Decimal('99999999.99')
+
+
+def _texto(maximo=None):
+    def convertir(valor):
+        texto = str(valor).strip()
+        if maximo and len(texto) > maximo:
+            raise ValueError(f'máximo {maximo} caracteres')
+        return texto
+    return convertir
+
+
+def _entero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    try:
+        numero = int(str(valor).strip())
+    except ValueError:
+        raise ValueError('debe ser un número entero')
+    if numero < 0:
+        raise ValueError('no puede ser negativo')
+    return numero
+
+
+def _monto(valor):
+    if isinstance(valor, (int, float, Decimal)):
+        texto = str(valor)
+    else:
+        texto = str(valor).strip().replace(' ', '')
+        # Prefijo de moneda (RD$ o $), no cualquier R, D o $ al inicio
+        texto = texto.removeprefix('RD$').removeprefix('$')
+        # 1,234.50 -> 1234.50 ; 1234,50 -> 1234.50
+        texto = texto.replace(',', '') if '.' in texto else texto.replace(',', '.')
+    try:
+        monto = Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError('debe ser un monto')
+    # NaN e Infinity pasan el quantize pero no se pueden comparar ni guardar
+    if not monto.is_finite():
+        raise ValueError('debe ser un monto')
+    if monto < 0:
+        raise ValueError('no puede ser negativo')
+    if monto > MAXIMO_MONTO:
+        raise ValueError('monto demasiado grande')
+    return monto
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError('fecha inválida (use AAAA-MM-DD o DD/MM/AAAA)')
+
+
+# tabla -> [(columna, conversión, requerida, valor por defecto)]
+IMPORTABLES = {
+    'productos': [
+        ('nombre', _texto(200), True, None),
+        ('descripcion', _texto(), False, None),
+        ('cantidad', _entero, True, None),
+        ('costo_unitario', _monto, True, None),
+        ('precio_venta', _monto, True, None),
+        ('stock_minimo', _entero, False, 5),
+    ],
+    'gastos': [
+        ('fecha', _fecha, True, None),
+        ('categoria', _texto(100), True, None),
+        ('descripcion', _texto(), False, None),
+        ('monto', _monto, True, None),
+    ],
+}
+
+# Tabla temporal de cada importación (se descarta al terminar la transacción)
+_STAGING = {
+    'productos': '''
+        CREATE TEMP TABLE importacion_productos (
+            fila INTEGER, nombre TEXT, descripcion TEXT, cantidad INTEGER,
+            costo_unitario NUMERIC(10,2), precio_venta NUMERIC(10,2), stock_minimo INTEGER
+        ) ON COMMIT DROP
+    ''',
+    'gastos': '''
+        CREATE TEMP TABLE importacion_gastos (
+            fila INTEGER, fecha DATE, categoria TEXT, descripcion TEXT, monto NUMERIC(10,2)
+        ) ON COMMIT DROP
+    ''',
+}
+
+# Paso de la tabla temporal a la real en una sola sentencia. Los productos se
+# identifican por nombre (sin distinguir mayúsculas): los existentes se
+# actualizan con los valores del archivo y el resto se inserta; si el nombre
+# se repite en el archivo gana la última fila. El estado se calcula en SQL.
+_ESTADO_PRODUCTO = '''
+    CASE WHEN s.cantidad = 0 THEN 'agotado'
+         WHEN s.cantidad <= s.stock_minimo THEN 'bajo'
+         ELSE 'disponible'
+    END
+'''
+
+_MERGE = {
+    'productos': f'''
+        WITH s AS (
+            SELECT DISTINCT ON (lower(nombre)) *
+            FROM importacion_productos
+            ORDER BY lower(nombre), fila DESC
+        ), actualizados AS (
+            UPDATE productos p
+            SET descripcion = COALESCE(s.descripcion, p.descripcion),
+                cantidad = s.cantidad,
+                costo_unitario = s.costo_unitario,
+                precio_venta = s.precio_venta,
+                stock_minimo = s.stock_minimo,
+                estado = {_ESTADO_PRODUCTO}
+            FROM s
+            WHERE p.usuario_id = %(usuario_id)s AND lower(p.nombre) = lower(s.nombre)
+            RETURNING lower(p.nombre) as clave
+        ), insertados AS (
+            INSERT INTO productos (nombre, descripcion, cantidad, costo_unitario, precio_venta,
+                                   stock_minimo, estado, usuario_id)
+            SELECT s.nombre, s.descripcion, s.cantidad, s.costo_unitario, s.precio_venta,
+                   s.stock_minimo, {_ESTADO_PRODUCTO}, %(usuario_id)s
+            FROM s
+            WHERE lower(s.nombre) NOT IN (SELECT clave FROM actualizados)
+            ORDER BY s.fila
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM insertados) as insertados,
+               (SELECT COUNT(DISTINCT clave) FROM actualizados) as actualizados
+    ''',
+    'gastos': '''
+        WITH insertados AS (
+            INSERT INTO gastos (fecha, categoria, descripcion, monto, usuario_id)
+            SELECT fecha, categoria, descripcion, monto, %(usuario_id)s
+            FROM importacion_gastos
+            ORDER BY fila
+            RETURNING 1
+        )
+        SELECT COUNT(*) as insertados, 0 as actualizados FROM insertados
+    ''',
+}
+
+# SQLite no tiene DISTINCT ON ni admite UPDATE/INSERT dentro de WITH: el mismo
+# paso en sentencias separadas, [(total que cuenta, sql)]
+_ULTIMA_POR_NOMBRE = '''
+    (SELECT * FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY lower(nombre) ORDER BY fila DESC) AS orden
+        FROM importacion_productos
+    ) WHERE orden = 1) AS s
+'''
+
+_MERGE_SQLITE = {
+    'productos': [
+        ('actualizados', f'''
+            UPDATE productos AS p
+            SET descripcion = COALESCE(s.descripcion, p.descripcion),
+                cantidad = s.cantidad,
+                costo_unitario = s.costo_unitario,
+                precio_venta = s.precio_venta,
+                stock_minimo = s.stock_minimo,
+                estado = {_ESTADO_PRODUCTO}
+            FROM {_ULTIMA_POR_NOMBRE}
+            WHERE p.usuario_id = %(usuario_id)s AND lower(p.nombre) = lower(s.nombre)
+        '''),
+        ('insertados', f'''
+            INSERT INTO productos (nombre, descripcion, cantidad, costo_unitario, precio_venta,
+                                   stock_minimo, estado, usuario_id)
+            SELECT s.nombre, s.descripcion, s.cantidad, s.costo_unitario, s.precio_venta,
+                   s.stock_minimo, {_ESTADO_PRODUCTO}, %(usuario_id)s
+            FROM {_ULTIMA_POR_NOMBRE}
+            WHERE NOT EXISTS (SELECT 1 FROM productos p
+                              WHERE p.usuario_id = %(usuario_id)s AND lower(p.nombre) = lower(s.nombre))
+            ORDER BY s.fila
+        '''),
+    ],
+    'gastos': [
+        ('insertados', '''
+            INSERT INTO gastos (fecha, categoria, descripcion, monto, usuario_id)
+            SELECT fecha, categoria, descripcion, monto, %(usuario_id)s
+            FROM importacion_gastos
+            ORDER BY fila
+        '''),
+    ],
+}
+
+
+class ArchivoInvalido(ValueError):
+    """El archivo no se puede leer o no trae las columnas requeridas"""
+
+
+def _normalizar(encabezado):
+    """'Costo Unitario' / 'costo_unitario' / 'Categoría' -> 'costo_unitario' / 'categoria'"""
+    texto = unicodedata.normalize('NFKD', str(encabezado or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(texto.lower().split())
+
+
+# Nombres alternativos aceptados en la fila de encabezados
+_ALIAS = {
+    'producto': 'nombre', 'costo': 'costo_unitario', 'precio': 'precio_venta',
+    'stock': 'cantidad', 'minimo': 'stock_minimo',
+}
+
+
+def _filas_csv(archivo):
+    # Excel en Windows guarda CSV en cp1252; se decide con una muestra del inicio
+    muestra = archivo.read(65536)
+    archivo.seek(0)
+    try:
+        muestra.decode('utf-8-sig')
+        codificacion = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final de la muestra no cuenta
+        codificacion = 'utf-8-sig' if e.start >= len(muestra) - 3 else 'cp1252'
+    texto = codecs.getreader(codificacion)(archivo)
+    primera = texto.readline()
+    delimitador = ';' if primera.count(';') > primera.count(',') else ','
+    return csv.reader(chain([primera], texto), delimiter=delimitador)
+
+
+def _filas_xlsx(archivo):
+    # Import diferido: openpyxl es pesado y solo se usa al importar un .xlsx
+    from openpyxl import load_workbook
+
+    wb = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Filas crudas (tuplas) del archivo, con el encabezado primero"""
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    if extension == 'csv':
+        return _filas_csv(archivo)
+    if extension == 'xlsx':
+        return _filas_xlsx(archivo)
+    raise ArchivoInvalido('Formato no soportado: use .csv o .xlsx')
+
+
+def validar_filas(tabla, filas, errores):
+    """
+    Genera las filas válidas como tuplas (fila, columnas...) listas para COPY.
+    Las inválidas se agregan a `errores` como (fila, mensaje).
+    """
+    columnas = IMPORTABLES[tabla]
+    try:
+        encabezado = next(filas)
+    except StopIteration:
+        raise ArchivoInvalido('El archivo está vacío')
+    except Exception as e:
+        raise ArchivoInvalido(f'No se pudo leer el archivo: {e}')
+
+    posiciones = {}
+    for i, nombre in enumerate(encabezado):
+        clave = _normalizar(nombre)
+        posiciones.setdefault(_ALIAS.get(clave, clave), i)
+    faltantes = [col for col, _, requerida, _ in columnas if requerida and col not in posiciones]
+    if faltantes:
+        raise ArchivoInvalido(f'Faltan columnas: {", ".join(faltantes)}')
+
+    for numero, fila in enumerate(filas, 2):
+        if not any(v not in (None, '') for v in fila):
+            continue
+        valores = [numero]
+        problemas = []
+        for columna, convertir, requerida, defecto in columnas:
+            i = posiciones.get(columna)
+            crudo = fila[i] if i is not None and i < len(fila) else None
+            if crudo is None or str(crudo).strip() == '':
+                if requerida:
+                    problemas.append(f'{columna}: requerido')
+                valores.append(defecto)
+                continue
+            try:
+                valores.append(convertir(crudo))
+            except ValueError as e:
+                problemas.append(f'{columna}: {e}')
+                valores.append(None)
+        if problemas:
+            errores.append((numero, '; '.join(problemas)))
+        else:
+            yield valores
+
+
+class FlujoCopy:
+    """Objeto tipo archivo que COPY lee por bloques, serializando filas a CSV a demanda"""
+
+    def __init__(self, filas):
+        self._filas = iter(filas)
+        self._buffer = io.StringIO()
+        self._escritor = csv.writer(self._buffer, lineterminator='\n')
+        self._pendiente = ''
+        self.total = 0
+
+    def read(self, tamano=-1):
+        while tamano < 0 or len(self._pendiente) < tamano:
+            lote = list(islice(self._filas, FILAS_POR_LOTE))
+            if not lote:
+                break
+            self.total += len(lote)
+            self._escritor.writerows(lote)
+            self._pendiente += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if tamano < 0:
+            datos, self._pendiente = self._pendiente, ''
+        else:
+            datos, self._pendiente = self._pendiente[:tamano], self._pendiente[tamano:]
+        return datos
+
+
+def importar(db, tabla, usuario_id, archivo, nombre_archivo, todo_o_nada=True):
+    """
+    Importa el archivo en `tabla` del usuario. Con todo_o_nada, si alguna fila
+    es inválida no se aplica ninguna. El llamador hace commit si `aplicado`.
+    """
+    errores = []
+    columnas = ['fila'] + [col for col, _, _, _ in IMPORTABLES[tabla]]
+    flujo = FlujoCopy(validar_filas(tabla, iter(leer_filas(archivo, nombre_archivo)), errores))
+
+    if db.motor == 'sqlite':
+        # Sin ON COMMIT DROP: la tabla de una importación anterior sigue en la conexión del hilo
+        db.execute(f'DROP TABLE IF EXISTS temp.importacion_{tabla}')
+    db.execute(_STAGING[tabla])
+    db.copy_desde(f"COPY importacion_{tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", flujo)
+
+    resultado = {
+        'validas': flujo.total,
+        'total_errores': len(errores),
+        'errores': errores[:MAX_ERRORES_REPORTE],
+        'insertados': 0,
+        'actualizados': 0,
+        'aplicado': False,
+    }
+    if (errores and todo_o_nada) or not flujo.total:
+        return resultado
+
+    if db.motor == 'sqlite':
+        totales = {'insertados': 0, 'actualizados': 0}
+        for total, sql in _MERGE_SQLITE[tabla]:
+            totales[total] = db.execute(sql, {'usuario_id': usuario_id}).rowcount
+    else:
+        totales = db.execute(_MERGE[tabla], {'usuario_id': usuario_id}).fetchone()
+    resultado.update(insertados=totales['insertados'], actualizados=totales['actualizados'], aplicado=True)
+    return resultado
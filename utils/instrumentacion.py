@@ -0,0 +1,111 @@
+"""
+Medición de las consultas SQL por request
+
+Las conexiones (database.ConexionDB y db_adapter.ConexionSQLite) pasan cada
+sentencia por medir(): se cuentan, se suma su duración y las que superan
+SLOW_QUERY_MS se registran con el SQL normalizado y la forma de los
+parámetros (tipos, no valores: pueden traer datos de clientes). Los totales
+del request se publican en la cabecera Server-Timing (en las respuestas en
+streaming solo cuenta lo hecho antes de enviar las cabeceras).
+"""
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import has_request_context, request
+
+from utils import metricas
+
+logger = logging.getLogger('sistema_ventas.sql')
+
+# Umbral de consulta lenta en ms (0 = registrar todas, negativo = ninguna)
+UMBRAL_LENTA_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+
+# Largo máximo del SQL en el log
+MAX_SQL_LOG = 1000
+
+_ESPACIOS = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=512)
+def normalizar_sql(sql):
+    """SQL en una línea, recortado para el log"""
+    texto = _ESPACIOS.sub(' ', sql).strip()
+    return texto if len(texto) <= MAX_SQL_LOG else texto[:MAX_SQL_LOG] + '…'
+
+
+def forma_parametros(params):
+    """(int, str, Decimal) / {usuario_id: int} / list[120]: la forma sin los valores"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{clave}: {type(valor).__name__}' for clave, valor in params.items()) + '}'
+    if isinstance(params, (list, tuple)) and len(params) > 20:
+        return f'{type(params).__name__}[{len(params)}]'
+    tipos = []
+    for valor in params:
+        if isinstance(valor, (list, tuple)):
+            tipos.append(f'{type(valor).__name__}[{len(valor)}]')
+        else:
+            tipos.append(type(valor).__name__)
+    return '(' + ', '.join(tipos) + ')'
+
+
+@contextmanager
+def medir(db, sql, params=None, sentencias=1):
+    """Cuenta y cronometra una sentencia (o un lote de `sentencias`) en `db`"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        db.consultas += sentencias
+        db.tiempo_sql += duracion
+        metricas.observar('sistema_ventas_consulta_segundos', duracion)
+        if UMBRAL_LENTA_MS >= 0 and duracion * 1000 >= UMBRAL_LENTA_MS:
+            ruta = f'{request.method} {request.path}' if has_request_context() else '-'
+            logger.warning('%s lenta %.1f ms [%s] %s params=%s', 'Consulta' if sentencias else 'Lectura',
+                           duracion * 1000, ruta, normalizar_sql(sql), forma_parametros(params))
+
+
+class CursorMedido:
+    """Cursor de servidor que mide execute() y cada lote que trae; el resto se delega"""
+
+    def __init__(self, db, cur):
+        self._db = db
+        self._cur = cur
+        self._sql = ''
+        self._params = None
+
+    def execute(self, sql, params=None):
+        self._sql, self._params = sql, params
+        with medir(self._db, sql, params):
+            return self._cur.execute(sql, params)
+
+    def fetchmany(self, *args):
+        # Los lotes suman tiempo pero no cuentan como sentencias nuevas
+        with medir(self._db, self._sql, self._params, sentencias=0):
+            return self._cur.fetchmany(*args)
+
+    def __iter__(self):
+        # Recorre de a `itersize` filas, como el cursor con nombre, midiendo cada lote
+        while True:
+            filas = self.fetchmany(self._cur.itersize)
+            if not filas:
+                return
+            yield from filas
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+
+def server_timing(db, total):
+    """Valor de la cabecera Server-Timing: tiempo en la BD, cantidad de consultas y total"""
+    metricas = []
+    if db is not None:
+        metricas.append(f'db;dur={db.tiempo_sql * 1000:.1f};desc="{db.consultas} consultas"')
+    metricas.append(f'app;dur={total * 1000:.1f}')
+    return ', '.join(metricas)
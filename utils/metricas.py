@@ -0,0 +1,264 @@
+"""
+Métricas en formato de texto de Prometheus (/metrics)
+
+Cada worker de gunicorn acumula contadores e histogramas en memoria y los
+vuelca cada METRICS_FLUSH segundos a METRICS_DIR/worker-<pid>.json; /metrics
+suma los archivos de todos los workers (el propio, en vivo). Cuando un worker
+termina, el master pasa sus contadores a terminados.json para que los totales
+no retrocedan. Los valores instantáneos (pool, memoria) se publican por pid y
+solo de los workers vivos.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'sistema_ventas_metrics'))
+METRICS_FLUSH = float(os.environ.get('METRICS_FLUSH', 5))
+
+TERMINADOS = 'terminados.json'
+
+CONTADORES = {
+    'sistema_ventas_requests_total': 'Requests atendidos por ruta, método y estado',
+    'sistema_ventas_pool_agotado_total': 'Requests que no consiguieron conexión del pool a tiempo',
+}
+
+# nombre -> (ayuda, límites superiores de los buckets en segundos)
+HISTOGRAMAS = {
+    'sistema_ventas_request_segundos': (
+        'Duración de los requests por ruta (incluye el envío del cuerpo)',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'sistema_ventas_consulta_segundos': (
+        'Duración de las sentencias SQL',
+        (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    'sistema_ventas_trabajo_segundos': (
+        'Duración de los trabajos de exportación por tipo y resultado',
+        (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)),
+}
+
+GAUGES = {
+    'sistema_ventas_pool_conexiones': 'Conexiones del pool por estado (en_uso, libres, esperando)',
+    'sistema_ventas_worker_memoria_bytes': 'Memoria residente del worker',
+}
+
+
+class Registro:
+    """Contadores e histogramas del proceso (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}    # (nombre, etiquetas) -> valor
+        self.histogramas = {}   # (nombre, etiquetas) -> [cuentas por bucket..., +Inf, suma]
+        self.pid = os.getpid()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        limites = HISTOGRAMAS[nombre][1]
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        indice = bisect_left(limites, valor)
+        with self._lock:
+            cuentas = self.histogramas.get(clave)
+            if cuentas is None:
+                cuentas = self.histogramas[clave] = [0] * (len(limites) + 1) + [0.0]
+            cuentas[indice] += 1
+            cuentas[-1] += valor
+
+    def instantanea(self):
+        """Estado serializable a JSON, con los valores instantáneos del momento"""
+        with self._lock:
+            contadores = [[n, list(map(list, e)), v] for (n, e), v in self.contadores.items()]
+            histogramas = [[n, list(map(list, e)), list(c)] for (n, e), c in self.histogramas.items()]
+        gauges = []
+        for medidor in _medidores:
+            for nombre, etiquetas, valor in medidor():
+                gauges.append([nombre, [list(par) for par in sorted(etiquetas.items())], valor])
+        return {'pid': self.pid, 'contadores': contadores, 'histogramas': histogramas, 'gauges': gauges}
+
+
+_registro = Registro()
+_registro_lock = threading.Lock()
+_ultimo_volcado = 0.0
+_medidores = []
+
+
+def registro():
+    """Registro del proceso actual (uno nuevo tras un fork)"""
+    global _registro
+    if _registro.pid != os.getpid():
+        with _registro_lock:
+            if _registro.pid != os.getpid():
+                _registro = Registro()
+    return _registro
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    registro().incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, valor, **etiquetas):
+    registro().observar(nombre, valor, **etiquetas)
+
+
+def registrar_medidor(funcion):
+    """`funcion()` retorna [(nombre, {etiquetas}, valor)] de gauges; se llama al volcar"""
+    _medidores.append(funcion)
+    return funcion
+
+
+@registrar_medidor
+def _memoria():
+    try:
+        with open('/proc/self/statm') as f:
+            residente = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        residente = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return [('sistema_ventas_worker_memoria_bytes', {'pid': str(os.getpid())}, residente)]
+
+
+def _escribir(nombre, datos):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    ruta = os.path.join(METRICS_DIR, nombre)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def volcar(forzar=False):
+    """Escribe el archivo del worker (como mucho cada METRICS_FLUSH segundos)"""
+    global _ultimo_volcado
+    ahora = time.monotonic()
+    if not forzar and ahora - _ultimo_volcado < METRICS_FLUSH:
+        return
+    _ultimo_volcado = ahora
+    try:
+        _escribir(f'worker-{os.getpid()}.json', registro().instantanea())
+    except OSError:
+        pass
+
+
+def worker_terminado(pid):
+    """En el master: suma los contadores del worker muerto a terminados.json"""
+    ruta = os.path.join(METRICS_DIR, f'worker-{pid}.json')
+    datos = _leer(ruta)
+    if datos is None:
+        return
+    acumulado = _leer(os.path.join(METRICS_DIR, TERMINADOS)) or {'contadores': [], 'histogramas': []}
+    contadores, histogramas = _sumar([acumulado, datos])
+    _escribir(TERMINADOS, {
+        'contadores': [[n, list(map(list, e)), v] for (n, e), v in contadores.items()],
+        'histogramas': [[n, list(map(list, e)), c] for (n, e), c in histogramas.items()],
+    })
+    os.remove(ruta)
+
+
+def limpiar():
+    """Borra las métricas de una ejecución anterior (al arrancar el master)"""
+    try:
+        nombres = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        try:
+            os.remove(os.path.join(METRICS_DIR, nombre))
+        except OSError:
+            pass
+
+
+def _sumar(instantaneas):
+    contadores, histogramas = {}, {}
+    for datos in instantaneas:
+        for nombre, etiquetas, valor in datos['contadores']:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, etiquetas, cuentas in datos['histogramas']:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            if clave in histogramas:
+                histogramas[clave] = [a + b for a, b in zip(histogramas[clave], cuentas)]
+            else:
+                histogramas[clave] = list(cuentas)
+    return contadores, histogramas
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _etiquetas(pares, extra=None):
+    pares = list(pares) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    valores = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pares)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pares, valores)) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar():
+    """Texto de /metrics con los datos de todos los workers del contenedor"""
+    propio = registro().instantanea()
+    instantaneas = [propio]
+    terminados = _leer(os.path.join(METRICS_DIR, TERMINADOS))
+    if terminados:
+        instantaneas.append(terminados)
+    try:
+        nombres = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        nombres = []
+    for nombre in nombres:
+        if not (nombre.startswith('worker-') and nombre.endswith('.json')):
+            continue
+        datos = _leer(os.path.join(METRICS_DIR, nombre))
+        if datos and datos['pid'] != propio['pid']:
+            instantaneas.append(datos)
+
+    contadores, histogramas = _sumar(instantaneas)
+    gauges = [(n, tuple(map(tuple, e)), v) for datos in instantaneas if 'pid' in datos
+              and (datos is propio or _vivo(datos['pid'])) for n, e, v in datos['gauges']]
+
+    lineas = []
+    for nombre, ayuda in CONTADORES.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        for (n, etiquetas), valor in sorted(contadores.items()):
+            if n == nombre:
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+    for nombre, (ayuda, limites) in HISTOGRAMAS.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+        for (n, etiquetas), cuentas in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(list(limites) + ['+Inf'], cuentas):
+                acumulado += cuenta
+                lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, ("le", limite))} {acumulado}')
+            lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(cuentas[-1])}')
+            lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {acumulado}')
+    for nombre, ayuda in GAUGES.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} gauge']
+        for n, etiquetas, valor in sorted(gauges):
+            if n == nombre:
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,180 @@
+"""
+Migraciones versionadas del esquema
+
+Cada archivo de migraciones/ se llama NNNN_nombre.sql o NNNN_nombre.py y se
+aplica una sola vez, en orden; la tabla schema_version guarda las aplicadas.
+Se corren al desplegar (`flask migrar`), nunca al arrancar un worker. Un
+advisory lock evita que dos despliegues simultáneos las apliquen a la vez.
+
+- .sql: sentencias separadas por ';' al final de línea. Si la primera línea
+  es '-- sin transaccion' se ejecutan en autocommit (CREATE INDEX
+  CONCURRENTLY no puede correr dentro de una transacción).
+- .py: define aplicar(db); con TRANSACCION = False corre en autocommit.
+
+Con el motor SQLite (db_adapter.py) el SQL se traduce solo; si una migración
+no se puede traducir, NNNN_nombre.sqlite.sql/.py la reemplaza en ese motor.
+En SQLite todas corren en transacción y no hace falta el advisory lock.
+"""
+import importlib.util
+import os
+import re
+import time
+from collections import namedtuple
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migraciones')
+
+# Clave del advisory lock de las migraciones (cualquier bigint fijo)
+LOCK_MIGRACIONES = 5_170_001
+
+SIN_TRANSACCION = '-- sin transaccion'
+
+Migracion = namedtuple('Migracion', 'version nombre ruta')
+
+_ARCHIVO = re.compile(r'^(\d{4})_(\w+)\.(?:(sqlite)\.)?(sql|py)$')
+_INDICE_CONCURRENTE = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.I)
+
+
+def listar(directorio=DIRECTORIO, motor='postgresql'):
+    """Migraciones disponibles para el motor, ordenadas por versión"""
+    generales, variantes = [], {}
+    for archivo in sorted(os.listdir(directorio)):
+        encontrado = _ARCHIVO.match(archivo)
+        if not encontrado:
+            continue
+        migracion = Migracion(int(encontrado.group(1)), archivo, os.path.join(directorio, archivo))
+        if encontrado.group(3):
+            variantes[migracion.version] = migracion
+        else:
+            generales.append(migracion)
+    versiones = [m.version for m in generales]
+    if len(versiones) != len(set(versiones)):
+        raise RuntimeError('Hay dos migraciones con la misma versión')
+    if motor == 'sqlite':
+        return [variantes.get(m.version, m) for m in generales]
+    return generales
+
+
+def _sentencias(texto):
+    """Divide un archivo .sql en sentencias (';' al final de línea)"""
+    sentencias, actual = [], []
+    for linea in texto.splitlines():
+        if not actual and (not linea.strip() or linea.strip().startswith('--')):
+            continue
+        actual.append(linea)
+        if linea.rstrip().endswith(';'):
+            sentencias.append('\n'.join(actual).strip().rstrip(';'))
+            actual = []
+    if '\n'.join(actual).strip():
+        sentencias.append('\n'.join(actual).strip())
+    return sentencias
+
+
+def crear_indice_concurrente(db, sql):
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS que se puede reintentar: si un
+    intento anterior falló quedó un índice inválido que IF NOT EXISTS daría
+    por bueno, así que se borra antes.
+    """
+    encontrado = _INDICE_CONCURRENTE.search(sql)
+    if encontrado and db.motor == 'postgresql':
+        invalido = db.execute('''
+            SELECT 1 FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        ''', (encontrado.group(1),)).fetchone()
+        if invalido:
+            db.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {encontrado.group(1)}')
+    db.execute(sql)
+
+
+def _cargar_modulo(migracion):
+    spec = importlib.util.spec_from_file_location(f'migracion_{migracion.version:04d}', migracion.ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def _preparar(migracion):
+    """(usa transacción, función que aplica la migración sobre db)"""
+    if migracion.ruta.endswith('.py'):
+        modulo = _cargar_modulo(migracion)
+        return getattr(modulo, 'TRANSACCION', True), modulo.aplicar
+
+    with open(migracion.ruta, encoding='utf-8') as f:
+        texto = f.read()
+    transaccion = not texto.lstrip().lower().startswith(SIN_TRANSACCION)
+
+    def aplicar(db):
+        for sentencia in _sentencias(texto):
+            crear_indice_concurrente(db, sentencia)
+    return transaccion, aplicar
+
+
+def _crear_tabla_version(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            nombre VARCHAR(200) NOT NULL,
+            aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duracion_ms INTEGER
+        )
+    ''')
+
+
+def aplicadas(db):
+    """Versiones ya aplicadas (vacío si la tabla todavía no existe)"""
+    if db.motor == 'sqlite':
+        existe = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'").fetchone()
+    else:
+        existe = db.execute("SELECT to_regclass('schema_version') IS NOT NULL AS existe").fetchone()['existe']
+    if not existe:
+        return set()
+    return {fila['version'] for fila in db.execute('SELECT version FROM schema_version').fetchall()}
+
+
+def pendientes(db, directorio=DIRECTORIO):
+    hechas = aplicadas(db)
+    return [m for m in listar(directorio, db.motor) if m.version not in hechas]
+
+
+def migrar(db, hasta=None, directorio=DIRECTORIO, log=print):
+    """Aplica las migraciones pendientes (hasta la versión `hasta`) y retorna cuántas"""
+    conn = db.conn
+    postgres = db.motor == 'postgresql'
+    db.commit()
+    if postgres:
+        # Lock de sesión: se mantiene entre transacciones y en autocommit
+        db.execute('SELECT pg_advisory_lock(%s)', (LOCK_MIGRACIONES,))
+        db.commit()
+    try:
+        _crear_tabla_version(db)
+        db.commit()
+        # Recalcular después del lock: otro proceso pudo haberlas aplicado
+        lista = [m for m in pendientes(db, directorio) if hasta is None or m.version <= hasta]
+        db.commit()
+        for migracion in lista:
+            transaccion, aplicar = _preparar(migracion)
+            log(f"📝 Aplicando migración {migracion.nombre}")
+            inicio = time.monotonic()
+            try:
+                if transaccion or not postgres:
+                    aplicar(db)
+                else:
+                    conn.autocommit = True
+                    try:
+                        aplicar(db)
+                    finally:
+                        conn.autocommit = False
+            except Exception:
+                db.rollback()
+                raise
+            db.execute('INSERT INTO schema_version (version, nombre, duracion_ms) VALUES (%s, %s, %s)',
+                       (migracion.version, migracion.nombre, int((time.monotonic() - inicio) * 1000)))
+            db.commit()
+            log(f"✓ {migracion.nombre} ({time.monotonic() - inicio:.1f}s)")
+        return len(lista)
+    finally:
+        db.rollback()
+        if postgres:
+            db.execute('SELECT pg_advisory_unlock(%s)', (LOCK_MIGRACIONES,))
+            db.commit()
@@ -0,0 +1,91 @@
+"""
+Paginación por cursor (keyset)
+
+El cursor es la clave de orden de la última fila de la página codificada en
+base64; la página siguiente se pide con (clave) < (cursor), de modo que el
+costo depende del tamaño de página y no de cuántas filas hay antes.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+
+# Tipos que puede traer un cursor ya decodificado (ver _serializar)
+_TIPOS_CURSOR = (str, int, float, Decimal, date, type(None))
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {'n': str(valor)}
+    return valor
+
+
+def _deserializar(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+        if 'n' in valor:
+            return Decimal(valor['n'])
+    return valor
+
+
+def codificar_cursor(valores):
+    """Tupla de valores de la clave de orden -> texto apto para URL"""
+    texto = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, largo=None):
+    """
+    Inverso de codificar_cursor(); None si no hay cursor. Con `largo`, exige
+    esa cantidad de valores (un cursor de otra página no llega a la consulta).
+    """
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+        if not isinstance(valores, list):
+            raise CursorInvalido('El cursor no es una lista')
+        valores = tuple(_deserializar(v) for v in valores)
+    except (ValueError, TypeError) as e:
+        raise CursorInvalido(str(e))
+    # Solo escalares: una lista o un dict llegaría a la base como parámetro
+    if any(isinstance(v, bool) or not isinstance(v, _TIPOS_CURSOR) for v in valores):
+        raise CursorInvalido('Valor no admitido en el cursor')
+    if largo is not None and len(valores) != largo:
+        raise CursorInvalido(f'Se esperaban {largo} valores en el cursor')
+    return valores
+
+
+def tamano_pagina(valor, defecto=POR_PAGINA):
+    """Lee por_pagina de la query string acotándolo a [1, MAX_POR_PAGINA]"""
+    try:
+        return max(1, min(int(valor), MAX_POR_PAGINA))
+    except (TypeError, ValueError):
+        return defecto
+
+
+def cortar_pagina(filas, por_pagina, clave):
+    """
+    Recibe hasta por_pagina + 1 filas y retorna (filas de la página, cursor
+    siguiente o None). `clave` extrae de una fila los valores del orden.
+    """
+    if len(filas) <= por_pagina:
+        return filas, None
+    filas = filas[:por_pagina]
+    return filas, codificar_cursor(clave(filas[-1]))
@@ -0,0 +1,78 @@
+"""
+Filtros de período como rangos semiabiertos [inicio, fin)
+
+Comparar la columna de fecha directamente contra un rango permite usar los
+índices (usuario_id, fecha); TO_CHAR(fecha, 'MM') obliga a recorrer todo el
+historial del usuario.
+"""
+from datetime import date, timedelta
+
+
+def primer_dia_mes_siguiente(mes, anio):
+    return date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+
+
+def rango_mes(mes, anio):
+    """(primer día del mes, primer día del mes siguiente)"""
+    return date(anio, mes, 1), primer_dia_mes_siguiente(mes, anio)
+
+
+def rango_quincena(mes, anio, quincena):
+    """'primera' = días 1-15, cualquier otro valor = del 16 a fin de mes"""
+    if quincena == 'primera':
+        return date(anio, mes, 1), date(anio, mes, 16)
+    return date(anio, mes, 16), primer_dia_mes_siguiente(mes, anio)
+
+
+def rango_periodo(mes, anio, quincena=None):
+    """Rango del mes completo o de una de sus quincenas"""
+    if quincena:
+        return rango_quincena(mes, anio, quincena)
+    return rango_mes(mes, anio)
+
+
+# Granularidades de series temporales: nombre de la API -> unidad de date_trunc
+GRANULARIDADES = {
+    'dia': 'day', 'day': 'day',
+    'semana': 'week', 'week': 'week',
+    'mes': 'month', 'month': 'month',
+}
+
+
+def truncar(fecha, unidad):
+    """Inicio del día/semana (lunes)/mes que contiene la fecha, como date_trunc"""
+    if unidad == 'month':
+        return date(fecha.year, fecha.month, 1)
+    if unidad == 'week':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha
+
+
+def truncar_sql(motor, unidad, columna):
+    """Expresión SQL equivalente a truncar() sobre una columna DATE, según el motor"""
+    if motor == 'sqlite':
+        if unidad == 'month':
+            return f"date({columna}, 'start of month')"
+        if unidad == 'week':
+            # strftime('%w'): 0 = domingo; se retrocede hasta el lunes
+            return f"date({columna}, '-' || ((CAST(strftime('%w', {columna}) AS INTEGER) + 6) % 7) || ' days')"
+        return f"date({columna})"
+    return f"date_trunc('{unidad}', {columna})::date"
+
+
+def desplazar(fecha, unidad, n):
+    """Suma n unidades a una fecha ya truncada"""
+    if unidad == 'month':
+        meses = fecha.year * 12 + fecha.month - 1 + n
+        return date(meses // 12, meses % 12 + 1, 1)
+    if unidad == 'week':
+        return fecha + timedelta(weeks=n)
+    return fecha + timedelta(days=n)
+
+
+def contar_periodos(inicio, fin, unidad):
+    """Número de cubetas entre dos fechas truncadas, con fin excluido"""
+    if unidad == 'month':
+        return (fin.year - inicio.year) * 12 + fin.month - inicio.month
+    dias = (fin - inicio).days
+    return dias // 7 if unidad == 'week' else dias
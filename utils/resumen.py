@@ -0,0 +1,90 @@
+"""
+Resumen mensual por usuario (tabla resumen_mensual)
+
+Se actualiza en la misma transacción que las ventas y los pagos, para que
+el encabezado del dashboard sea una lectura por clave primaria.
+"""
+
+
+def anio_mes(fecha):
+    """Acepta 'YYYY-MM-DD' (formulario) o date (fila de la BD)"""
+    if isinstance(fecha, str):
+        anio, mes = fecha.split('-')[:2]
+        return int(anio), int(mes)
+    return fecha.year, fecha.month
+
+
+def sumar_venta(db, usuario_id, fecha_venta, total_vendido, costo_total, ganancia, diezmo, credito,
+                num_ventas=1):
+    """Acumula ventas del mismo mes en el resumen (crédito suma a lo pendiente)"""
+    anio, mes = anio_mes(fecha_venta)
+    db.execute('''
+        INSERT INTO resumen_mensual (usuario_id, anio, mes, total_vendido, costo_total, ganancia,
+                                     diezmo, num_ventas, credito_pendiente)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (usuario_id, anio, mes) DO UPDATE SET
+            total_vendido = resumen_mensual.total_vendido + EXCLUDED.total_vendido,
+            costo_total = resumen_mensual.costo_total + EXCLUDED.costo_total,
+            ganancia = resumen_mensual.ganancia + EXCLUDED.ganancia,
+            diezmo = resumen_mensual.diezmo + EXCLUDED.diezmo,
+            num_ventas = resumen_mensual.num_ventas + EXCLUDED.num_ventas,
+            credito_pendiente = resumen_mensual.credito_pendiente + EXCLUDED.credito_pendiente
+    ''', (usuario_id, anio, mes, total_vendido, costo_total, ganancia, diezmo, num_ventas,
+          total_vendido if credito else 0))
+
+
+def restar_pendiente(db, usuario_id, fecha_venta, monto):
+    """Descuenta un pago del crédito pendiente del mes en que se hizo la venta"""
+    anio, mes = anio_mes(fecha_venta)
+    db.execute('''
+        UPDATE resumen_mensual
+        SET credito_pendiente = credito_pendiente - %s
+        WHERE usuario_id = %s AND anio = %s AND mes = %s
+    ''', (monto, usuario_id, anio, mes))
+
+
+def obtener_resumen(db, usuario_id, anio, mes):
+    """Totales del mes y crédito pendiente acumulado en una sola consulta"""
+    return db.execute('''
+        SELECT COALESCE(r.total_vendido, 0) as total_vendido,
+               COALESCE(r.ganancia, 0) as ganancia,
+               COALESCE(r.diezmo, 0) as diezmo,
+               COALESCE(r.costo_total, 0) as costo_total,
+               COALESCE(r.num_ventas, 0) as num_ventas,
+               (SELECT COALESCE(SUM(credito_pendiente), 0)
+                FROM resumen_mensual
+                WHERE usuario_id = %s) as total_pendiente
+        FROM (SELECT 1) AS uno
+        LEFT JOIN resumen_mensual r
+            ON r.usuario_id = %s AND r.anio = %s AND r.mes = %s
+    ''', (usuario_id, usuario_id, anio, mes)).fetchone()
+
+
+def reconstruir_resumen(db, usuario_id=None):
+    """Recalcula el resumen desde ventas y su saldo (backfill o reparación)"""
+    filtro = 'WHERE v.usuario_id = %s' if usuario_id is not None else ''
+    params = (usuario_id,) if usuario_id is not None else ()
+
+    if usuario_id is not None:
+        db.execute('DELETE FROM resumen_mensual WHERE usuario_id = %s', params)
+    else:
+        db.execute('DELETE FROM resumen_mensual')
+
+    cur = db.execute(f'''
+        INSERT INTO resumen_mensual (usuario_id, anio, mes, total_vendido, costo_total, ganancia,
+                                     diezmo, num_ventas, credito_pendiente)
+        SELECT v.usuario_id,
+               EXTRACT(YEAR FROM v.fecha_venta)::INTEGER,
+               EXTRACT(MONTH FROM v.fecha_venta)::INTEGER,
+               SUM(v.total_vendido),
+               SUM(v.costo_total),
+               SUM(v.ganancia),
+               SUM(v.diezmo),
+               COUNT(*),
+               COALESCE(SUM(CASE WHEN v.tipo_venta = 'credito' AND v.estado_pago != 'completado'
+                                 THEN v.saldo_pendiente END), 0)
+        FROM ventas v
+        {filtro}
+        GROUP BY 1, 2, 3
+    ''', params)
+    return cur.rowcount
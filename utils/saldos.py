@@ -0,0 +1,57 @@
+"""
+Saldo de cada venta (columnas ventas.total_pagado / ventas.saldo_pendiente)
+
+Se mantienen en la misma transacción que la venta y sus pagos, así cuentas
+por cobrar no tiene que sumar la tabla pagos completa. Este módulo verifica
+las columnas contra pagos y las reconstruye si no coinciden.
+"""
+
+# Estado de pago a partir del saldo: las ventas de contado siempre quedan completadas
+_ESTADO_PAGO = '''
+    CASE WHEN v.tipo_venta != 'credito' OR v.total_vendido - COALESCE(p.total_pagado, 0) <= 0 THEN 'completado'
+         WHEN COALESCE(p.total_pagado, 0) > 0 THEN 'parcial'
+         ELSE 'pendiente'
+    END
+'''
+
+
+def _diferencias(usuario_id):
+    filtro = 'AND v.usuario_id = %s' if usuario_id is not None else ''
+    params = (usuario_id,) if usuario_id is not None else ()
+    return f'''
+        SELECT v.id, v.usuario_id, v.total_pagado, v.saldo_pendiente, v.estado_pago,
+               COALESCE(p.total_pagado, 0) as pagado_real,
+               v.total_vendido - COALESCE(p.total_pagado, 0) as saldo_real,
+               {_ESTADO_PAGO} as estado_real
+        FROM ventas v
+        LEFT JOIN (
+            SELECT venta_id, SUM(monto) as total_pagado
+            FROM pagos
+            GROUP BY venta_id
+        ) p ON v.id = p.venta_id
+        WHERE (v.total_pagado IS DISTINCT FROM COALESCE(p.total_pagado, 0)
+               OR v.saldo_pendiente IS DISTINCT FROM v.total_vendido - COALESCE(p.total_pagado, 0)
+               OR v.estado_pago IS DISTINCT FROM {_ESTADO_PAGO})
+          {filtro}
+        ORDER BY v.id
+    ''', params
+
+
+def verificar_saldos(db, usuario_id=None):
+    """Ventas cuyo saldo guardado no coincide con la suma de sus pagos"""
+    sql, params = _diferencias(usuario_id)
+    return db.execute(sql, params).fetchall()
+
+
+def reconstruir_saldos(db, usuario_id=None):
+    """Recalcula total_pagado, saldo_pendiente y estado_pago de las ventas que difieren"""
+    sql, params = _diferencias(usuario_id)
+    cur = db.execute(f'''
+        UPDATE ventas
+        SET total_pagado = d.pagado_real,
+            saldo_pendiente = d.saldo_real,
+            estado_pago = d.estado_real
+        FROM ({sql}) d
+        WHERE ventas.id = d.id
+    ''', params)
+    return cur.rowcount
@@ -0,0 +1,218 @@
+"""
+Trabajos de exportación en segundo plano
+
+El request solo registra el trabajo en la tabla trabajos_exportacion y lo
+encola en un pool de hilos del worker; el libro se genera fuera del ciclo
+del request. El estado y el progreso viven en la base de datos, así que
+cualquier worker puede responder el polling, y los archivos quedan en
+EXPORT_DIR (disco compartido por los workers del mismo contenedor) hasta
+que vencen.
+"""
+import json
+import logging
+import os
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import get_db
+from utils import cache_reportes, metricas
+from utils.excel import (escribir_reporte_ventas, escribir_reporte_gastos, contar_filas_reporte,
+                         nombre_reporte_ventas, nombre_reporte_gastos)
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'sistema_ventas_exports'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_TTL = int(os.environ.get('EXPORT_TTL', 3600))
+# Un trabajo 'procesando' más viejo que esto quedó huérfano (worker reiniciado)
+EXPORT_TIMEOUT = int(os.environ.get('EXPORT_TIMEOUT', 1800))
+
+TIPOS = ('reporte_ventas', 'reporte_gastos')
+
+logger = logging.getLogger('sistema_ventas.trabajos')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Pool de hilos del proceso actual (se recrea tras un fork)"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='exportacion')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _worker():
+    """Identidad del proceso que encola (host:pid); el pool de hilos vive en él"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def crear_trabajo(db, usuario_id, tipo, parametros):
+    """Registra el trabajo (el llamador hace commit) y retorna su id"""
+    return db.execute('''
+        INSERT INTO trabajos_exportacion (usuario_id, tipo, parametros, estado, progreso, worker)
+        VALUES (%s, %s, %s, 'pendiente', 0, %s)
+        RETURNING id
+    ''', (usuario_id, tipo, json.dumps(parametros), _worker())).fetchone()['id']
+
+
+def encolar(trabajo_id):
+    """Envía el trabajo al pool de hilos (llamar después del commit)"""
+    _get_executor().submit(ejecutar_trabajo, trabajo_id)
+
+
+def obtener_trabajo(db, trabajo_id, usuario_id):
+    return db.execute('''
+        SELECT * FROM trabajos_exportacion
+        WHERE id = %s AND usuario_id = %s
+    ''', (trabajo_id, usuario_id)).fetchone()
+
+
+def _actualizar(db, trabajo_id, **campos):
+    asignaciones = ', '.join(f'{campo} = %s' for campo in campos)
+    db.execute(f'UPDATE trabajos_exportacion SET {asignaciones} WHERE id = %s',
+               list(campos.values()) + [trabajo_id])
+    db.commit()
+
+
+def ejecutar_trabajo(trabajo_id):
+    """Genera el archivo de un trabajo; corre en un hilo del pool"""
+    db = get_db()
+    inicio = time.monotonic()
+    tipo = None
+    try:
+        # Reclamar el trabajo (si otro hilo ya lo tomó, no hay fila)
+        trabajo = db.execute('''
+            UPDATE trabajos_exportacion
+            SET estado = 'procesando', fecha_inicio = CURRENT_TIMESTAMP
+            WHERE id = %s AND estado = 'pendiente'
+            RETURNING *
+        ''', (trabajo_id,)).fetchone()
+        db.commit()
+        if trabajo is None:
+            return
+        tipo = trabajo['tipo']
+
+        params = json.loads(trabajo['parametros'])
+        usuario_id = trabajo['usuario_id']
+        mes, anio, quincena = params['mes'], params['anio'], params.get('quincena')
+
+        total = contar_filas_reporte(db, trabajo['tipo'], usuario_id, mes, anio, quincena) or 1
+        db.commit()
+
+        def al_avanzar(filas):
+            # Un UPDATE en su propia transacción por lote; el cursor de servidor
+            # vive en otra conexión, así que el commit no lo invalida
+            progreso_db = get_db()
+            try:
+                _actualizar(progreso_db, trabajo_id, progreso=min(99, filas * 100 // total))
+            finally:
+                progreso_db.close()
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        ruta = os.path.join(EXPORT_DIR, f'{trabajo_id}-{secrets.token_hex(8)}.xlsx')
+        guardado, clave = cache_reportes.buscar(db, tipo, usuario_id, mes, anio, quincena, params['moneda'])
+        if guardado is not None:
+            with guardado, open(ruta, 'wb') as destino:
+                shutil.copyfileobj(guardado, destino)
+        elif tipo == 'reporte_ventas':
+            escribir_reporte_ventas(db, usuario_id, mes, anio, params['moneda'], ruta, al_avanzar)
+        else:
+            escribir_reporte_gastos(db, usuario_id, mes, anio, quincena, params['moneda'], ruta, al_avanzar)
+        if guardado is None and clave:
+            cache_reportes.guardar(clave, ruta)
+        if tipo == 'reporte_ventas':
+            nombre = nombre_reporte_ventas(mes, anio)
+        else:
+            nombre = nombre_reporte_gastos(mes, anio, quincena)
+        db.rollback()
+
+        _actualizar(db, trabajo_id, estado='completado', progreso=100, archivo=ruta,
+                    nombre_descarga=nombre, fecha_fin=datetime.now(),
+                    expira=datetime.now() + timedelta(seconds=EXPORT_TTL))
+        metricas.observar('sistema_ventas_trabajo_segundos', time.monotonic() - inicio,
+                          tipo=tipo, estado='completado')
+    except Exception as e:
+        logger.exception('Trabajo de exportación %s falló', trabajo_id)
+        if tipo is not None:
+            metricas.observar('sistema_ventas_trabajo_segundos', time.monotonic() - inicio,
+                              tipo=tipo, estado='error')
+        try:
+            db.rollback()
+            _actualizar(db, trabajo_id, estado='error', error=str(e)[:500], fecha_fin=datetime.now())
+        except Exception:
+            logger.exception('No se pudo marcar con error el trabajo %s', trabajo_id)
+    finally:
+        db.close()
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def marcar_huerfanos(db):
+    """
+    Marca como error los trabajos sin terminar encolados por procesos de este
+    host que ya no existen (worker reciclado por max_requests o caído): su
+    pool de hilos murió con ellos. Se llama al arrancar cada worker.
+    """
+    prefijo = f'{socket.gethostname()}:'
+    filas = db.execute('''
+        SELECT DISTINCT worker FROM trabajos_exportacion
+        WHERE estado IN ('pendiente', 'procesando') AND worker LIKE %s
+    ''', (prefijo + '%',)).fetchall()
+    muertos = [f['worker'] for f in filas
+               if f['worker'][len(prefijo):].isdigit() and not _proceso_vivo(int(f['worker'][len(prefijo):]))]
+    if not muertos:
+        return 0
+    marcados = db.execute('''
+        UPDATE trabajos_exportacion
+        SET estado = 'error', error = 'Trabajo interrumpido (worker reiniciado)', fecha_fin = CURRENT_TIMESTAMP
+        WHERE estado IN ('pendiente', 'procesando') AND worker = ANY(%s)
+        RETURNING id
+    ''', (muertos,)).fetchall()
+    if marcados:
+        logger.warning('Trabajos de exportación interrumpidos: %s', ', '.join(str(f['id']) for f in marcados))
+    return len(marcados)
+
+
+def limpiar_vencidos(db):
+    """Borra archivos vencidos y marca como error los trabajos huérfanos"""
+    vencidos = db.execute('''
+        UPDATE trabajos_exportacion
+        SET estado = 'expirado'
+        WHERE estado = 'completado' AND expira < CURRENT_TIMESTAMP
+        RETURNING archivo
+    ''').fetchall()
+    for trabajo in vencidos:
+        try:
+            os.remove(trabajo['archivo'])
+        except OSError:
+            pass
+    db.execute('''
+        UPDATE trabajos_exportacion
+        SET estado = 'error', error = 'Trabajo interrumpido'
+        WHERE estado IN ('pendiente', 'procesando')
+          AND fecha_creacion < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+    ''', (EXPORT_TIMEOUT,))
+    # El historial de trabajos terminados se conserva una semana
+    db.execute('''
+        DELETE FROM trabajos_exportacion
+        WHERE estado IN ('expirado', 'error')
+          AND fecha_creacion < CURRENT_TIMESTAMP - INTERVAL '7 days'
+    ''')
+    return len(vencidos)
@@ -0,0 +1,55 @@
+"""
+Versiones de los datos por usuario (tablas version_datos y version_periodo)
+
+Cada ruta que escribe incrementa la versión del usuario en su misma
+transacción; las páginas y la API de lectura arman su ETag con ella y
+responden 304 a If-None-Match con una sola lectura por clave primaria, sin
+correr sus consultas.
+
+version_periodo lleva además una versión por mes (el de la fecha de la
+venta o del gasto), para que un reporte de un mes cerrado siga siendo válido
+mientras no llegue un movimiento con fecha de ese mes. La fila anio = 0,
+mes = 0 cuenta los cambios que afectan a todos los meses (p. ej. renombrar
+un producto).
+"""
+from utils.resumen import anio_mes
+
+
+def incrementar(db, usuario_id=None, fechas=()):
+    """Sube la versión del usuario (o la de todos, para los comandos de
+    mantenimiento) y la de los meses de `fechas` ('YYYY-MM-DD' o date)"""
+    if usuario_id is None:
+        db.execute('UPDATE version_datos SET version = version + 1')
+        return
+    db.execute('''
+        INSERT INTO version_datos (usuario_id, version) VALUES (%s, 1)
+        ON CONFLICT (usuario_id) DO UPDATE SET version = version_datos.version + 1
+    ''', (usuario_id,))
+    for anio, mes in sorted({anio_mes(fecha) for fecha in fechas}):
+        _incrementar_periodo(db, usuario_id, anio, mes)
+
+
+def incrementar_periodos(db, usuario_id):
+    """Invalida los reportes de todos los meses del usuario"""
+    _incrementar_periodo(db, usuario_id, 0, 0)
+
+
+def _incrementar_periodo(db, usuario_id, anio, mes):
+    db.execute('''
+        INSERT INTO version_periodo (usuario_id, anio, mes, version) VALUES (%s, %s, %s, 1)
+        ON CONFLICT (usuario_id, anio, mes) DO UPDATE SET version = version_periodo.version + 1
+    ''', (usuario_id, anio, mes))
+
+
+def obtener(db, usuario_id):
+    fila = db.execute('SELECT version FROM version_datos WHERE usuario_id = %s', (usuario_id,)).fetchone()
+    return fila['version'] if fila else 0
+
+
+def obtener_periodo(db, usuario_id, anio, mes):
+    """Versión del mes sumada a la de todos los meses (ambas solo crecen)"""
+    return db.execute('''
+        SELECT COALESCE(SUM(version), 0) AS version
+        FROM version_periodo
+        WHERE usuario_id = %s AND ((anio = %s AND mes = %s) OR (anio = 0 AND mes = 0))
+    ''', (usuario_id, anio, mes)).fetchone()['version']
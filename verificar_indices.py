@@ -0,0 +1,124 @@
+"""
+Script de verificación de índices - Sistema ERP Ventas
+Ejecuta EXPLAIN sobre las consultas por período de cada ruta y comprueba
+que PostgreSQL puede resolverlas con un recorrido por rango de índice
+(requiere DATABASE_URL)
+"""
+
+import json
+import sys
+from datetime import datetime
+sys.path.insert(0, '.')
+
+from app import app, consulta_serie_ventas
+from database import get_db, MOTOR
+from utils.excel import SQL_REPORTE_VENTAS, SQL_REPORTE_GASTOS
+from utils.periodos import rango_mes, rango_quincena
+
+USUARIO = 1
+MES, ANIO = 1, 2024
+INICIO, FIN = rango_mes(MES, ANIO)
+Q_INICIO, Q_FIN = rango_quincena(MES, ANIO, 'primera')
+
+# Consultas por período de las rutas (los reportes y la serie de estadísticas
+# se arman con las mismas funciones que usan las rutas)
+CONSULTAS = {
+    'gastos (listado)': ('''
+        SELECT * FROM gastos
+        WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
+        ORDER BY fecha DESC
+    ''', (USUARIO, INICIO, FIN), 'idx_gastos_usuario_fecha'),
+    'gastos (por categoría)': ('''
+        SELECT categoria, SUM(monto) as total
+        FROM gastos
+        WHERE usuario_id = %s AND fecha >= %s AND fecha < %s
+        GROUP BY categoria
+    ''', (USUARIO, INICIO, FIN), 'idx_gastos_usuario_fecha'),
+    'exportar_gastos': (SQL_REPORTE_GASTOS, (USUARIO, Q_INICIO, Q_FIN), 'idx_gastos_usuario_fecha'),
+    'exportar_reporte': (SQL_REPORTE_VENTAS, (USUARIO, INICIO, FIN), 'idx_ventas_usuario_orden'),
+    'api_estadisticas (día)': (consulta_serie_ventas(MOTOR, 'day'), (USUARIO, INICIO, FIN),
+                               'idx_ventas_usuario_orden'),
+    'api_estadisticas (mes)': (consulta_serie_ventas(MOTOR, 'month'), (USUARIO, INICIO, FIN),
+                               'idx_ventas_usuario_orden'),
+    'ventas (página con cursor)': ('''
+        SELECT v.*, p.nombre as producto_nombre
+        FROM ventas v
+        JOIN productos p ON v.producto_id = p.id
+        WHERE v.usuario_id = %s AND (v.fecha_venta, v.fecha_registro, v.id) < (%s, %s, %s)
+        ORDER BY v.fecha_venta DESC, v.fecha_registro DESC, v.id DESC
+        LIMIT 51
+    ''', (USUARIO, FIN, datetime(ANIO, MES, 1), 10**9), 'idx_ventas_usuario_orden'),
+    'ventas (filtro cliente)': ('''
+        SELECT v.id FROM ventas v
+        WHERE v.usuario_id = %s AND lower(v.cliente_nombre) LIKE %s
+    ''', (USUARIO, 'juan%'), 'idx_ventas_usuario_cliente'),
+    'ventas (filtro producto)': ('''
+        SELECT v.id FROM ventas v
+        WHERE v.usuario_id = %s AND v.producto_id = %s
+    ''', (USUARIO, 1), 'idx_ventas_usuario_producto'),
+    'api_buscar_productos (prefijo)': ('''
+        SELECT id FROM productos
+        WHERE usuario_id = %s AND lower(nombre) LIKE %s
+    ''', (USUARIO, 'ar%'), 'idx_productos_usuario_nombre'),
+    'api_buscar_productos (subcadena)': ('''
+        SELECT id FROM productos
+        WHERE usuario_id = %s AND lower(nombre || ' ' || COALESCE(descripcion, '')) LIKE %s
+    ''', (USUARIO, '%arroz%'), 'idx_productos_busqueda_trgm'),
+    'inventario (página con cursor)': ('''
+        SELECT * FROM productos
+        WHERE usuario_id = %s AND (fecha_registro, id) < (%s, %s)
+        ORDER BY fecha_registro DESC, id DESC
+        LIMIT 51
+    ''', (USUARIO, datetime(ANIO, MES, 1), 10**9), 'idx_productos_usuario_orden'),
+    'cuentas_por_cobrar': ('''
+        SELECT v.*, p.nombre as producto_nombre
+        FROM ventas v
+        JOIN productos p ON v.producto_id = p.id
+        WHERE v.tipo_venta = 'credito' AND v.estado_pago != 'completado' AND v.usuario_id = %s
+        ORDER BY v.fecha_venta DESC
+    ''', (USUARIO,), 'idx_ventas_credito_abiertas'),
+}
+
+
+def nodos(plan):
+    """Recorre el árbol del plan JSON"""
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from nodos(hijo)
+
+
+def usa_indice(plan, indice):
+    return any(
+        n.get('Node Type') in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+        and n.get('Index Name') == indice
+        and 'Index Cond' in n
+        for n in nodos(plan)
+    )
+
+
+print("=" * 60)
+print("VERIFICACIÓN DE ÍNDICES - SISTEMA ERP VENTAS")
+print("=" * 60)
+print()
+
+fallos = 0
+with app.app_context():
+    db = get_db()
+    # Con tablas pequeñas el planificador prefiere seq scan; lo desactivamos
+    # para comprobar que el predicado es sargable contra el índice
+    db.execute('SET LOCAL enable_seqscan = off')
+    for ruta, (sql, params, indice) in CONSULTAS.items():
+        plan = db.execute('EXPLAIN (FORMAT JSON) ' + sql, params).fetchone()['QUERY PLAN']
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        ok = usa_indice(plan[0]['Plan'], indice)
+        fallos += 0 if ok else 1
+        status = "✓ OK" if ok else "✗ SIN RANGO DE ÍNDICE"
+        print(f"{ruta:25} → {indice:26} {status}")
+    db.rollback()
+
+print()
+print("=" * 60)
+print("FIN DE VERIFICACIÓN" if not fallos else f"{fallos} CONSULTA(S) SIN ÍNDICE")
+print("=" * 60)
+sys.exit(1 if fallos else 0)